@@ -5,12 +5,31 @@
 H3C 批量命令工具（单表并发版 + 邮件报告）
 主文件：保持为你主要查看的入口，邮件和检查逻辑拆到独立模块
 """
-from check_paramiko import NetworkDeviceChecker
+from check_paramiko import DANGEROUS_COMMANDS, READONLY_WHITELIST, NetworkDeviceChecker
+from conn_pool import SSHConnectionPool
+from channel_reader import completed_pipelined_output, read_pipelined, read_until_prompt, split_pipelined_output
+from prompt_profiles import VENDOR_PROFILES
+import async_engine
+import shard_runner
+import concurrency
+import rate_limit
+import retry_policy
+import port_scan
+import transport_profiles
+import log_pipeline
+import metrics
+import profiler
+import recording
+import rule_engine
+from result_sink import ResultWriter
+from results_store import ResultsStore
+from incremental import DiffReport, FingerprintStore
 from email_utils import send_email, ask_email_config
-import paramiko, logging, argparse, csv, re, socket, time, json, sys, os
+import paramiko, argparse, csv, re, socket, time, json, sys, os
 from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
 
 LOG_DIR = Path('logs')
 RESULT_DIR = Path('results')
@@ -45,11 +64,94 @@ class ConfigManager:
         },
         'ssh': {
             'timeout': 10,
-            'port': 22
+            'port': 22,
+            'transport_profile': 'default',  # SSH 传输配置档：default / bulk-transfer / many-small-sessions / legacy
+            'transport_profiles': {},  # 自定义或覆盖配置档，字段: kex, key_types, ciphers, macs, compress, window_size, max_packet_size
+            'prescan': {
+                'enabled': True,       # SSH 之前并发探测 TCP 端口，不可达设备直接记入报告
+                'timeout': 2.0,        # 握手超时（秒）
+                'max_parallel': 2000   # 同时在途的探测连接数（受文件描述符上限约束）
+            },
+            'retry': {
+                'attempts': 3,         # 每台设备最多连接次数（认证失败不重试）
+                'base_delay': 1.0,     # 退避基数（秒），第 n 次重试前随机等待 0 ~ base_delay * 2^(n-1)
+                'max_delay': 10.0,     # 单次退避上限（秒）
+                'circuit_breaker': {
+                    'enabled': True,   # 记住持续不可达的设备，熔断期内直接跳过
+                    'path': 'results/circuit_breaker.json',
+                    'failure_threshold': 3,   # 连续不可达次数（跨运行累计）达到后熔断
+                    'open_seconds': 3600,     # 熔断冷却期，期满后放行一次探测，探测失败冷却期加倍
+                    'max_open_seconds': 86400
+                }
+            },
+            'pool': {
+                'enabled': False,      # 复用已认证连接（同一进程内多次检查/批量任务；ntp_check 时自动开启）
+                'max_per_host': 1,
+                'idle_timeout': 300,
+                'keepalive': 30
+            }
         },
         'execution': {
+            'engine': 'thread',        # thread: 线程池; async: asyncio 引擎
             'max_workers': 5,
-            'command_timeout': 10
+            'processes': 1,            # >1 时按进程分片执行（每个进程内再用 engine 并发）
+            'command_timeout': 10,
+            'parallel_channels': 1,    # >1 时只读命令在同一连接上多通道并行
+            'pipeline': False,         # True 时只读命令整批写入交互式通道（高延迟链路）
+            'ntp_check': False,        # True 时每台设备先做 NTP 检查，再经连接池复用同一连接执行命令（thread 引擎）
+            'max_channels_per_device': 4,
+            'max_sessions': 1000,      # async 引擎同时在途会话上限
+            'connect_workers': 64,     # async 引擎执行阻塞握手的线程数
+            'flush_every': 50,         # 结果文件每写入多少台设备刷盘一次
+            'adaptive': {
+                'enabled': False,      # 按连接/认证耗时和失败率自动调整并发（AIMD），max_workers 为初始值
+                'min': 1,
+                'max': 100,
+                'window': 20,          # 每多少个新建连接评估一次
+                'error_threshold': 0.1,
+                'latency_factor': 3.0, # p90 连接耗时超过无负载基线的倍数即降速
+                'latency_target': None # 固定 p90 上限（秒），设置后代替 latency_factor
+            }
+        },
+        'rate_limits': {               # 令牌桶限速，rate 为每秒个数，0 表示不限
+            'command_per_device': {'rate': 0, 'burst': 5},
+            'session_per_site': {'rate': 0, 'burst': 10, 'prefix': 24},  # 站点取清单 site 列，否则按 /prefix 网段
+            'login_per_aaa': {'rate': 0, 'burst': 10, 'servers': {}}     # AAA 取清单 aaa 列，否则按 servers 网段映射
+        },
+        'logging': {
+            'dir': 'logs',
+            'queue_size': 10000,       # 日志队列长度，写线程跟不上时按 overflow 处理
+            'overflow': 'drop',        # drop: 队列满时丢弃 DEBUG/INFO; block: 所有级别最多等待 block_timeout 后丢弃
+            'block_timeout': 0.05,     # 入队最长等待（秒），SSH 线程不会因日志无限阻塞
+            'max_bytes': 10485760,     # 单个日志文件轮转大小
+            'backup_count': 3,
+            'compress': True,          # 轮转出的旧日志 gzip 压缩
+            'max_open_files': 64,      # 同时打开的设备日志文件上限
+            'console': True            # 同时输出到控制台
+        },
+        'metrics': {
+            'enabled': True,           # 记录 TCP/密钥交换/认证/开通道/命令/断开各阶段耗时和字节数
+            'prometheus': 'results/metrics.prom',  # Prometheus 文本文件（node_exporter textfile 采集），每次运行覆盖
+            'json': True               # 另存 results/metrics_<时间戳>.json（各阶段/各命令分位数）
+        },
+        'recording': {
+            'enabled': False,          # 录制每个连接收发的原始字节（gzip），供 replay_sessions.py 离线回放，也可用 --record
+            'dir': 'results/recordings',  # 按运行编号分子目录
+            'compresslevel': 6
+        },
+        'profiling': {
+            'mode': None,              # cprofile / sampling，按次开启也可用 --profile
+            'interval': 0.01           # sampling 模式的采样间隔（秒）
+        },
+        'store': {
+            'enabled': False,          # 运行结束后转存到 Parquet 历史库（需要 pyarrow）
+            'path': 'results/store'
+        },
+        'incremental': {
+            'enabled': False,          # 变化指示命令输出未变的设备跳过命令执行，只输出差异报告
+            'path': 'results/incremental',
+            'indicator_commands': {}   # 按厂商覆盖/启用指示命令；H3C 默认不做增量判断，开启配置自动归档后
+                                       # 可设 {"h3c": "display archive configuration"}
         }
     }
     
@@ -94,82 +196,122 @@ class ConfigManager:
 
 # ---------------- 日志 ----------------
 def setup_logger(ip: str):
-    logfile = LOG_DIR / f"{ip}_{datetime.now():%Y%m%d_%H%M%S}.log"
-    logger = logging.getLogger(ip)
-    if logger.handlers:
-        return logger
-    logger.setLevel(logging.INFO)
-    fmt = logging.Formatter('%(asctime)s | %(levelname)-8s | %(message)s')
-    sh = logging.StreamHandler(sys.stdout)
-    sh.setFormatter(fmt)
-    fh = logging.FileHandler(logfile, encoding='utf-8')
-    fh.setFormatter(fmt)
-    logger.addHandler(sh)
-    logger.addHandler(fh)
-    return logger
+    """设备日志记录器：经异步日志管道写入 logs/<ip>_<时间戳>.log，不再每台设备各自打开文件"""
+    return log_pipeline.device_logger(ip)
 
 # ---------------- SSH连接（保留回退实现） ----------------
-def connect(ip, user, pwd, port=22, timeout=10):
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    try:
-        ssh.connect(ip, port=port, username=user, password=pwd,
-                    timeout=timeout, auth_timeout=5,
-                    look_for_keys=False, allow_agent=False)
-        return ssh, None
-    except paramiko.AuthenticationException:
-        return None, "认证失败"
-    except socket.timeout:
-        return None, "连接超时"
-    except Exception as e:
-        return None, f"连接异常: {str(e)}"
+def connect(ip, user, pwd, port=22, timeout=10, retry=None, transport_kwargs=None):
+    """
+    retry: 可选 RetryPolicy，可重试错误按退避重试，认证失败不重试
+    transport_kwargs: 传输配置档对应的 connect 参数（transport_profiles.connect_kwargs）
+    """
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(1, attempts + 1):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(ip, port=port, username=user, password=pwd,
+                        timeout=timeout, auth_timeout=5,
+                        look_for_keys=False, allow_agent=False, **(transport_kwargs or {}))
+            return ssh, None
+        except paramiko.AuthenticationException:
+            return None, "认证失败"
+        except Exception as e:
+            ssh.close()
+            err = "连接超时" if isinstance(e, socket.timeout) else f"连接异常: {str(e)}"
+            if retry is None or not retry.should_retry(retry_policy.classify(e), attempt):
+                return None, err
+            retry.sleep(attempt)
+
+@lru_cache(maxsize=1)
+def legacy_ssh_config():
+    """回退实现使用的 ssh 配置（config.json 覆盖默认值，只读取一次；读取失败时用默认值）"""
+    ssh_config = dict(ConfigManager.DEFAULT_CONFIG['ssh'])
+    if CONFIG_FILE.exists():
+        try:
+            with open(CONFIG_FILE, encoding='utf-8') as f:
+                ssh_config.update(json.load(f).get('ssh') or {})
+        except (OSError, ValueError):
+            pass
+    return ssh_config
 
 # ---------------- 执行命令（回退实现） ----------------
 PROMPT = re.compile(r'<[\w-]+>|\[[\w-]+\]')
+# 回退实现没有 checker，只读判定使用与 checker 相同的默认列表
+READONLY_POLICY = rule_engine.CommandPolicy(DANGEROUS_COMMANDS, READONLY_WHITELIST)
 
-def run_cmds_shell(ssh, cmds, logger):
+def _ends_with_prompt(text):
+    lines = text.splitlines()
+    return bool(lines) and bool(PROMPT.search(lines[-1]))
+
+def _strip_echo_and_prompt(buff, session=None):
+    """去掉首行命令回显；末行是提示符时一并去掉"""
+    lines = buff.splitlines()
+    if len(lines) <= 1:
+        return buff
+    lines = lines[1:]
+    if session.is_prompt_line(lines[-1]) if session else PROMPT.search(lines[-1]):
+        lines = lines[:-1]
+    return '\n'.join(lines)
+
+def run_cmds_shell(ssh, cmds, logger, read_mode='event', pipeline=False):
     chan = ssh.invoke_shell()
     chan.settimeout(15)
-    time.sleep(0.5)
-    try:
-        chan.recv(65535)
-    except Exception:
-        pass
+    if read_mode == 'sleep':
+        time.sleep(0.5)
+        try:
+            banner = chan.recv(65535).decode('utf-8', errors='ignore')
+        except Exception:
+            banner = ''
+    else:
+        banner, _ = read_until_prompt(chan, _ends_with_prompt, 5)
+    
+    # 学习到主机名提示符后只匹配该提示符，避免以 ] / > 结尾的输出行被误判
+    session = VENDOR_PROFILES['h3c'].learn(banner)
+    is_prompt = session.is_prompt if session else _ends_with_prompt
     
     chan.send('screen-length disable\n')
-    time.sleep(0.5)
-    try:
-        chan.recv(65535)
-    except Exception:
-        pass
+    if read_mode == 'sleep':
+        time.sleep(0.5)
+        try:
+            chan.recv(65535)
+        except Exception:
+            pass
+    else:
+        read_until_prompt(chan, is_prompt, 5)
+    
+    cmd_list = [cmd for cmd in cmds if cmd.strip()]
+    if pipeline and session and all(READONLY_POLICY.verdict(cmd).readonly for cmd in cmd_list):
+        # 全部为只读命令：整批写入，按“提示符+回显”行切分；
+        # 切分失败时保留已执行完的命令，其余命令换新通道逐条执行（不重复下发）
+        chan.send(''.join(cmd + '\n' for cmd in cmd_list))
+        buff, complete = read_pipelined(chan, session, len(cmd_list), 10)
+        segments = split_pipelined_output(buff, cmd_list, session) if complete else None
+        try:
+            chan.close()
+        except Exception:
+            pass
+        outputs = []
+        for cmd, seg in zip(cmd_list, segments or completed_pipelined_output(buff, cmd_list, session)):
+            clean_output = _strip_echo_and_prompt(seg, session)
+            outputs.append({'cmd': cmd, 'output': clean_output})
+            logger.info('CMD: %s => %d chars', cmd, len(clean_output))
+        if segments is None:
+            logger.warning('流水线输出无法切分（已完成 %d/%d 条），剩余命令改为逐条执行', len(outputs), len(cmd_list))
+            outputs += run_cmds_shell(ssh, cmd_list[len(outputs):], logger, read_mode)
+        return outputs
     
     outputs = []
-    for cmd in cmds:
-        if not cmd.strip():
-            continue
+    for cmd in cmd_list:
         chan.send(cmd + '\n')
-        time.sleep(0.5)
+        if read_mode == 'sleep':
+            time.sleep(0.5)
         
-        buff = ''
-        start_time = time.time()
-        while time.time() - start_time < 10:
-            if chan.recv_ready():
-                chunk = chan.recv(4096).decode('utf-8', errors='ignore')
-                buff += chunk
-                if PROMPT.search(buff.splitlines()[-1]) if buff.splitlines() else False:
-                    break
-            time.sleep(0.1)
-        else:
+        buff, matched = read_until_prompt(chan, is_prompt, 10, mode=read_mode)
+        if not matched:
             logger.warning(f"命令超时: {cmd}")
         
-        lines = buff.splitlines()
-        if len(lines) > 1:
-            clean_output = '\n'.join(lines[1:])
-            if PROMPT.search(clean_output.splitlines()[-1]) if clean_output.splitlines() else False:
-                clean_output = '\n'.join(clean_output.splitlines()[:-1])
-        else:
-            clean_output = buff
-            
+        clean_output = _strip_echo_and_prompt(buff, session)
         outputs.append({'cmd': cmd, 'output': clean_output})
         logger.info('CMD: %s => %d chars', cmd, len(clean_output))
     
@@ -180,7 +322,17 @@ def run_cmds_shell(ssh, cmds, logger):
     return outputs
 
 # ---------------- 单台设备处理（优先使用 checker） ----------------
-def run_device(device_info, cmds, checker=None):
+def checker_device_info(device_info):
+    """清单设备（user/pwd 列）转换为 checker 使用的设备信息"""
+    return {'ip': device_info['ip'], 'username': device_info['user'], 'password': device_info['pwd'],
+            **{k: device_info[k] for k in ('port', 'vendor', 'site', 'aaa', 'profile') if device_info.get(k)}}
+
+@metrics.timed('device', checker_arg=2)
+def run_device(device_info, cmds, checker=None, parallel_channels=1, pipeline=False, incremental=None):
+    """
+    incremental: FingerprintStore，提供时先执行变化指示命令，设备未变化则跳过全部只读命令，
+                 结果标记 unchanged 并沿用上次保存的输出
+    """
     ip = device_info['ip']
     user = device_info['user']
     pwd = device_info['pwd']
@@ -190,35 +342,50 @@ def run_device(device_info, cmds, checker=None):
     
     # 优先使用 checker 提供的安全连接/执行/断开接口
     if checker:
-        ssh = checker.safe_connect({'ip': ip, 'username': user, 'password': pwd})
+        ssh = checker.safe_connect(checker_device_info(device_info))
         if not ssh:
-            logger.error('连接失败（checker）')
-            return {'ip': ip, 'success': False, 'error': '连接失败（checker）'}
+            error = f"连接失败（checker）: {checker.connect_error(ip) or '未知原因'}"
+            logger.error(error)
+            return {'ip': ip, 'success': False, 'error': error}
         channel = None
         try:
-            channel = ssh.invoke_shell()
-            try:
-                channel.settimeout(checker.config.get('cmd_timeout', 15))
-            except Exception:
-                channel.settimeout(15)
-            time.sleep(1)
-            try:
-                channel.recv(65535)
-            except Exception:
-                pass
-            
             outputs = []
-            for cmd in cmds:
-                if not cmd.strip():
-                    continue
-                out = checker.safe_execute_command(channel, cmd, ip)
+            cmd_list = [cmd for cmd in cmds if cmd.strip()]
+            readonly = all(checker.is_readonly_command(cmd) for cmd in cmd_list)
+            indicator = None
+            indicator_cmd = incremental.indicator_command(device_info.get('vendor')) if incremental else None
+            if indicator_cmd and readonly:
+                # 增量模式：指示命令输出与上次一致时不再拉取完整输出
+                indicator_out, channel = checker.execute_command_auto(ssh, channel, indicator_cmd, ip)
+                indicator, previous = incremental.evaluate(ip, cmd_list, indicator_out)
+                if previous is not None:
+                    logger.info('设备未变化，跳过命令执行')
+                    return {'ip': ip, 'success': True, 'unchanged': True, 'indicator': indicator,
+                            'outputs': previous}
+            if pipeline and readonly:
+                # 全部为只读命令：整批写入交互式通道，按提示符切分输出
+                outs, channel = checker.execute_commands_pipelined(ssh, channel, cmd_list, ip)
+            elif parallel_channels > 1 and readonly:
+                # 全部为只读命令：同一连接上多通道并行，输出按原顺序返回
+                outs = checker.execute_commands_parallel(ssh, None, cmd_list, ip, parallel_channels)
+            else:
+                # 设备支持 exec 时逐条 exec，否则首条命令时打开交互式通道
+                outs = []
+                for cmd in cmd_list:
+                    out, channel = checker.execute_command_auto(ssh, channel, cmd, ip)
+                    outs.append(out)
+            for cmd, out in zip(cmd_list, outs):
                 outputs.append({'cmd': cmd, 'output': out})
                 logger.info('CMD: %s => %d chars', cmd, len(out))
             
             logger.info('所有命令执行完成')
-            return {'ip': ip, 'success': True, 'outputs': outputs}
+            result = {'ip': ip, 'success': True, 'outputs': outputs}
+            if incremental is not None:
+                result['indicator'] = indicator
+            return result
         except Exception as e:
             logger.error('执行过程异常: %s', str(e))
+            checker.invalidate_shell(channel)
             return {'ip': ip, 'success': False, 'error': str(e)}
         finally:
             try:
@@ -229,14 +396,18 @@ def run_device(device_info, cmds, checker=None):
                 except Exception:
                     pass
     else:
-        # 回退到原有实现
-        ssh, err = connect(ip, user, pwd)
+        # 回退到原有实现（传输配置档与 checker 一样取 config.json 的 ssh 配置）
+        ssh_config = legacy_ssh_config()
+        profile = transport_profiles.resolve(device_info.get('profile') or ssh_config.get('transport_profile'),
+                                             ssh_config.get('transport_profiles'))
+        ssh, err = connect(ip, user, pwd, port=int(device_info.get('port') or 22), retry=retry_policy.RetryPolicy(),
+                           transport_kwargs=transport_profiles.connect_kwargs(profile))
         if err:
             logger.error('连接失败: %s', err)
             return {'ip': ip, 'success': False, 'error': err}
         
         try:
-            outs = run_cmds_shell(ssh, cmds, logger)
+            outs = run_cmds_shell(ssh, cmds, logger, pipeline=pipeline)
             logger.info('所有命令执行完成')
             return {'ip': ip, 'success': True, 'outputs': outs}
         except Exception as e:
@@ -248,6 +419,17 @@ def run_device(device_info, cmds, checker=None):
             except:
                 pass
 
+def run_device_with_ntp(device_info, cmds, checker, parallel_channels=1, pipeline=False, incremental=None):
+    """
+    同一台设备先做 NTP 检查再执行批量命令，结果附带 ntp（{'status', 'has_ntp', 'error'}）。
+    checker 配置了连接池时两个任务共用一条已认证连接：NTP 检查结束后连接（及空闲 shell）放回池中，
+    批量命令直接借用，不再重新握手和认证
+    """
+    ntp = checker.check_device_ntp(checker_device_info(device_info))
+    result = run_device(device_info, cmds, checker, parallel_channels, pipeline, incremental)
+    result['ntp'] = {'status': ntp['status'], 'has_ntp': ntp['has_ntp'], 'error': ntp['error']}
+    return result
+
 # ---------------- 文件操作 ----------------
 def read_single_inventory(path):
     devices = []
@@ -256,11 +438,16 @@ def read_single_inventory(path):
         reader = csv.DictReader(f)
         for row in reader:
             if 'ip' in row and 'user' in row and 'pwd' in row:
-                devices.append({
+                device = {
                     'ip': row['ip'].strip(),
                     'user': row['user'].strip(),
                     'pwd': row['pwd'].strip()
-                })
+                }
+                # 可选列：端口、厂商、站点（会话限速分组）、AAA 服务器（登录限速分组）、传输配置档
+                for key in ('port', 'vendor', 'site', 'aaa', 'profile'):
+                    if (row.get(key) or '').strip():
+                        device[key] = row[key].strip()
+                devices.append(device)
             if 'email' in row and row['email'].strip():
                 receivers_from_inventory.append(row['email'].strip())
             else:
@@ -268,22 +455,11 @@ def read_single_inventory(path):
     return devices, receivers_from_inventory
 
 def write_report(allres):
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    csv_path = RESULT_DIR / f'results_{ts}.csv'
-    json_path = csv_path.with_suffix('.json')
-    csv_rows = [['IP', 'Command', 'Success', 'OutputLen', 'Output']]
-    for dev in allres:
-        ip = dev['ip']
-        if not dev['success']:
-            csv_rows.append([ip, '', 'FAIL', '', dev.get('error', '未知错误')])
-            continue
-        for o in dev['outputs']:
-            output_preview = o['output'][:200] + '...' if len(o['output']) > 200 else o['output']
-            csv_rows.append([ip, o['cmd'], 'OK', len(o['output']), output_preview])
-    with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-        csv.writer(f).writerows(csv_rows)
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(allres, f, ensure_ascii=False, indent=2)
+    """一次性写出全部结果（main 中已改为边执行边写入 ResultWriter）"""
+    with ResultWriter(RESULT_DIR) as writer:
+        for dev in allres:
+            writer.write(dev)
+    csv_path, json_path = writer.close()
     print(f'\n报告文件: {csv_path}')
     print(f'详细数据: {json_path}')
     return csv_path, json_path
@@ -300,14 +476,36 @@ def ask_file(prompt, default_file):
         sys.exit(f'文件不存在: {path}')
     return Path(path)
 
+# ---------------- 命令行参数 ----------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='H3C 批量命令工具')
+    parser.add_argument('--engine', choices=['thread', 'async'],
+                        help='执行引擎（默认取 config.json 中 execution.engine）')
+    parser.add_argument('--processes', type=int,
+                        help='工作进程数，>1 时分片多进程执行（默认取 execution.processes）')
+    parser.add_argument('--incremental', action='store_true', default=None,
+                        help='增量模式：跳过未变化的设备，只报告差异（默认取 incremental.enabled）')
+    parser.add_argument('--profile', choices=['cprofile', 'sampling'],
+                        help='本次运行开启性能剖析（默认取 profiling.mode）')
+    parser.add_argument('--record', action='store_true',
+                        help='录制原始会话，供 replay_sessions.py 离线回放（默认取 recording.enabled）')
+    parser.add_argument('--ntp-check', action='store_true', default=None,
+                        help='每台设备先做 NTP 检查，再复用同一连接执行命令（默认取 execution.ntp_check）')
+    parser.add_argument('--no-prescan', dest='prescan', action='store_false', default=None,
+                        help='跳过 TCP 端口预扫描（默认取 ssh.prescan.enabled）')
+    return parser.parse_args(argv)
+
 # ---------------- 主函数 ----------------
 def main():
+    args = parse_args()
     print('=' * 60)
     print('H3C 批量命令工具（配置文件版）')
     print('=' * 60)
     
     config = ConfigManager.load_config()
     mail_config = config['mail']
+    log_options = log_pipeline.options_from_config(config.get('logging'), main_log='network_checker.log')
+    log_pipeline.start(**log_options)
     
     print(f"\n当前邮件配置:")
     print(f"  发件人: {mail_config['sender']}")
@@ -338,43 +536,229 @@ def main():
         sys.exit('命令文件为空')
     
     print(f"加载 {len(cmds)} 条命令")
-    print(f"使用 {config['execution']['max_workers']} 个并发线程")
+    engine = args.engine or config['execution'].get('engine', 'thread')
+    processes = args.processes or config['execution'].get('processes', 1)
+    if processes > 1:
+        print(f"使用 {processes} 个工作进程分片执行（进程内引擎: {engine}）")
+    adaptive_config = config['execution'].get('adaptive', {})
+    if engine == 'async':
+        print(f"使用 asyncio 引擎，最多 {config['execution'].get('max_sessions', 1000)} 个在途会话")
+    else:
+        print(f"使用 {config['execution']['max_workers']} 个并发线程")
+    if adaptive_config.get('enabled'):
+        print(f"自适应并发：初始 {config['execution']['max_workers']}，"
+              f"范围 {adaptive_config.get('min', 1)}-{adaptive_config.get('max', 100)}")
     print("开始执行...\n")
 
-    results = []
+    # 结果边执行边落盘，内存中只保留摘要
+    writer = ResultWriter(RESULT_DIR, flush_every=config['execution'].get('flush_every', 50))
+    results = writer.summaries
+    run_id = writer.csv_path.stem.split('_', 1)[-1]
+
+    # NTP 检查与批量命令在同一次运行中执行，经连接池共用每台设备的连接
+    ntp_check = args.ntp_check or config['execution'].get('ntp_check', False)
+    if ntp_check and engine == 'async':
+        sys.exit('NTP 检查（--ntp-check）目前只支持 thread 引擎')
+
+    # 连接池（可选；连接池随本次运行创建和关闭，不跨运行保留）
+    pool_config = config['ssh'].get('pool', {})
+    if ntp_check and not pool_config.get('enabled'):
+        pool_config = dict(pool_config, enabled=True)
+        print("NTP 检查与批量命令共用连接池，每台设备只登录一次")
+    pool = None
+    if pool_config.get('enabled'):
+        pool = SSHConnectionPool(
+            max_per_host=pool_config.get('max_per_host', 1),
+            idle_timeout=pool_config.get('idle_timeout', 300),
+            keepalive=pool_config.get('keepalive', 30)
+        )
 
     # 创建 checker（使用 check_paramiko 的实现）
-    checker = NetworkDeviceChecker({
+    checker_config = {
         'ssh_timeout': config['ssh']['timeout'],
+        'ssh_port': config['ssh']['port'],
+        'transport_profile': config['ssh'].get('transport_profile', 'default'),
+        'transport_profiles': config['ssh'].get('transport_profiles', {}),
         'cmd_timeout': config['execution']['command_timeout'],
         'max_workers': config['execution']['max_workers'],
+        'max_channels_per_device': config['execution'].get('max_channels_per_device', 4),
         'rate_limit_delay': 0.5,
         'readonly_mode': True,
         'enable_logging': False
-    })
+    }
+    limiter = concurrency.from_config(adaptive_config, config['execution']['max_workers'])
+    throttle = rate_limit.from_config(config.get('rate_limits'))
+    retry, breaker = retry_policy.from_config(config['ssh'].get('retry'))
+    metrics_config = config.get('metrics', {})
+    phase_metrics = metrics.from_config(metrics_config)
+    recording_config = dict(config.get('recording') or {})
+    if args.record:
+        recording_config['enabled'] = True
+    recorder = recording.from_config(recording_config, run_id)
+    checker = NetworkDeviceChecker(checker_config, pool=pool, limiter=limiter, throttle=throttle,
+                                   retry=retry, breaker=breaker, phase_metrics=phase_metrics,
+                                   recorder=recorder)
+    if recorder is not None:
+        print(f"会话录制已开启: {recorder.path}")
+    profiling_config = config.get('profiling') or {}
+    profile_mode = args.profile or profiling_config.get('mode')
 
-    with ThreadPoolExecutor(max_workers=config['execution']['max_workers']) as executor:
-        future_to_device = {
-            executor.submit(run_device, device, cmds, checker): device
-            for device in devices
-        }
-        
-        for future in as_completed(future_to_device):
-            device = future_to_device[future]
-            try:
-                result = future.result()
-                results.append(result)
-                status = "成功" if result['success'] else "失败"
-                print(f">>> {device['ip']} 执行{status}")
-            except Exception as exc:
-                print(f">>> {device['ip']} 生成异常: {exc}")
-                results.append({
-                    'ip': device['ip'],
-                    'success': False,
-                    'error': f'执行异常: {str(exc)}'
-                })
-
-    csv_path, json_path = write_report(results)
+    # 增量模式（可选）
+    incremental_config = config.get('incremental', {})
+    incremental = None
+    diff_report = None
+    profile_path = RESULT_DIR / f'profile_{run_id}'
+    if args.incremental or incremental_config.get('enabled'):
+        incremental = FingerprintStore(incremental_config.get('path', 'results/incremental'),
+                                       incremental_config.get('indicator_commands'))
+        diff_report = DiffReport(RESULT_DIR / f'diff_{run_id}.txt')
+        print("增量模式：变化指示未变的设备将跳过命令执行")
+
+    def on_result(device, result):
+        if incremental is not None:
+            diff_report.write(result, incremental.record(result, run_id))
+        writer.write(result)
+        status = "成功" if result['success'] else "失败"
+        ntp = result.get('ntp')
+        if ntp is None:
+            print(f">>> {device['ip']} 执行{status}")
+        else:
+            ntp_state = ('已配置' if ntp['has_ntp'] else '未配置') if ntp['status'] == 'success' else '检查失败'
+            print(f">>> {device['ip']} 执行{status}，NTP {ntp_state}")
+
+    parallel_channels = config['execution'].get('parallel_channels', 1)
+    pipeline = config['execution'].get('pipeline', False)
+    device_runner = run_device_with_ntp if ntp_check else run_device
+    prescan_config = config['ssh'].get('prescan', {})
+    # 分片模式下由各工作进程分别剖析
+    prof = profiler.create(profile_mode, profiling_config.get('interval', 0.01)) if processes <= 1 else None
+    if prof is not None:
+        prof.start()
+        print(f"性能剖析已开启: {profile_mode}")
+    try:
+        # 端口预扫描：不可达设备不进入 SSH 阶段
+        if args.prescan if args.prescan is not None else prescan_config.get('enabled', True):
+            reachable, unreachable = port_scan.partition(
+                devices, config['ssh']['port'],
+                timeout=prescan_config.get('timeout', 2.0),
+                max_parallel=prescan_config.get('max_parallel', 2000))
+            print(f"端口预扫描: 可达 {len(reachable)} 台，不可达 {len(unreachable)} 台")
+            for device, reason in unreachable:
+                on_result(device, {'ip': device['ip'], 'success': False, 'error': f'端口不可达: {reason}'})
+            devices_to_run = reachable
+        else:
+            devices_to_run = devices
+
+        if processes > 1:
+            shard_runner.run_sharded(devices_to_run, {
+                'cmds': cmds,
+                'checker_config': checker_config,
+                'pool': pool_config,
+                'engine': engine,
+                'max_workers': config['execution']['max_workers'],
+                'max_sessions': config['execution'].get('max_sessions', 1000),
+                'connect_workers': config['execution'].get('connect_workers', 64),
+                'parallel_channels': parallel_channels,
+                'pipeline': pipeline,
+                'device_runner': device_runner,
+                'logger_factory': setup_logger,
+                'incremental': incremental,
+                'adaptive': adaptive_config,
+                'rate_limits': config.get('rate_limits'),
+                'processes': processes,
+                'retry': retry,
+                'breaker': breaker,
+                'logging': log_options,
+                'metrics': phase_metrics,
+                'recorder': recorder,
+                'profile': profile_mode,
+                'profile_interval': profiling_config.get('interval', 0.01),
+                'profile_path': str(profile_path),
+                'curve_path': str(RESULT_DIR / f'concurrency_{run_id}.csv')
+            }, processes, on_result)
+        elif engine == 'async':
+            run_devices = prof.wrap(async_engine.run_devices) if prof else async_engine.run_devices
+            run_devices(
+                devices_to_run, cmds, checker,
+                max_sessions=config['execution'].get('max_sessions', 1000),
+                connect_workers=config['execution'].get('connect_workers', 64),
+                logger_factory=setup_logger,
+                on_result=on_result,
+                parallel_channels=parallel_channels,
+                pipeline=pipeline,
+                incremental=incremental
+            )
+        else:
+            # 自适应模式下线程数取上限，实际在途会话数由控制器放行
+            runner = prof.wrap(device_runner) if prof else device_runner
+            runner = partial(limiter.run, runner) if limiter else runner
+            max_workers = limiter.max_limit if limiter else config['execution']['max_workers']
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_device = {
+                    executor.submit(runner, device, cmds, checker, parallel_channels, pipeline,
+                                    incremental): device
+                    for device in devices_to_run
+                }
+
+                for future in as_completed(future_to_device):
+                    # 取出即丢弃 future，已完成设备的输出不再常驻内存
+                    device = future_to_device.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as exc:
+                        print(f">>> {device['ip']} 生成异常: {exc}")
+                        # 与正常结果走同一路径：增量记录、差异报告和控制台输出都能看到这台设备
+                        result = {'ip': device['ip'], 'success': False, 'error': f'执行异常: {str(exc)}'}
+                    on_result(device, result)
+    finally:
+        if pool:
+            pool.close_all()
+        if recorder is not None:
+            recorder.close()
+        # 中断或异常时已完成设备的结果也会落盘
+        csv_path, json_path = writer.close()
+        if incremental is not None:
+            incremental.save()
+            diff_report.close()
+        if breaker is not None:
+            breaker.save()
+            open_hosts = breaker.open_hosts()
+            if open_hosts:
+                print(f"熔断中的设备 {len(open_hosts)} 台（{breaker.path}）")
+        if limiter is not None and processes <= 1:
+            # 分片模式下各工作进程分别导出 concurrency_<ts>_shard<N>.csv
+            curve_path = limiter.write_curve(RESULT_DIR / f'concurrency_{run_id}.csv')
+            print(f"\n自适应并发: {limiter.summary()}，曲线: {curve_path}")
+        if throttle is not None and any(throttle.waited.values()):
+            w = throttle.waited
+            print(f"限速累计等待: 命令 {w['command']:.1f}s，会话 {w['session']:.1f}s，登录 {w['login']:.1f}s")
+        if phase_metrics is not None:
+            print(f"\n分阶段耗时:\n{phase_metrics.report()}")
+            if metrics_config.get('prometheus'):
+                print(f"Prometheus 指标: {phase_metrics.write_prometheus(metrics_config['prometheus'])}")
+            if metrics_config.get('json', True):
+                print(f"耗时汇总: {phase_metrics.write_json(RESULT_DIR / f'metrics_{run_id}.json')}")
+        if prof is not None:
+            prof.stop()
+            print(f"性能剖析: {prof.write(profile_path)}")
+        # 写完队列中的日志再输出汇总
+        log_pipeline.shutdown()
+    print(f'\n报告文件: {csv_path}')
+    print(f'详细数据: {json_path}')
+    if writer.bytes_total:
+        print(f'命令输出: {writer.blobs_path}（去重后 {writer.bytes_stored / 1024:.1f} KB，'
+              f'原始 {writer.bytes_total / 1024:.1f} KB）')
+    if diff_report is not None:
+        c = diff_report.counts
+        print(f"差异报告: {diff_report.path}（有变化 {c['changed']} 台，跳过 {c['unchanged']} 台）")
+
+    store_config = config.get('store', {})
+    if store_config.get('enabled'):
+        try:
+            store_path = ResultsStore(store_config.get('path', 'results/store')).ingest_jsonl(json_path)
+            print(f'历史库: {store_path}')
+        except Exception as e:
+            print(f'✗ 转存历史库失败: {e}')
     
     success_count = sum(1 for r in results if r['success'])
     fail_count = len(devices) - success_count
@@ -406,7 +790,8 @@ def main():
                 receivers=mail_config['receivers'],
                 subject=subject,
                 content=content,
-                attachments=[str(csv_path), str(json_path)]
+                attachments=[str(csv_path), str(json_path), str(writer.blobs_path)]
+                            + ([str(diff_report.path)] if diff_report is not None else [])
             )
             if success:
                 print("邮件报告已发送！")
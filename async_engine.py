@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio 执行引擎
+以协程驱动 连接 → invoke_shell → 命令循环 → 断开 的完整流程，单进程可同时维持数千个会话。
+paramiko 的握手/认证/关闭是阻塞调用，放到有界线程池里执行；命令收发阶段通过
+channel.fileno() 挂到事件循环上等待可读，不再让每台设备占一个线程做 sleep 轮询。
+返回的结果字典与 Increase_Paramiko.run_device 完全一致，可直接交给 write_report。
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from channel_reader import (PipelineWatcher, PromptWatcher, RecvBuffer, completed_pipelined_output,
+                            split_pipelined_output)
+import metrics
+
+try:
+    import resource  # Windows 上不存在
+except ImportError:
+    resource = None
+
+POLL_INTERVAL = 0.05  # 事件循环不支持 add_reader 时（如 Windows Proactor）的轮询间隔
+
+
+def _raise_nofile_limit():
+    """尽量把文件描述符软限制提到硬限制（每个会话约占 socket + 通道管道 3 个 fd）"""
+    if resource is None:
+        return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError) as e:
+        logging.debug(f"调整文件描述符限制失败: {e}")
+
+
+async def _wait_readable(channel, timeout: float) -> bool:
+    """等待通道可读（有数据/EOF/关闭），超时返回 False"""
+    if channel.recv_ready() or channel.closed or channel.eof_received:
+        return True
+
+    loop = asyncio.get_running_loop()
+    try:
+        fd = channel.fileno()
+        fut = loop.create_future()
+        loop.add_reader(fd, lambda: fut.done() or fut.set_result(True))
+    except NotImplementedError:
+        # 事件循环不支持 fd 监听，退化为协程内轮询（不占线程）
+        end = loop.time() + timeout
+        while loop.time() < end:
+            await asyncio.sleep(POLL_INTERVAL)
+            if channel.recv_ready() or channel.closed or channel.eof_received:
+                return True
+        return False
+
+    try:
+        return await asyncio.wait_for(fut, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+
+
+async def _read_until_prompt(channel, checker, timeout: float, is_prompt):
+    """协程版 read_until_prompt，返回 (output, matched)"""
+    loop = asyncio.get_running_loop()
+    watcher = PromptWatcher(is_prompt, checker._has_more_prompt)
+    deadline = loop.time() + timeout
+
+    while not checker.exit_handler.exit_flag:
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not await _wait_readable(channel, remaining):
+            break
+        if not channel.recv_ready():
+            if channel.closed or channel.eof_received:
+                break
+            continue
+
+        state = watcher.feed(channel.recv(65535))
+        if state == PromptWatcher.PROMPT:
+            return watcher.output, True
+        if state == PromptWatcher.MORE:
+            channel.send(' ')
+    return watcher.output, False
+
+
+async def _wait_for_prompt(channel, checker, fallback_delay: float = 1) -> str:
+    """协程版 checker.wait_for_prompt，首次调用时学习会话提示符"""
+    session = checker.get_session_prompt(channel)
+    if checker.config['read_mode'] == 'sleep':
+        await asyncio.sleep(fallback_delay)
+        output = channel.recv(65535).decode('utf-8', errors='ignore') if channel.recv_ready() else ''
+    else:
+        output, _ = await _read_until_prompt(channel, checker, checker.config['banner_timeout'],
+                                             checker._banner_prompt_matcher(session))
+    if session is None:
+        checker.learn_session_prompt(channel, output)
+    return output
+
+
+def _drain(channel):
+    """丢弃复用通道里残留的数据"""
+    while channel.recv_ready():
+        channel.recv(65535)
+
+
+async def _throttle_command(checker, device_ip: str, count: int = 1):
+    """按设备命令令牌桶等待（不阻塞事件循环）"""
+    if checker.throttle is not None:
+        delay = checker.throttle.command_delay(device_ip, count)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@metrics.timed('shell_command', checker_arg=2, command_arg=1)
+async def _execute_command(channel, command: str, checker, device_ip: str) -> str:
+    """协程版 safe_execute_command：校验、发送、等待提示符、清理输出"""
+    if checker.exit_handler.exit_flag:
+        logging.info(f"退出标志已设置，跳过命令执行: {command}")
+        return ""
+
+    is_safe, reason = checker.validate_command(command)
+    if not is_safe:
+        logging.error(f"命令验证失败: {command}, 原因: {reason}")
+        if checker.config['readonly_mode']:
+            return f"ERROR: {reason}"
+
+    try:
+        logging.debug(f"[{device_ip}] 执行命令: {command}")
+        await _throttle_command(checker, device_ip)
+        channel.send(command + '\n')
+        if checker.config['read_mode'] == 'sleep':
+            await asyncio.sleep(checker.config['rate_limit_delay'])
+
+        session = checker.get_session_prompt(channel)
+        output, matched = await _read_until_prompt(
+            channel, checker, checker.config['cmd_timeout'],
+            session.is_prompt if session else checker._is_command_prompt
+        )
+        if not matched:
+            checker.invalidate_shell(channel)
+            if not checker.exit_handler.exit_flag:
+                logging.warning(f"[{device_ip}] 等待提示符超时: {command}")
+        return checker._clean_output(output, command, device_ip, session)
+
+    except Exception as e:
+        logging.error(f"[{device_ip}] 命令执行异常: {command}, 错误: {e}")
+        return f"ERROR: {str(e)}"
+
+
+async def _open_shell(ssh, checker, executor):
+    """协程版 checker.open_shell：优先复用连接池保留的通道"""
+    if checker.pool is not None:
+        channel = checker.pool.take_shell(ssh)
+        if channel is not None:
+            _drain(channel)
+            return channel
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    channel = await loop.run_in_executor(executor, ssh.invoke_shell)
+    channel.settimeout(checker.config['cmd_timeout'])
+    await _wait_for_prompt(channel, checker)
+    metrics.observe(checker, 'shell_open', started)
+    return channel
+
+
+@metrics.timed('exec_command', checker_arg=2, command_arg=1)
+async def _exec_command(ssh, command, checker, device_ip, executor):
+    """协程版 checker.exec_execute_command，设备不支持 exec 时返回 None"""
+    if checker.exit_handler.exit_flag:
+        return ""
+    known = checker.exec_supported(device_ip)
+    if known is False:
+        return None
+
+    loop = asyncio.get_running_loop()
+    channel = None
+    try:
+        await _throttle_command(checker, device_ip)
+        channel = await loop.run_in_executor(
+            executor, lambda: ssh.get_transport().open_session(timeout=checker.config['cmd_timeout']))
+        await loop.run_in_executor(executor, channel.exec_command, command)
+
+        buffer = RecvBuffer()
+        deadline = loop.time() + checker.config['cmd_timeout']
+        complete = False
+        while not checker.exit_handler.exit_flag:
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await _wait_readable(channel, remaining):
+                break
+            data = channel.recv(65535)
+            if not data:
+                complete = True
+                break
+            buffer.append(data)
+
+        output = buffer.getvalue()
+        if known is None and checker._exec_probe_failed(channel, output):
+            raise RuntimeError("exec 无输出")
+        if not complete:
+            logging.warning(f"[{device_ip}] exec 等待输出结束超时: {command}")
+    except Exception as e:
+        if known:
+            logging.error(f"[{device_ip}] exec 命令执行异常: {command}, 错误: {e}")
+            return f"ERROR: {str(e)}"
+        logging.info(f"[{device_ip}] 设备不支持 exec_command，回退交互式通道: {e}")
+        checker._set_exec_support(device_ip, False)
+        return None
+    finally:
+        if channel is not None:
+            channel.close()
+
+    if known is None:
+        checker._set_exec_support(device_ip, True)
+    return checker._clean_exec_output(output)
+
+
+async def _execute_auto(ssh, channel, command, checker, device_ip, executor):
+    """协程版 checker.execute_command_auto，返回 (output, channel)"""
+    if channel is None and checker.is_readonly_command(command):
+        output = await _exec_command(ssh, command, checker, device_ip, executor)
+        if output is not None:
+            return output, None
+    if channel is None:
+        channel = await _open_shell(ssh, checker, executor)
+    return await _execute_command(channel, command, checker, device_ip), channel
+
+
+async def _execute_parallel(ssh, channel, commands, checker, device_ip, executor, channels):
+    """协程版 checker.execute_commands_parallel：同一连接上多个通道并行执行只读命令，输出按原顺序返回"""
+    n = max(1, min(channels, checker.config['max_channels_per_device'], len(commands)))
+    outputs = [''] * len(commands)
+    pending = iter(enumerate(commands))
+
+    async def worker(slot):
+        ch = channel if slot == 0 else None
+        if ch is None and checker.exec_supported(device_ip) is False:
+            try:
+                ch = await _open_shell(ssh, checker, executor)
+            except Exception as e:
+                if slot == 0:
+                    raise
+                logging.warning(f"[{device_ip}] 打开第 {slot + 1} 个通道失败: {e}")
+                return
+        try:
+            for index, command in pending:
+                outputs[index], ch = await _execute_auto(ssh, ch, command, checker, device_ip, executor)
+        finally:
+            if ch is not None and ch is not channel:
+                ch.close()
+
+    await asyncio.gather(*(worker(slot) for slot in range(n)))
+    return outputs
+
+
+async def _disable_paging(channel, checker, session) -> bool:
+    """协程版 checker.disable_paging"""
+    if checker._is_paging_disabled(channel):
+        return True
+    command = session.profile.disable_paging
+    if not command:
+        return False
+    channel.send(command + '\n')
+    _, matched = await _read_until_prompt(channel, checker, checker.config['cmd_timeout'], session.is_prompt)
+    if not matched:
+        checker.invalidate_shell(channel)
+        return False
+    checker._mark_paging_disabled(channel)
+    return True
+
+
+async def _read_pipelined(channel, checker, session, count):
+    """协程版 read_pipelined，返回 (output, complete)"""
+    loop = asyncio.get_running_loop()
+    watcher = PipelineWatcher(session, count)
+    timeout = checker.config['cmd_timeout']
+    deadline = loop.time() + timeout
+    progress = 0
+
+    while not checker.exit_handler.exit_flag:
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not await _wait_readable(channel, remaining):
+            break
+        data = channel.recv(65535)
+        if not data:
+            break
+        if watcher.feed(data):
+            return watcher.output, True
+        if watcher.boundaries > progress:
+            progress = watcher.boundaries
+            deadline = loop.time() + timeout
+    return watcher.output, False
+
+
+async def _execute_pipelined(ssh, channel, commands, checker, device_ip, executor):
+    """协程版 checker.execute_commands_pipelined，返回 (outputs, channel)"""
+    if channel is None:
+        channel = await _open_shell(ssh, checker, executor)
+    session = checker.get_session_prompt(channel)
+    outputs = []
+
+    if session is not None and await _disable_paging(channel, checker, session):
+        batch_size = max(1, checker.config['pipeline_batch_size'])
+        for start in range(0, len(commands), batch_size):
+            batch = commands[start:start + batch_size]
+            if checker.exit_handler.exit_flag:
+                break
+            started = time.perf_counter()
+            await _throttle_command(checker, device_ip, len(batch))
+            channel.send(''.join(cmd + '\n' for cmd in batch))
+            output, complete = await _read_pipelined(channel, checker, session, len(batch))
+            segments = split_pipelined_output(output, batch, session) if complete else None
+            metrics.observe(checker, 'pipeline', started, output, ok=segments is not None)
+            if segments is None:
+                done = completed_pipelined_output(output, batch, session)
+                outputs.extend(checker._clean_output(seg, cmd, device_ip, session)
+                               for cmd, seg in zip(batch, done))
+                logging.warning(f"[{device_ip}] 流水线输出无法切分（本批已完成 {len(done)}/{len(batch)} 条），"
+                                f"改为逐条执行剩余命令")
+                checker.invalidate_shell(channel)
+                channel.close()
+                channel = await _open_shell(ssh, checker, executor)
+                break
+            outputs.extend(checker._clean_output(seg, cmd, device_ip, session)
+                           for cmd, seg in zip(batch, segments))
+
+    for cmd in commands[len(outputs):]:
+        outputs.append(await _execute_command(channel, cmd, checker, device_ip))
+    return outputs, channel
+
+
+@metrics.timed('device', checker_arg=2)
+async def run_device_async(device_info, cmds, checker, executor, logger_factory=logging.getLogger,
+                           parallel_channels=1, pipeline=False, incremental=None):
+    """单台设备的协程版 run_device，返回结构与 run_device 相同"""
+    ip = device_info['ip']
+    loop = asyncio.get_running_loop()
+
+    logger = logger_factory(ip)
+    logger.info(f"开始处理设备 {ip}")
+
+    connect_info = {
+        'ip': ip,
+        'username': device_info['user'],
+        'password': device_info['pwd'],
+        **{k: device_info[k] for k in ('port', 'vendor', 'site', 'aaa', 'profile') if device_info.get(k)},
+    }
+    throttled = checker.throttle is not None
+    attempt = 1
+    while True:
+        if throttled:
+            # 站点/AAA 令牌桶在协程中等待，不占用握手线程
+            delay = checker.throttle.connect_delay(connect_info)
+            if delay:
+                await asyncio.sleep(delay)
+        ssh = await loop.run_in_executor(executor, checker.safe_connect, connect_info, throttled, attempt)
+        # 重试退避同样在协程中等待，握手线程只做单次连接尝试
+        delay = None if ssh else checker.retry_delay(ip)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+        attempt += 1
+    if not ssh:
+        error = f"连接失败（checker）: {checker.connect_error(ip) or '未知原因'}"
+        logger.error(error)
+        return {'ip': ip, 'success': False, 'error': error}
+
+    pooled = checker.pool is not None and checker.pool.owns(ssh)
+    channel = None
+    try:
+        outputs = []
+        cmd_list = [cmd for cmd in cmds if cmd.strip()]
+        readonly = all(checker.is_readonly_command(cmd) for cmd in cmd_list)
+        indicator = None
+        indicator_cmd = incremental.indicator_command(device_info.get('vendor')) if incremental else None
+        if indicator_cmd and readonly:
+            indicator_out, channel = await _execute_auto(ssh, channel, indicator_cmd, checker, ip, executor)
+            indicator, previous = incremental.evaluate(ip, cmd_list, indicator_out)
+            if previous is not None:
+                logger.info('设备未变化，跳过命令执行')
+                return {'ip': ip, 'success': True, 'unchanged': True, 'indicator': indicator,
+                        'outputs': previous}
+        if pipeline and readonly:
+            outs, channel = await _execute_pipelined(ssh, channel, cmd_list, checker, ip, executor)
+        elif parallel_channels > 1 and readonly:
+            outs = await _execute_parallel(ssh, None, cmd_list, checker, ip, executor, parallel_channels)
+        else:
+            outs = []
+            for cmd in cmd_list:
+                out, channel = await _execute_auto(ssh, channel, cmd, checker, ip, executor)
+                outs.append(out)
+        for cmd, out in zip(cmd_list, outs):
+            outputs.append({'cmd': cmd, 'output': out})
+            logger.info('CMD: %s => %d chars', cmd, len(out))
+
+        logger.info('所有命令执行完成')
+        result = {'ip': ip, 'success': True, 'outputs': outputs}
+        if incremental is not None:
+            result['indicator'] = indicator
+        return result
+    except Exception as e:
+        logger.error('执行过程异常: %s', str(e))
+        checker.invalidate_shell(channel)
+        return {'ip': ip, 'success': False, 'error': str(e)}
+    finally:
+        if pooled:
+            # 归还连接池，不发送 quit、不等待
+            checker.safe_disconnect(ssh, channel, ip)
+        else:
+            # 与 checker.safe_disconnect 等价，但 quit 之后的等待不阻塞事件循环
+            started = time.perf_counter()
+            if channel is not None and checker.config['safe_disconnect']:
+                try:
+                    channel.send('quit\n')
+                    await asyncio.sleep(0.5)
+                except Exception:
+                    pass
+            try:
+                await loop.run_in_executor(executor, ssh.close)
+                metrics.observe(checker, 'disconnect', started)
+            except Exception as e:
+                logging.warning(f"[{ip}] 断开连接时异常: {e}")
+
+
+async def run_devices_async(devices, cmds, checker, max_sessions=1000, connect_workers=64,
+                            logger_factory=logging.getLogger, on_result=None, parallel_channels=1,
+                            pipeline=False, incremental=None):
+    """
+    并发处理所有设备
+    max_sessions: 同时在途的会话数上限（协程 worker 数），决定内存占用上限
+    connect_workers: 执行阻塞握手/关闭的线程数
+    on_result: 每台设备完成时回调 on_result(device, result)；提供回调时不再汇总返回结果（返回空列表），
+               由回调负责落盘，避免整批输出常驻内存
+    parallel_channels: >1 时只读命令在同一连接上多通道并行
+    pipeline: True 时只读命令整批写入交互式通道
+    incremental: FingerprintStore，提供时未变化的设备跳过命令执行
+    checker.limiter 存在时，在途会话数由自适应并发控制器决定（max_sessions 为上界）
+    """
+    _raise_nofile_limit()
+    results = []
+    pending = iter(devices)  # worker 共享迭代器，按需取设备，不预先创建全部任务
+
+    limiter = checker.limiter
+
+    async def worker():
+        for device in pending:
+            if checker.exit_handler.exit_flag:
+                break
+            if limiter is not None:
+                await limiter.acquire_async()
+            try:
+                result = await run_device_async(device, cmds, checker, executor, logger_factory,
+                                                parallel_channels, pipeline, incremental)
+            except Exception as exc:
+                result = {'ip': device['ip'], 'success': False, 'error': f'执行异常: {str(exc)}'}
+            finally:
+                if limiter is not None:
+                    await limiter.release_async()
+            if on_result:
+                on_result(device, result)
+            else:
+                results.append(result)
+
+    n_workers = max(1, min(max_sessions, len(devices)))
+    with ThreadPoolExecutor(max_workers=connect_workers, thread_name_prefix='ssh-connect') as executor:
+        await asyncio.gather(*(worker() for _ in range(n_workers)))
+    return results
+
+
+def run_devices(devices, cmds, checker, **kwargs):
+    """同步入口，供 main() 直接调用"""
+    return asyncio.run(run_devices_async(devices, cmds, checker, **kwargs))
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+吞吐基准测试（本地虚拟设备，不连真实交换机）
+启动 mock_device 虚拟设备组（默认在子进程中运行，CPU/内存只统计本进程），按 N 台设备 × M 条命令驱动：
+    run_device       Increase_Paramiko 的单台设备处理（checker 方式），执行 M 条命令
+    check_device_ntp NetworkDeviceChecker 的 NTP 检查（NTP 命令 + 命令集中的第一条作为自定义命令）
+输出每个目标的 设备数/分钟、单台设备耗时 p50/p99、CPU 秒数/占用率、峰值 RSS（进程启动以来的峰值）。
+用法:
+    python bench_throughput.py --devices 200 --commands 3 --workers 50 --rtt 0.02
+    python bench_throughput.py --devices 50 --target run_device --pipeline --output-size 262144 --json bench.json
+    python bench_throughput.py --external --base-port 20000 --devices 100    # 使用已启动的 mock_device.py
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import log_pipeline
+import metrics
+import mock_device
+import port_scan
+from check_paramiko import NetworkDeviceChecker
+from Increase_Paramiko import run_device
+
+# 命令集：按顺序取前 M 条（超出时循环）
+COMMAND_SET = [
+    'display current-configuration',
+    'display version',
+    'display interface brief',
+    'display clock',
+]
+TARGETS = ('run_device', 'check_device_ntp')
+READY_TIMEOUT = 60  # 等待虚拟设备端口就绪的最长时间（秒）
+
+
+def _usage():
+    """(CPU 秒数, 峰值 RSS 字节)；无 resource 模块时峰值 RSS 为 None"""
+    if resource is None:
+        return time.process_time(), None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return usage.ru_utime + usage.ru_stime, rss
+
+
+def start_fleet(args):
+    """按参数启动虚拟设备子进程，端口全部可连后返回进程对象"""
+    cmd = [sys.executable, str(Path(__file__).with_name('mock_device.py')),
+           '--count', str(args.devices), '--base-port', str(args.base_port),
+           '--vendor', args.vendor, '--username', args.username, '--password', args.password,
+           '--rtt', str(args.rtt), '--auth-delay', str(args.auth_delay),
+           '--output-size', str(args.output_size), '--page-lines', str(args.page_lines)]
+    if not args.exec:
+        cmd.append('--no-exec')
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(args)
+    except Exception:
+        proc.terminate()
+        raise
+    return proc
+
+
+def wait_ready(args):
+    pending = [('127.0.0.1', args.base_port + i) for i in range(args.devices)]
+    deadline = time.monotonic() + READY_TIMEOUT
+    while pending:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"虚拟设备未就绪: {len(pending)} 个端口不可连")
+        results = port_scan.scan(pending, timeout=1.0)
+        pending = [target for target, reason in results.items() if reason is not None]
+        if pending:
+            time.sleep(0.2)
+
+
+def targets(args):
+    return [{'ip': '127.0.0.1', 'port': args.base_port + i, 'vendor': args.vendor,
+             'user': args.username, 'pwd': args.password,
+             'username': args.username, 'password': args.password}
+            for i in range(args.devices)]
+
+
+def bench_target(target, devices, cmds, args):
+    """驱动一个目标跑完全部设备，返回结果行"""
+    phase_metrics = metrics.PhaseMetrics() if args.phases else None
+    checker = NetworkDeviceChecker({
+        'ssh_timeout': args.timeout,
+        'cmd_timeout': args.timeout,
+        'vendor': args.vendor,
+        'enable_logging': False,
+    }, phase_metrics=phase_metrics)
+
+    if target == 'run_device':
+        def run_one(device):
+            result = run_device(device, cmds, checker, pipeline=args.pipeline)
+            return result.get('success', False), result.get('error')
+    else:
+        def run_one(device):
+            result = checker.check_device_ntp(device, custom_cmd=cmds[0] if cmds else None)
+            return result['status'] == 'success', result.get('error')
+
+    latencies = []
+    errors = []
+
+    def timed_one(device):
+        started = time.perf_counter()
+        try:
+            ok, error = run_one(device)
+        except Exception as e:
+            ok, error = False, str(e)
+        latencies.append(time.perf_counter() - started)
+        if not ok:
+            errors.append(f"{device['ip']}:{device['port']} {error}")
+
+    cpu_before, _ = _usage()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(timed_one, devices))
+    wall = time.perf_counter() - started
+    cpu_after, peak_rss = _usage()
+
+    latencies.sort()
+    row = {
+        'target': target,
+        'devices': len(devices),
+        'commands': len(cmds),
+        'workers': args.workers,
+        'failed': len(errors),
+        'seconds': round(wall, 3),
+        'devices_per_min': round(len(devices) / wall * 60, 1) if wall else 0.0,
+        'p50': round(metrics.percentile(latencies, 0.5), 4),
+        'p99': round(metrics.percentile(latencies, 0.99), 4),
+        'cpu_seconds': round(cpu_after - cpu_before, 3),
+        'cpu_percent': round((cpu_after - cpu_before) / wall * 100, 1) if wall else 0.0,
+        'peak_rss_mb': round(peak_rss / 1024 / 1024, 1) if peak_rss is not None else None,
+        'errors': errors[:10],
+    }
+    if phase_metrics is not None:
+        row['phases'] = phase_metrics.summary()['phases']
+        print(f"\n[{target}] 分阶段耗时\n{phase_metrics.report()}")
+    return row
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='吞吐基准测试（本地虚拟 H3C/Huawei 设备）')
+    parser.add_argument('--devices', type=int, default=100, help='虚拟设备数 N')
+    parser.add_argument('--commands', type=int, default=3, help='每台设备执行的命令数 M')
+    parser.add_argument('--target', choices=TARGETS + ('all',), default='all', help='被测函数')
+    parser.add_argument('--workers', type=int, default=20, help='并发线程数')
+    parser.add_argument('--pipeline', action='store_true', help='run_device 使用流水线模式')
+    parser.add_argument('--phases', action='store_true', help='同时统计分阶段耗时（metrics）')
+    parser.add_argument('--timeout', type=float, default=30, help='连接/命令超时（秒）')
+    parser.add_argument('--base-port', type=int, default=20000, help='第一台虚拟设备的端口')
+    parser.add_argument('--external', action='store_true', help='不启动虚拟设备，使用已运行的 mock_device.py')
+    parser.add_argument('--json', help='结果另存为 JSON')
+    mock_device.add_profile_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 虚拟设备每次启动都生成新的主机密钥
+    warnings.filterwarnings('ignore', message='Unknown .* host key')
+    # 设备日志照常落盘（计入被测开销），控制台只留基准输出
+    log_pipeline.start(log_dir='logs/bench', main_log='logs/bench/bench.log', console=False)
+    cmds = [COMMAND_SET[i % len(COMMAND_SET)] for i in range(args.commands)]
+    devices = targets(args)
+    selected = TARGETS if args.target == 'all' else (args.target,)
+
+    fleet = None
+    if not args.external:
+        print(f"启动 {args.devices} 台虚拟设备（端口 {args.base_port} 起，rtt={args.rtt}s，"
+              f"输出 {args.output_size} 字节）...")
+        fleet = start_fleet(args)
+    else:
+        wait_ready(args)
+
+    rows = []
+    try:
+        for target in selected:
+            rows.append(bench_target(target, devices, cmds, args))
+    finally:
+        if fleet is not None:
+            fleet.terminate()
+            fleet.wait(timeout=10)
+        log_pipeline.shutdown()
+
+    print(f"\n{'目标':<18}{'设备':>6}{'命令':>6}{'失败':>6}{'设备/分钟':>12}{'p50(s)':>10}{'p99(s)':>10}"
+          f"{'CPU(s)':>10}{'CPU%':>8}{'峰值RSS(MB)':>14}")
+    for row in rows:
+        rss = f"{row['peak_rss_mb']:.1f}" if row['peak_rss_mb'] is not None else '-'
+        print(f"{row['target']:<18}{row['devices']:>6}{row['commands']:>6}{row['failed']:>6}"
+              f"{row['devices_per_min']:>12.1f}{row['p50']:>10.3f}{row['p99']:>10.3f}"
+              f"{row['cpu_seconds']:>10.2f}{row['cpu_percent']:>8.1f}{rss:>14}")
+        for error in row['errors']:
+            print(f"  ERROR: {error}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n结果已保存: {args.json}")
+    return 0 if all(not row['failed'] for row in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
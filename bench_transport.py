@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSH 传输配置档基准测试
+对同一台设备逐个配置档测量：
+    握手耗时   TCP + 密钥交换 + 认证（多次取中位数/最大值）
+    吞吐       在一条连接上重复执行命令（默认 display current-configuration），按收到的字节数计算
+用法:
+    python bench_transport.py --host 10.0.0.1 --user admin --password xxx
+    python bench_transport.py --host 10.0.0.1 --user admin --password xxx \
+        --profiles default,bulk-transfer --command "display diagnostic-information" --csv bench.csv
+config.json 中 ssh.transport_profiles 定义的配置档同样可测。
+"""
+import argparse
+import csv
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from check_paramiko import NetworkDeviceChecker
+import transport_profiles
+
+CONFIG_FILE = Path('config.json')
+
+
+def load_custom_profiles():
+    """读取 config.json 中自定义的传输配置档"""
+    if not CONFIG_FILE.exists():
+        return {}
+    try:
+        with open(CONFIG_FILE, encoding='utf-8') as f:
+            return (json.load(f).get('ssh') or {}).get('transport_profiles') or {}
+    except (OSError, ValueError) as e:
+        print(f"⚠ 配置文件读取失败，只测试内置配置档: {e}")
+        return {}
+
+
+def bench_profile(name, args, custom_profiles):
+    """测量一个配置档，返回结果行"""
+    checker = NetworkDeviceChecker({
+        'ssh_port': args.port,
+        'ssh_timeout': args.timeout,
+        'cmd_timeout': args.timeout,
+        'transport_profile': name,
+        'transport_profiles': custom_profiles,
+        'enable_logging': False,
+    })
+    device = {'ip': args.host, 'username': args.user, 'password': args.password}
+    row = {'profile': name}
+
+    handshakes = []
+    for _ in range(args.handshakes):
+        started = time.perf_counter()
+        ssh = checker.safe_connect(device)
+        if ssh is None:
+            row['error'] = checker.connect_error(args.host) or '连接失败'
+            return row
+        handshakes.append(time.perf_counter() - started)
+        ssh.close()
+    row['handshake_median'] = round(statistics.median(handshakes), 4)
+    row['handshake_max'] = round(max(handshakes), 4)
+
+    ssh = checker.safe_connect(device)
+    if ssh is None:
+        row['error'] = checker.connect_error(args.host) or '连接失败'
+        return row
+    channel = None
+    try:
+        transport = ssh.get_transport()
+        row['cipher'] = transport.local_cipher
+        row['compression'] = transport.local_compression
+        received = 0
+        elapsed = 0.0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            output, channel = checker.execute_command_auto(ssh, channel, args.command, args.host)
+            elapsed += time.perf_counter() - started
+            if output.startswith('ERROR:'):
+                row['error'] = output
+                break
+            received += len(output.encode('utf-8'))
+        row['bytes'] = received
+        row['seconds'] = round(elapsed, 3)
+        row['bytes_per_sec'] = round(received / elapsed) if elapsed else 0
+    finally:
+        if channel is not None:
+            channel.close()
+        ssh.close()
+    return row
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='SSH 传输配置档基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--profiles', help='逗号分隔的配置档（默认测试全部内置和 config.json 中的配置档）')
+    parser.add_argument('--command', default='display current-configuration', help='测吞吐用的只读命令')
+    parser.add_argument('--handshakes', type=int, default=5, help='每个配置档的握手次数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个配置档执行命令的次数')
+    parser.add_argument('--timeout', type=float, default=60, help='连接/命令超时（秒）')
+    parser.add_argument('--csv', help='结果另存为 CSV')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    custom_profiles = load_custom_profiles()
+    names = args.profiles.split(',') if args.profiles else list(dict.fromkeys(
+        list(transport_profiles.PROFILES) + list(custom_profiles)))
+
+    rows = []
+    print(f"{'配置档':<22}{'握手中位(s)':>12}{'握手最大(s)':>12}{'吞吐(KB/s)':>12}  算法")
+    for name in names:
+        row = bench_profile(name.strip(), args, custom_profiles)
+        rows.append(row)
+        if 'error' in row:
+            print(f"{row['profile']:<22}  ERROR: {row['error']}")
+            continue
+        print(f"{row['profile']:<22}{row['handshake_median']:>12.3f}{row['handshake_max']:>12.3f}"
+              f"{row['bytes_per_sec'] / 1024:>12.1f}  {row['cipher']}/{row['compression']}")
+
+    if args.csv:
+        fields = ['profile', 'handshake_median', 'handshake_max', 'bytes', 'seconds', 'bytes_per_sec',
+                  'cipher', 'compression', 'error']
+        with open(args.csv, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n结果已保存: {args.csv}")
+    return 0 if all('error' not in row for row in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
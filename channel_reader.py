@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交互式通道读取工具
+event 模式: select 阻塞等待通道可读，读到提示符立即返回（默认）
+sleep 模式: 旧的固定 sleep + recv_ready 轮询，仅作为显式回退
+"""
+import codecs
+import select
+import time
+
+READ_MODES = ('event', 'sleep')
+ABORT_CHECK_INTERVAL = 1.0   # event 模式下检查中断标志的最长间隔（秒）
+PAGER_SCAN_OVERLAP = 32      # 分页符可能跨 chunk，向前多看的字符数
+TAIL_CHARS = 256             # 提示符检测只看输出末尾的字符数
+
+
+class RecvBuffer:
+    """
+    通道接收缓冲
+    原始字节按 chunk 增量解码（多字节 UTF-8 字符跨 chunk 时由解码器暂存），
+    解码结果分块保存，取值时只拼接一次；提示符检测只需要末尾窗口，读取 n 字节总成本 O(n)
+    """
+
+    def __init__(self, encoding: str = 'utf-8'):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='ignore')
+        self._pieces = []
+        self._tail = ''
+        self.nbytes = 0
+
+    def append(self, data: bytes) -> str:
+        """追加原始字节，返回本次新解码出的文本"""
+        self.nbytes += len(data)
+        text = self._decoder.decode(data)
+        if text:
+            self._pieces.append(text)
+            if len(text) >= TAIL_CHARS:
+                self._tail = text[-TAIL_CHARS:]
+            else:
+                self._tail = (self._tail + text)[-TAIL_CHARS:]
+        return text
+
+    @property
+    def tail(self) -> str:
+        """输出末尾窗口（最多 TAIL_CHARS 个字符）"""
+        return self._tail
+
+    def getvalue(self) -> str:
+        """返回完整文本（结果缓存，重复调用不再拷贝）"""
+        if len(self._pieces) > 1:
+            self._pieces = [''.join(self._pieces)]
+        return self._pieces[0] if self._pieces else ''
+
+
+class PromptWatcher:
+    """累积通道输出并判断提示符/分页符，同步与 asyncio 读循环共用"""
+
+    PROMPT = 'prompt'
+    MORE = 'more'
+
+    def __init__(self, is_prompt, has_more=None):
+        self.is_prompt = is_prompt
+        self.has_more = has_more
+        self.buffer = RecvBuffer()
+        self._pager_carry = ''  # 上一段输出末尾，用于识别跨 chunk 的分页符
+
+    @property
+    def output(self) -> str:
+        return self.buffer.getvalue()
+
+    def feed(self, data: bytes):
+        """追加一段原始输出，返回 PROMPT / MORE / None"""
+        text = self.buffer.append(data)
+        if not text:
+            return None
+
+        # 提示符后面不会再跟换行，以换行结尾的输出一定还没结束
+        tail = self.buffer.tail
+        if tail[-1] not in '\r\n' and self.is_prompt(tail):
+            return self.PROMPT
+
+        if self.has_more:
+            window = self._pager_carry + text
+            if self.has_more(window):
+                # 已处理的分页符不再保留，避免对同一个分页符重复翻页
+                self._pager_carry = ''
+                return self.MORE
+            self._pager_carry = window[-PAGER_SCAN_OVERLAP:]
+        return None
+
+
+class PipelineWatcher:
+    """
+    流水线读取：一次发送 count 条命令后，累积输出直到见到 count-1 个“提示符+回显”行
+    且输出末尾为提示符。只扫描新到达的完整行，总成本 O(n)
+    """
+
+    def __init__(self, session, count: int):
+        self.session = session
+        self.count = count
+        self.buffer = RecvBuffer()
+        self.boundaries = 0      # 已见到的命令分界数
+        self._partial = ''       # 尚未收到换行的末行
+
+    @property
+    def output(self) -> str:
+        return self.buffer.getvalue()
+
+    def feed(self, data: bytes) -> bool:
+        """追加一段原始输出，全部命令输出结束时返回 True"""
+        text = self.buffer.append(data)
+        if not text:
+            return False
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        self.boundaries += sum(1 for line in lines if self.session.echo_of(line) is not None)
+        return self.boundaries >= self.count - 1 and self.session.is_prompt(self.buffer.tail)
+
+
+def _pipelined_segments(text: str, session):
+    """按“提示符+回显”行切分，返回 (各段行列表, 各段回显)；首段没有回显（None）"""
+    segments = [[]]
+    echoes = [None]
+    for line in text.split('\n'):
+        echo = session.echo_of(line)
+        if echo is not None:
+            segments.append([line])
+            echoes.append(echo)
+        else:
+            segments[-1].append(line)
+    return segments, echoes
+
+
+def _echo_matches(command: str, echo: str) -> bool:
+    expected = ' '.join(command.split())
+    echo = ' '.join(echo.split())
+    # 设备可能截断过长的回显
+    return echo == expected or expected.startswith(echo) or echo.startswith(expected)
+
+
+def split_pipelined_output(text: str, commands, session):
+    """
+    按“提示符+回显”行把流水线输出切分为每条命令的原始输出（每段以回显行开头）
+    分段数或回显与命令对不上时返回 None
+    """
+    segments, echoes = _pipelined_segments(text, session)
+    if len(segments) != len(commands):
+        return None
+    if not all(_echo_matches(command, echo) for command, echo in zip(commands[1:], echoes[1:])):
+        return None
+    return ['\n'.join(seg) for seg in segments]
+
+
+def completed_pipelined_output(text: str, commands, session):
+    """
+    流水线输出无法完整切分时，取出确定已执行完的前几条命令的输出：
+    某条命令之后出现了下一条命令的“提示符+回显”行，它的输出才算完整。其余命令需要重新执行
+    """
+    segments, echoes = _pipelined_segments(text, session)
+    completed = []
+    for i, echo in enumerate(echoes[1:len(commands)], 1):
+        if not _echo_matches(commands[i], echo):
+            break
+        completed.append('\n'.join(segments[i - 1]))
+    return completed
+
+
+def wait_readable(channel, timeout: float) -> bool:
+    """阻塞等待通道可读（有数据、EOF 或关闭），超时返回 False"""
+    if channel.recv_ready() or channel.closed or channel.eof_received:
+        return True
+    readable, _, _ = select.select([channel], [], [], max(timeout, 0))
+    return bool(readable)
+
+
+def read_until_prompt(channel, is_prompt, timeout: float, has_more=None,
+                      mode: str = 'event', abort=None, poll_interval: float = 0.1):
+    """
+    读取通道输出，直到出现提示符或超过截止时间
+    is_prompt: 判断输出末尾是否为提示符的函数
+    has_more: 判断是否出现分页符的函数，出现时自动发送空格翻页
+    abort: 返回 True 时提前结束（如优雅退出标志）
+    返回 (output, matched)，matched 表示是否在截止时间前读到提示符
+    """
+    if mode not in READ_MODES:
+        raise ValueError(f"不支持的读取模式: {mode}")
+
+    watcher = PromptWatcher(is_prompt, has_more)
+    deadline = time.monotonic() + timeout
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (abort and abort()):
+            return watcher.output, False
+
+        if mode == 'event':
+            if not wait_readable(channel, min(remaining, ABORT_CHECK_INTERVAL)):
+                continue
+        elif not channel.recv_ready():
+            if channel.closed or channel.eof_received:
+                return watcher.output, False
+            time.sleep(poll_interval)
+            continue
+
+        data = channel.recv(65535)
+        if not data:
+            # 对端关闭通道
+            return watcher.output, False
+
+        state = watcher.feed(data)
+        if state == PromptWatcher.PROMPT:
+            return watcher.output, True
+        if state == PromptWatcher.MORE:
+            channel.send(' ')
+            if mode == 'sleep':
+                time.sleep(0.3)
+
+
+def read_pipelined(channel, session, count: int, timeout: float, abort=None):
+    """
+    读取一次性发送的 count 条命令的输出；timeout 为相邻两个命令分界之间的最长等待
+    返回 (output, complete)
+    """
+    watcher = PipelineWatcher(session, count)
+    deadline = time.monotonic() + timeout
+    progress = 0
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (abort and abort()):
+            return watcher.output, False
+        if not wait_readable(channel, min(remaining, ABORT_CHECK_INTERVAL)):
+            continue
+        data = channel.recv(65535)
+        if not data:
+            return watcher.output, False
+        if watcher.feed(data):
+            return watcher.output, True
+        if watcher.boundaries > progress:
+            progress = watcher.boundaries
+            deadline = time.monotonic() + timeout
+
+
+def read_until_eof(channel, timeout: float, abort=None):
+    """
+    读取非交互（exec）通道直到对端发送 EOF，无需提示符判断
+    返回 (output, complete)，complete 表示是否在截止时间前读到 EOF
+    """
+    buffer = RecvBuffer()
+    deadline = time.monotonic() + timeout
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (abort and abort()):
+            return buffer.getvalue(), False
+        if not wait_readable(channel, min(remaining, ABORT_CHECK_INTERVAL)):
+            continue
+        data = channel.recv(65535)
+        if not data:
+            return buffer.getvalue(), True
+        buffer.append(data)
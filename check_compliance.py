@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全网合规检查（NTP / SNMP / 日志 / AAA / Telnet / 登录提示等，见 compliance.DEFAULT_CHECKS）
+每台设备只登录一次：检查所需命令合并去重（完整配置只拉取一次），全部检查针对同一份输出评估。
+用法:
+    python check_compliance.py devices.csv                                  # 内置检查
+    python check_compliance.py devices.csv --checks checks.json --workers 20 --vendor h3c
+    python check_compliance.py devices.csv --save-outputs    # 另存原始输出，供 parsers.py 做结构化分析
+设备清单列: ip, username/user, password/pwd, 可选 vendor/port/profile
+"""
+import argparse
+import logging
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import compliance
+import log_pipeline
+import retry_policy
+from check_paramiko import NetworkDeviceChecker
+from result_sink import ResultWriter
+
+
+def load_devices(path, vendor=''):
+    df = pd.read_csv(path, encoding='utf-8', dtype=str).fillna('')
+    devices = []
+    for row in df.to_dict('records'):
+        row.setdefault('username', row.get('user', ''))
+        row.setdefault('password', row.get('pwd', ''))
+        if not row.get('vendor'):
+            row['vendor'] = vendor
+        if row.get('port'):
+            row['port'] = int(row['port'])
+        devices.append(row)
+    return devices
+
+
+def report_rows(results, checks):
+    """每台设备一行，每项检查一列（通过/不通过/不适用），另附未通过原因"""
+    rows = []
+    for result in results:
+        row = {'ip': result['ip'], 'vendor': result['vendor'], 'status': result['status'],
+               'compliant': result['compliant'] if result['status'] == 'success' else None}
+        for check in checks:
+            outcome = result['checks'].get(check.name)
+            row[check.name] = None if outcome is None else outcome['passed']
+        row['reasons'] = '; '.join(f"{name}: {result['checks'][name]['reason']}" for name in result['failed'])
+        row['error'] = result['error']
+        rows.append(row)
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='全网合规检查（每台设备一个会话评估全部检查）')
+    parser.add_argument('devices', help='设备清单 CSV')
+    parser.add_argument('--checks', help='检查定义 JSON 文件（缺省使用内置检查）')
+    parser.add_argument('--workers', type=int, default=8, help='并发设备数')
+    parser.add_argument('--vendor', default='', help='清单中没有 vendor 列时的默认厂商')
+    parser.add_argument('--output', help='结果 CSV（缺省 compliance_<时间>.csv）')
+    parser.add_argument('--save-outputs', action='store_true',
+                        help='原始输出另存到 results/compliance_<时间>.jsonl（parsers.py 可直接读取）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not Path(args.devices).exists():
+        sys.exit(f'设备清单不存在: {args.devices}')
+    try:
+        checks = compliance.load_checks(args.checks)
+    except (OSError, ValueError, KeyError) as e:
+        sys.exit(f'ERROR: 检查定义无效: {e}')
+    devices = load_devices(args.devices, args.vendor)
+    rules = compliance.RuleSet(checks)  # 规则只编译一次，所有设备共用
+    output_file = args.output or f'compliance_{datetime.now().strftime("%Y%m%d_%H%M")}.csv'
+
+    plans = Counter(tuple(compliance.plan_commands(checks, d['vendor'])) for d in devices)
+    print(f"设备 {len(devices)} 台，检查 {len(checks)} 项: {', '.join(c.name for c in checks)}")
+    for commands, count in plans.items():
+        print(f"  {count} 台设备执行 {len(commands)} 条命令: {'; '.join(commands)}")
+
+    # 控制台只留检查进度，日志写文件
+    log_pipeline.start(main_log='compliance_check.log', console=False)
+    retry, breaker = retry_policy.from_config(
+        {'attempts': 3, 'circuit_breaker': {'path': 'compliance_circuit_breaker.json'}})
+    checker = NetworkDeviceChecker({'enable_logging': False, 'log_file': 'compliance_check.log'},
+                                   retry=retry, breaker=breaker)
+    writer = ResultWriter('results', prefix='compliance') if args.save_outputs else None
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(checker.check_device_compliance, d, rules, writer is not None): d['ip']
+                       for d in devices}
+            for completed, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"处理设备 {futures[future]} 时异常: {e}")
+                    continue
+                if writer is not None:
+                    writer.write({'ip': result['ip'], 'success': result['status'] == 'success',
+                                  'error': result['error'], 'outputs': result.pop('outputs', [])})
+                results.append(result)
+                state = '✅' if result['compliant'] else '⚠️ ' if result['status'] == 'success' else '❌'
+                detail = result['error'] or ', '.join(result['failed']) or '全部通过'
+                print(f"[{completed}/{len(futures)}] {state} {result['ip']:15} {detail}")
+    finally:
+        if writer is not None:
+            writer.close()
+        if breaker:
+            breaker.save()
+        log_pipeline.shutdown()
+
+    pd.DataFrame(report_rows(results, checks)).to_csv(output_file, index=False, encoding='utf-8-sig')
+    checked = [r for r in results if r['status'] == 'success']
+    print(f"\n检查完成: 成功 {len(checked)}/{len(results)} 台，全部合规 {sum(r['compliant'] for r in checked)} 台")
+    for check in checks:
+        evaluated = [r['checks'][check.name]['passed'] for r in checked if check.name in r['checks']]
+        print(f"  {check.name:<10} 通过 {sum(evaluated)}/{len(evaluated)}  {check.description}")
+    print(f"结果已保存: {output_file}")
+    if writer is not None:
+        print(f"原始输出: {writer.jsonl_path}")
+    return 0 if len(checked) == len(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,6 +9,42 @@ import os
 import sys
 from typing import Dict, List, Optional, Tuple
 import signal
+import threading
+import weakref
+from functools import partial
+from channel_reader import (completed_pipelined_output, read_pipelined, read_until_eof, read_until_prompt,
+                            split_pipelined_output)
+from prompt_profiles import MORE_PATTERNS, SessionPrompt, get_profile, learn_prompt
+from conn_pool import SSHConnectionPool
+from incremental import DiffReport, FingerprintStore
+import concurrency
+import rate_limit
+import retry_policy
+import transport_profiles
+import log_pipeline
+import metrics
+import recording
+import parsers
+import compliance
+import rule_engine
+import socket
+
+# 通用提示符规则（未学习到会话提示符前使用）：>, ], # 结尾
+GENERIC_PROMPT_RE = re.compile(r'[>\]#]\s*$')
+MORE_PROMPT_RE = re.compile('|'.join(re.escape(p) for p in MORE_PATTERNS))
+# 翻页后设备用于擦除分页符的光标控制序列（如 ESC[16D）
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+
+# 危险命令列表（只读模式下会警告）
+DANGEROUS_COMMANDS = [
+    'system-view', 'configure', 'write', 'save', 'reboot',
+    'reset', 'delete', 'format', 'shutdown', 'undo', 'clear'
+]
+# 只读命令白名单
+READONLY_WHITELIST = [
+    'display', 'show', 'dir', 'ping', 'tracert', 'telnet',
+    'ssh', 'ifconfig', 'ipconfig', 'netstat', 'ip route'
+]
 
 class GracefulExit:
     """优雅退出处理"""
@@ -22,16 +58,26 @@ class GracefulExit:
         print("\n🛑 接收到退出信号，正在优雅退出...")
 
 class NetworkDeviceChecker:
-    def __init__(self, config: Dict = None):
+    def __init__(self, config: Dict = None, pool: Optional[SSHConnectionPool] = None, limiter=None,
+                 throttle=None, retry=None, breaker=None, phase_metrics=None, recorder=None, replay=None):
         # 默认配置
         default_config = {
             'ssh_timeout': 15,           # SSH连接超时
+            'ssh_port': 22,              # SSH端口（设备信息中的 port 优先）
             'cmd_timeout': 15,           # 命令执行超时
             'max_workers': 10,           # 最大并发数（生产环境调低）
             'readonly_mode': True,       # 只读模式
+            'vendor': '',                # 默认厂商（h3c/huawei/cisco），为空时按提示符自动识别
             'test_mode': False,          # 测试模式
             'max_test_devices': 3,       # 测试模式最大设备数
-            'rate_limit_delay': 0.5,     # 命令间延迟（秒）
+            'rate_limit_delay': 0.5,     # 命令间延迟（秒，仅 sleep 读取模式）
+            'exec_mode': 'auto',         # auto: 探测并缓存设备是否支持 exec_command; shell: 仅交互式; exec: 仅 exec
+            'read_mode': 'event',        # event: 等待通道可读并检测提示符; sleep: 旧的固定延时轮询
+            'banner_timeout': 5,         # 登录后等待首个提示符的超时（秒）
+            'max_channels_per_device': 4,  # 单台设备并行会话通道上限（保护设备控制平面）
+            'pipeline_batch_size': 50,   # 流水线模式每次写入的命令条数
+            'transport_profile': 'default',  # SSH 传输配置档（见 transport_profiles），设备信息中的 profile 优先
+            'transport_profiles': {},    # 自定义/覆盖传输配置档
             'safe_disconnect': True,     # 安全断开连接
             'enable_logging': True,      # 启用详细日志
             'log_file': 'network_checker.log'
@@ -40,57 +86,82 @@ class NetworkDeviceChecker:
         self.config = {**default_config, **(config or {})}
         self.exit_handler = GracefulExit()
         
+        # 可选连接池：多个检查/任务复用同一设备的已认证连接
+        self.pool = pool
+        # 可选自适应并发控制器（AdaptiveConcurrency）：新建连接的耗时和结果反馈给它
+        self.limiter = limiter
+        # 可选令牌桶限速（RateLimiter）：按设备限命令速率，按站点/AAA 限新建会话速率
+        self.throttle = throttle
+        # 可选连接重试策略（RetryPolicy）与熔断器（CircuitBreaker），未提供时只尝试一次
+        self.retry = retry
+        self.breaker = breaker
+        # 可选分阶段耗时统计（metrics.PhaseMetrics）
+        self.metrics = phase_metrics
+        # 可选会话录制（recording.SessionRecorder）；提供 replay（recording.ReplaySource）时不连设备，回放录制
+        self.recorder = recorder
+        self.replay = replay
+        # 最近一次连接失败的原因（ip -> 描述）
+        self._connect_errors = {}
+        # 按次连接（safe_connect 指定 attempt）失败后建议的重试等待（ip -> 秒），由调用方取走
+        self._retry_delays = {}
+        # 传输配置档对应的 connect 参数（配置档名 -> kwargs）
+        self._transport_kwargs = {}
+        
+        # 每个交互通道学习到的提示符（通道释放后自动清除）
+        self._session_prompts = weakref.WeakKeyDictionary()
+        # 设备是否支持 exec_command 的探测结果（ip -> bool）
+        self._exec_support = {}
+        
+        # 状态不确定（读超时/异常）的通道，不放回连接池
+        self._dirty_channels = weakref.WeakSet()
+        # 已关闭分页的通道
+        self._paging_disabled = weakref.WeakSet()
+        self._session_lock = threading.Lock()
+        
         # 初始化日志
         self._setup_logging()
         
-        # 危险命令列表（只读模式下会警告）
-        self.dangerous_commands = [
-            'system-view', 'configure', 'write', 'save', 'reboot',
-            'reset', 'delete', 'format', 'shutdown', 'undo', 'clear'
-        ]
-        
-        # 只读命令白名单
-        self.readonly_whitelist = [
-            'display', 'show', 'dir', 'ping', 'tracert', 'telnet',
-            'ssh', 'ifconfig', 'ipconfig', 'netstat', 'ip route'
-        ]
+        # 危险命令列表与只读白名单（按实例复制，可单独调整）
+        self.dangerous_commands = list(DANGEROUS_COMMANDS)
+        self.readonly_whitelist = list(READONLY_WHITELIST)
+        # 上面两个列表的编译结果与按命令缓存的判定（首次使用时构建）
+        self._command_policy = None
         
         logging.info(f"网络设备检查器初始化完成，配置: {self.config}")
     
     def _setup_logging(self):
-        """配置日志系统"""
+        """配置日志系统（经 log_pipeline 异步写入，进程内已启动时沿用）"""
         log_level = logging.DEBUG if self.config['enable_logging'] else logging.INFO
-        
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.config['log_file'], encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)  # 同时输出到控制台
-            ]
-        )
-        
-        # 降低paramiko日志级别
-        logging.getLogger("paramiko").setLevel(logging.WARNING)
+        log_pipeline.start(main_log=self.config['log_file'], level=log_level)
+    
+    def command_policy(self) -> rule_engine.CommandPolicy:
+        """危险命令/白名单的编译结果，判定按命令缓存，整个运行期间每条命令只判定一次（列表被修改后自动重建）"""
+        policy = self._command_policy
+        if policy is None or not policy.matches(self.dangerous_commands, self.readonly_whitelist):
+            policy = self._command_policy = rule_engine.CommandPolicy(self.dangerous_commands,
+                                                                       self.readonly_whitelist)
+        return policy
     
     def validate_command(self, command: str) -> Tuple[bool, str]:
         """验证命令安全性"""
-        cmd_lower = command.lower().strip()
-        
         if self.config['readonly_mode']:
+            verdict = self.command_policy().verdict(command)
             # 检查是否包含危险命令
-            for dangerous in self.dangerous_commands:
-                if dangerous in cmd_lower:
-                    return False, f"危险命令: {dangerous}"
+            if verdict.dangerous:
+                return False, f"危险命令: {verdict.dangerous}"
             
             # 检查是否是只读命令
-            is_readonly = any(cmd in cmd_lower for cmd in self.readonly_whitelist)
-            if not is_readonly:
+            if not verdict.whitelisted:
                 logging.warning(f"未知命令类型: {command}")
                 # 如果严格模式，可以返回False
         
         return True, "命令安全"
     
+    def is_readonly_command(self, command: str) -> bool:
+        """命令是否为只读命令（以白名单命令开头且不含危险关键字），只读命令之间互不依赖，可并行执行"""
+        return self.command_policy().verdict(command).readonly
+    
+    @metrics.timed('shell_command', command_arg=2)
     def safe_execute_command(self, channel, command: str, device_ip: str = "") -> str:
         """安全执行命令并返回结果"""
         
@@ -110,72 +181,307 @@ class NetworkDeviceChecker:
             logging.debug(f"[{device_ip}] 执行命令: {command}")
             
             # 发送命令
+            if self.throttle is not None:
+                self.throttle.wait_command(device_ip)
             channel.send(command + '\n')
-            time.sleep(self.config['rate_limit_delay'])
-            
-            # 等待并读取输出
-            output = ''
-            start_time = time.time()
-            max_wait = self.config['cmd_timeout']
+            if self.config['read_mode'] == 'sleep':
+                time.sleep(self.config['rate_limit_delay'])
             
-            while time.time() - start_time < max_wait:
-                if channel.recv_ready():
-                    chunk = channel.recv(65535).decode('utf-8', errors='ignore')
-                    output += chunk
-                    
-                    # 检查是否返回命令行提示符
-                    if self._is_command_prompt(chunk):
-                        break
-                    
-                    # 处理分页
-                    if self._has_more_prompt(chunk):
-                        channel.send(' ')
-                        time.sleep(0.3)
-                
-                # 检查退出标志
+            # 等待提示符（每条命令独立截止时间）
+            session = self.get_session_prompt(channel)
+            output, matched = read_until_prompt(
+                channel, session.is_prompt if session else self._is_command_prompt,
+                self.config['cmd_timeout'],
+                has_more=self._has_more_prompt,
+                mode=self.config['read_mode'],
+                abort=lambda: self.exit_handler.exit_flag
+            )
+            if not matched:
+                self.invalidate_shell(channel)
                 if self.exit_handler.exit_flag:
                     logging.info(f"退出标志已设置，中断命令执行")
-                    break
-                    
-                time.sleep(0.1)
+                else:
+                    logging.warning(f"[{device_ip}] 等待提示符超时: {command}")
             
             # 清理输出
-            cleaned = self._clean_output(output, command, device_ip)
+            cleaned = self._clean_output(output, command, device_ip, session)
             return cleaned
             
         except Exception as e:
             logging.error(f"[{device_ip}] 命令执行异常: {command}, 错误: {e}")
             return f"ERROR: {str(e)}"
     
-    def _is_command_prompt(self, text: str) -> bool:
-        """检查是否为命令行提示符"""
-        patterns = [
-            r'[>\]#]\s*$',      # >, ], # 结尾
-            r'[a-zA-Z0-9\-_]+[>#]\s*$',  # hostname> 或 hostname#
-            r'\]\s*$'           # Huawei/Cisco的]提示符
-        ]
-        
-        lines = text.strip().split('\n')
-        if not lines:
-            return False
+    def exec_supported(self, device_ip: str) -> Optional[bool]:
+        """设备是否支持 exec_command：True/False 为已知结果，None 表示尚未探测"""
+        mode = self.config['exec_mode']
+        if mode != 'auto':
+            return mode == 'exec'
+        with self._session_lock:
+            return self._exec_support.get(device_ip)
+    
+    @metrics.timed('exec_command', command_arg=2)
+    def exec_execute_command(self, ssh: paramiko.SSHClient, command: str, device_ip: str = "") -> Optional[str]:
+        """
+        通过 exec_command 执行单条命令，输出以通道 EOF 结束，无需提示符/分页/回显处理
+        设备不支持 exec 时返回 None（首次调用即为探测，结果按设备缓存）
+        """
+        if self.exit_handler.exit_flag:
+            return ""
+        
+        is_safe, reason = self.validate_command(command)
+        if not is_safe:
+            logging.error(f"命令验证失败: {command}, 原因: {reason}")
+            if self.config['readonly_mode']:
+                return f"ERROR: {reason}"
+        
+        known = self.exec_supported(device_ip)
+        if known is False:
+            return None
+        
+        channel = None
+        try:
+            logging.debug(f"[{device_ip}] exec 执行命令: {command}")
+            if self.throttle is not None:
+                self.throttle.wait_command(device_ip)
+            channel = ssh.get_transport().open_session(timeout=self.config['cmd_timeout'])
+            channel.settimeout(self.config['cmd_timeout'])
+            channel.exec_command(command)
+            output, complete = read_until_eof(
+                channel, self.config['cmd_timeout'],
+                abort=lambda: self.exit_handler.exit_flag
+            )
+            if known is None and self._exec_probe_failed(channel, output):
+                raise paramiko.SSHException("exec 无输出")
+            if not complete:
+                logging.warning(f"[{device_ip}] exec 等待输出结束超时: {command}")
+        except Exception as e:
+            if known:
+                logging.error(f"[{device_ip}] exec 命令执行异常: {command}, 错误: {e}")
+                return f"ERROR: {str(e)}"
+            logging.info(f"[{device_ip}] 设备不支持 exec_command，回退交互式通道: {e}")
+            self._set_exec_support(device_ip, False)
+            return None
+        finally:
+            if channel is not None:
+                channel.close()
+        
+        if known is None:
+            self._set_exec_support(device_ip, True)
+        return self._clean_exec_output(output)
+    
+    def execute_command_auto(self, ssh: paramiko.SSHClient, channel, command: str,
+                             device_ip: str = "", vendor: str = None):
+        """
+        执行单条命令：没有交互式通道、命令为只读且设备支持 exec 时走 exec，否则（或探测失败后）
+        按需打开交互式通道执行。返回 (output, channel)，channel 为之后应继续使用的通道。
+        非只读命令可能依赖视图状态（如 sys 之后的配置命令），一旦打开交互式通道，后续命令都在其上执行
+        """
+        if channel is None and self.is_readonly_command(command):
+            output = self.exec_execute_command(ssh, command, device_ip)
+            if output is not None:
+                return output, None
+        if channel is None:
+            channel = self.open_shell(ssh, device_ip, vendor)
+        return self.safe_execute_command(channel, command, device_ip), channel
+    
+    @staticmethod
+    def _exec_probe_failed(channel, output: str) -> bool:
+        """未探测过的设备：没有任何输出且没有正常退出码，视为不支持 exec"""
+        return not output.strip() and not (channel.exit_status_ready() and channel.recv_exit_status() == 0)
+    
+    @staticmethod
+    def _clean_exec_output(output: str) -> str:
+        """exec 输出没有回显和提示符，只去掉空行和行首尾空白，与交互式输出格式一致"""
+        return '\n'.join(line.strip() for line in output.splitlines() if line.strip())
+    
+    def _set_exec_support(self, device_ip: str, supported: bool):
+        with self._session_lock:
+            self._exec_support[device_ip] = supported
+    
+    def _set_exec_support_unknown(self, device_ip: str):
+        with self._session_lock:
+            self._exec_support.pop(device_ip, None)
+    
+    def wait_for_prompt(self, channel, timeout: float = None, fallback_delay: float = 1,
+                        vendor: str = None) -> str:
+        """等待设备回到提示符（登录欢迎信息、视图切换等），返回期间收到的输出；首次调用时学习会话提示符"""
+        session = self.get_session_prompt(channel)
+        if self.config['read_mode'] == 'sleep':
+            time.sleep(fallback_delay)
+            output = channel.recv(65535).decode('utf-8', errors='ignore') if channel.recv_ready() else ''
+        else:
+            output, _ = read_until_prompt(
+                channel, self._banner_prompt_matcher(session, vendor),
+                timeout if timeout is not None else self.config['banner_timeout'],
+                has_more=self._has_more_prompt,
+                abort=lambda: self.exit_handler.exit_flag
+            )
+        
+        if session is None:
+            self.learn_session_prompt(channel, output, vendor)
+        return output
+    
+    def learn_session_prompt(self, channel, text: str, vendor: str = None) -> Optional[SessionPrompt]:
+        """从登录后的输出中学习主机名提示符，之后该通道只匹配此提示符"""
+        session = learn_prompt(text, vendor or self.config['vendor'])
+        if session:
+            with self._session_lock:
+                self._session_prompts[channel] = session
+            logging.debug(f"学习到会话提示符: {session.literal}")
+        return session
+    
+    def execute_commands_parallel(self, ssh: paramiko.SSHClient, channel, commands: List[str],
+                                  device_ip: str = "", channels: int = 2) -> List[str]:
+        """
+        在同一个已认证连接上打开多个会话通道，并行执行互不依赖的只读命令
+        channel 为已打开的主通道（可为 None）；通道数受 max_channels_per_device 限制，
+        额外通道打开失败时用已有通道继续。返回的输出与 commands 顺序一致。
+        """
+        n = max(1, min(channels, self.config['max_channels_per_device'], len(commands)))
+        outputs = [''] * len(commands)
+        pending = iter(enumerate(commands))
+        lock = threading.Lock()
+        
+        def worker(slot: int):
+            ch = channel if slot == 0 else None
+            if ch is None and self.exec_supported(device_ip) is False:
+                try:
+                    ch = self.open_shell(ssh, device_ip)
+                except Exception as e:
+                    if slot == 0:
+                        raise
+                    logging.warning(f"[{device_ip}] 打开第 {slot + 1} 个通道失败: {e}")
+                    return
+            try:
+                while True:
+                    with lock:
+                        item = next(pending, None)
+                    if item is None:
+                        return
+                    index, command = item
+                    # 支持 exec 的设备每条命令一个 exec 会话，否则在本槽位的交互式通道上执行
+                    outputs[index], ch = self.execute_command_auto(ssh, ch, command, device_ip)
+            finally:
+                if ch is not None and ch is not channel:
+                    try:
+                        ch.close()
+                    except Exception:
+                        pass
         
-        last_line = lines[-1].strip()
-        for pattern in patterns:
-            if re.search(pattern, last_line):
-                return True
-        return False
+        if n == 1:
+            worker(0)
+        else:
+            logging.debug(f"[{device_ip}] 使用 {n} 个通道并行执行 {len(commands)} 条命令")
+            with ThreadPoolExecutor(max_workers=n, thread_name_prefix=f'chan-{device_ip}') as executor:
+                for future in [executor.submit(worker, slot) for slot in range(n)]:
+                    future.result()
+        return outputs
+    
+    def execute_commands_pipelined(self, ssh: paramiko.SSHClient, channel, commands: List[str],
+                                   device_ip: str = ""):
+        """
+        流水线执行只读命令：每批命令一次性写入交互式通道，再按“提示符+回显”行切分输出，
+        高延迟链路上每批只付一次往返。无法可靠切分时保留已确定执行完的命令的输出，
+        换一个新通道逐条执行剩余命令（不重复下发）。
+        返回 (outputs, channel)，outputs 与 commands 顺序一致
+        """
+        if channel is None:
+            channel = self.open_shell(ssh, device_ip)
+        session = self.get_session_prompt(channel)
+        outputs = []
+        
+        if session is not None and self.disable_paging(channel, session):
+            batch_size = max(1, self.config['pipeline_batch_size'])
+            for start in range(0, len(commands), batch_size):
+                batch = commands[start:start + batch_size]
+                if self.exit_handler.exit_flag:
+                    break
+                logging.debug(f"[{device_ip}] 流水线发送 {len(batch)} 条命令")
+                started = time.perf_counter()
+                if self.throttle is not None:
+                    self.throttle.wait_command(device_ip, len(batch))
+                channel.send(''.join(cmd + '\n' for cmd in batch))
+                output, complete = read_pipelined(
+                    channel, session, len(batch), self.config['cmd_timeout'],
+                    abort=lambda: self.exit_handler.exit_flag
+                )
+                segments = split_pipelined_output(output, batch, session) if complete else None
+                metrics.observe(self, 'pipeline', started, output, ok=segments is not None)
+                if segments is None:
+                    done = completed_pipelined_output(output, batch, session)
+                    outputs.extend(self._clean_output(seg, cmd, device_ip, session)
+                                   for cmd, seg in zip(batch, done))
+                    logging.warning(f"[{device_ip}] 流水线输出无法切分（本批已完成 {len(done)}/{len(batch)} 条），"
+                                    f"改为逐条执行剩余命令")
+                    self.invalidate_shell(channel)
+                    try:
+                        channel.close()
+                    except Exception:
+                        pass
+                    channel = self.open_shell(ssh, device_ip)
+                    break
+                outputs.extend(self._clean_output(seg, cmd, device_ip, session)
+                               for cmd, seg in zip(batch, segments))
+        
+        for cmd in commands[len(outputs):]:
+            outputs.append(self.safe_execute_command(channel, cmd, device_ip))
+        return outputs, channel
+    
+    def disable_paging(self, channel, session: Optional[SessionPrompt] = None) -> bool:
+        """关闭当前会话的分页（流水线模式下分页符会吃掉后续命令的字符），每个通道只执行一次"""
+        if self._is_paging_disabled(channel):
+            return True
+        session = session or self.get_session_prompt(channel)
+        command = session.profile.disable_paging if session else None
+        if not command:
+            return False
+        channel.send(command + '\n')
+        output, matched = read_until_prompt(
+            channel, session.is_prompt, self.config['cmd_timeout'],
+            mode=self.config['read_mode'], abort=lambda: self.exit_handler.exit_flag
+        )
+        if not matched:
+            self.invalidate_shell(channel)
+            return False
+        self._mark_paging_disabled(channel)
+        return True
+    
+    def _is_paging_disabled(self, channel) -> bool:
+        with self._session_lock:
+            return channel in self._paging_disabled
+    
+    def _mark_paging_disabled(self, channel):
+        with self._session_lock:
+            self._paging_disabled.add(channel)
+    
+    def _banner_prompt_matcher(self, session: Optional[SessionPrompt], vendor: str = None):
+        """未学习提示符前：厂商已知时用厂商规则，否则用通用规则"""
+        if session:
+            return session.is_prompt
+        profile = get_profile(vendor or self.config['vendor'])
+        return profile.is_prompt if profile else self._is_command_prompt
+    
+    def invalidate_shell(self, channel):
+        """标记通道状态不确定，断开时关闭而不是放回连接池"""
+        if channel is not None:
+            with self._session_lock:
+                self._dirty_channels.add(channel)
+    
+    def get_session_prompt(self, channel) -> Optional[SessionPrompt]:
+        """取通道已学习的提示符，未学习返回 None"""
+        with self._session_lock:
+            return self._session_prompts.get(channel)
+    
+    def _is_command_prompt(self, text: str) -> bool:
+        """检查是否为命令行提示符（通用规则）"""
+        return GENERIC_PROMPT_RE.search(text) is not None
     
     def _has_more_prompt(self, text: str) -> bool:
         """检查是否有分页提示"""
-        more_patterns = [
-            '---- More ----',
-            '--More--',
-            'Press any key to continue',
-            '---(more)---'
-        ]
-        return any(pattern in text for pattern in more_patterns)
-    
-    def _clean_output(self, output: str, command: str, device_ip: str) -> str:
+        return MORE_PROMPT_RE.search(text) is not None
+    
+    def _clean_output(self, output: str, command: str, device_ip: str,
+                      prompt: Optional[SessionPrompt] = None) -> str:
         """清理命令输出"""
         if not output:
             return ""
@@ -184,7 +490,8 @@ class NetworkDeviceChecker:
         cleaned_lines = []
         
         for line in lines:
-            stripped = line.strip()
+            # 去掉分页符和擦除序列：翻页后下一页的第一行与分页符在同一行
+            stripped = ANSI_ESCAPE_RE.sub('', MORE_PROMPT_RE.sub('', line)).strip()
             
             # 跳过空行
             if not stripped:
@@ -194,12 +501,8 @@ class NetworkDeviceChecker:
             if command.strip() in stripped:
                 continue
             
-            # 跳过分页符和提示符
-            if self._has_more_prompt(stripped):
-                continue
-            
-            # 跳过命令行提示符
-            if self._is_command_prompt(stripped):
+            # 跳过命令行提示符（已学习时只跳过本会话提示符）
+            if prompt.is_prompt_line(stripped) if prompt else self._is_command_prompt(stripped):
                 continue
             
             cleaned_lines.append(stripped)
@@ -208,9 +511,78 @@ class NetworkDeviceChecker:
         logging.debug(f"[{device_ip}] 命令输出清理完成，原始长度: {len(output)}, 清理后: {len(result)}")
         return result
     
-    def safe_connect(self, device_info: Dict) -> Optional[paramiko.SSHClient]:
-        """安全建立SSH连接"""
+    def safe_connect(self, device_info: Dict, throttled: bool = False,
+                     attempt: int = None) -> Optional[paramiko.SSHClient]:
+        """
+        安全建立SSH连接（配置了连接池时优先复用池中连接）
+        throttled: 调用方已按 throttle.connect_delay 等待过（asyncio 引擎在协程中等待，不占用握手线程）
+        attempt: 只做第 attempt 次尝试，失败且可重试时由 retry_delay() 给出等待时间，
+                 调用方自行等待后以 attempt + 1 再次调用（asyncio 引擎在协程中退避，不占用握手线程）
+        """
+        if self.pool is None:
+            return self._open_connection(device_info, throttled, attempt)
+        key = SSHConnectionPool.make_key(device_info, self.config['ssh_port'])
+        return self.pool.acquire(key, lambda: self._open_connection(device_info, throttled, attempt))
+    
+    def retry_delay(self, device_ip: str) -> Optional[float]:
+        """按次连接失败后应等待的秒数（取走后清除），不再重试时返回 None"""
+        return self._retry_delays.pop(device_ip, None)
+    
+    def _open_connection(self, device_info: Dict, throttled: bool = False,
+                         attempt: int = None) -> Optional[paramiko.SSHClient]:
+        """新建SSH连接：可重试错误按退避重试，认证失败不重试；熔断中的设备直接跳过"""
         ip = device_info['ip']
+        self._retry_delays.pop(ip, None)
+        if self.replay is not None:
+            ssh = self.replay.connect(device_info)
+            if ssh is None:
+                self._connect_errors[ip] = '没有该设备的录制'
+            else:
+                # 是否走 exec 以该次录制为准（录制时的探测结果可能来自更早的连接）
+                self._set_exec_support_unknown(ip)
+            return ssh
+        # 熔断判定只在首次尝试时做（半开探测的后续重试仍属于同一次探测）
+        if self.breaker is not None and (attempt or 1) == 1 and not self.breaker.allow(ip):
+            logging.warning(f"[{ip}] 设备处于熔断状态，跳过连接")
+            self._connect_errors[ip] = '熔断跳过（持续不可达）'
+            return None
+        
+        attempts = self.retry.attempts if self.retry is not None else 1
+        for n in ([attempt] if attempt else range(1, attempts + 1)):
+            # throttled 时调用方已等待首次（按次调用时每次都由调用方等待）
+            if self.throttle is not None and (not throttled or (attempt is None and n > 1)):
+                self.throttle.wait_connect(device_info)
+            ssh, kind, reason = self._connect_once(device_info)
+            if ssh is not None:
+                self._connect_errors.pop(ip, None)
+                if self.breaker is not None:
+                    self.breaker.record_success(ip)
+                if self.recorder is not None:
+                    ssh = self.recorder.wrap(ssh, device_info)
+                return ssh
+            self._connect_errors[ip] = reason
+            if self.retry is None or not self.retry.should_retry(kind, n):
+                break
+            delay = self.retry.delay(n)
+            logging.info(f"[{ip}] 第 {n} 次连接失败，{delay:.1f}s 后重试")
+            if attempt:
+                self._retry_delays[ip] = delay
+                return None
+            time.sleep(delay)
+        
+        if self.breaker is not None:
+            if kind == retry_policy.UNREACHABLE:
+                self.breaker.record_failure(ip)
+            else:
+                # 认证失败等与可达性无关：不计入熔断，但要结束可能进行中的半开探测
+                self.breaker.end_probe(ip)
+        return None
+    
+    def _connect_once(self, device_info: Dict):
+        """单次连接尝试，返回 (ssh, 错误分类, 错误描述)"""
+        ip = device_info['ip']
+        started = time.monotonic()
+        ssh = None
         
         try:
             ssh = paramiko.SSHClient()
@@ -219,6 +591,7 @@ class NetworkDeviceChecker:
             # 设置连接超时
             connect_kwargs = {
                 'hostname': ip,
+                'port': int(device_info.get('port') or self.config['ssh_port']),
                 'username': device_info['username'],
                 'password': device_info['password'],
                 'timeout': self.config['ssh_timeout'],
@@ -232,25 +605,122 @@ class NetworkDeviceChecker:
                 connect_kwargs['key_filename'] = device_info['key_file']
                 connect_kwargs['look_for_keys'] = True
             
+            connect_kwargs.update(self.transport_kwargs(device_info.get('profile')))
+            
             logging.info(f"正在连接设备: {ip}")
+            if self.metrics is not None:
+                # 分阶段计时：自行建立 TCP 连接，包装 Transport 记录密钥交换耗时，剩余为认证
+                phase_started = time.perf_counter()
+                try:
+                    connect_kwargs['sock'] = socket.create_connection(
+                        (ip, connect_kwargs['port']), timeout=self.config['ssh_timeout'])
+                except OSError:
+                    metrics.observe(self, 'tcp_connect', phase_started, ok=False)
+                    raise
+                metrics.observe(self, 'tcp_connect', phase_started)
+                connect_kwargs['transport_factory'] = partial(
+                    self._timed_transport, connect_kwargs.get('transport_factory') or paramiko.Transport)
             ssh.connect(**connect_kwargs)
             logging.info(f"成功连接设备: {ip}")
             
-            return ssh
+            self._observe_auth(ssh, True)
+            self._record_connect(started, True)
+            return ssh, None, None
             
-        except paramiko.AuthenticationException:
+        except paramiko.AuthenticationException as e:
             logging.error(f"[{ip}] 认证失败")
+            kind, reason = retry_policy.classify(e), '认证失败'
         except paramiko.SSHException as e:
             logging.error(f"[{ip}] SSH连接异常: {e}")
+            kind, reason = retry_policy.classify(e), f'SSH连接异常: {e}'
         except Exception as e:
             logging.error(f"[{ip}] 连接失败: {e}")
+            kind, reason = retry_policy.classify(e), f'连接失败: {e}'
         
-        return None
+        self._observe_auth(ssh, False)
+        self._record_connect(started, False)
+        if ssh is not None:
+            ssh.close()
+        return None, kind, reason
+    
+    def _timed_transport(self, factory, sock, **kwargs) -> paramiko.Transport:
+        """transport_factory 包装：记录 start_client（版本交换+密钥交换）和之后到连接完成（认证）的耗时"""
+        transport = factory(sock, **kwargs)
+        start_client = transport.start_client
+        
+        def timed_start_client(*args, **kw):
+            kex_started = time.perf_counter()
+            try:
+                result = start_client(*args, **kw)
+            except Exception:
+                metrics.observe(self, 'kex', kex_started, ok=False)
+                raise
+            metrics.observe(self, 'kex', kex_started)
+            transport.auth_started = time.perf_counter()
+            return result
+        
+        transport.start_client = timed_start_client
+        return transport
+    
+    def _observe_auth(self, ssh: Optional[paramiko.SSHClient], ok: bool):
+        """记录认证阶段耗时（密钥交换完成后才有）"""
+        transport = ssh.get_transport() if ssh is not None else None
+        auth_started = getattr(transport, 'auth_started', None)
+        if auth_started is not None:
+            metrics.observe(self, 'auth', auth_started, ok=ok)
+    
+    def transport_kwargs(self, profile: str = None) -> Dict:
+        """传输配置档对应的 SSHClient.connect 参数（按配置档名缓存）"""
+        name = profile or self.config['transport_profile']
+        if name not in self._transport_kwargs:
+            self._transport_kwargs[name] = transport_profiles.connect_kwargs(
+                transport_profiles.resolve(name, self.config['transport_profiles']))
+        return self._transport_kwargs[name]
+    
+    def connect_error(self, device_ip: str) -> Optional[str]:
+        """设备最近一次连接失败的原因"""
+        return self._connect_errors.get(device_ip)
+    
+    def _record_connect(self, started: float, ok: bool):
+        if self.limiter is not None:
+            self.limiter.record(time.monotonic() - started, ok)
+    
+    def open_shell(self, ssh: paramiko.SSHClient, device_ip: str = "", vendor: str = None):
+        """打开交互式通道并等待提示符；连接池中保留有可用通道时直接复用"""
+        if self.pool is not None:
+            channel = self.pool.take_shell(ssh)
+            if channel is not None:
+                while channel.recv_ready():
+                    channel.recv(65535)
+                logging.debug(f"[{device_ip}] 复用交互式通道")
+                return channel
+        
+        started = time.perf_counter()
+        channel = ssh.invoke_shell()
+        channel.settimeout(self.config['cmd_timeout'])
+        self.wait_for_prompt(channel, vendor=vendor)
+        metrics.observe(self, 'shell_open', started)
+        return channel
     
     def safe_disconnect(self, ssh: paramiko.SSHClient, channel=None, device_ip: str = ""):
         """安全断开SSH连接"""
         if not ssh or not self.config['safe_disconnect']:
             return
+        started = time.perf_counter()
+        
+        # 池化连接：归还连接池，通道状态正常时一并保留
+        if self.pool is not None and self.pool.owns(ssh):
+            with self._session_lock:
+                dirty = channel is not None and channel in self._dirty_channels
+            self.pool.release(ssh, shell=None if dirty else channel)
+            if dirty:
+                try:
+                    channel.close()
+                except Exception:
+                    pass
+            logging.debug(f"[{device_ip}] 连接已归还连接池")
+            metrics.observe(self, 'disconnect', started)
+            return
         
         try:
             # 如果有通道，先尝试发送退出命令
@@ -264,12 +734,23 @@ class NetworkDeviceChecker:
             # 关闭连接
             ssh.close()
             logging.debug(f"[{device_ip}] 安全断开连接")
+            metrics.observe(self, 'disconnect', started)
             
         except Exception as e:
             logging.warning(f"[{device_ip}] 断开连接时异常: {e}")
     
-    def check_device_ntp(self, device_info: Dict, custom_cmd: str = None) -> Dict:
-        """检查单台设备的NTP配置"""
+    @staticmethod
+    def _parse_has_ntp(ntp_output: str) -> bool:
+        """精确判断NTP配置：按 parsers 解析出的 NTP 配置语句判断（注释、undo 语句、回显不计）"""
+        return bool(ntp_output) and len(parsers.parse_ntp_config(ntp_output)) > 0
+    
+    @metrics.timed('device')
+    def check_device_ntp(self, device_info: Dict, custom_cmd: str = None, incremental=None) -> Dict:
+        """
+        检查单台设备的NTP配置
+        incremental: FingerprintStore，提供时先执行变化指示命令，设备未变化则沿用上次输出（unchanged=True），
+                     否则照常检查并在结果 diffs 中给出与上次的差异
+        """
         ip = device_info['ip']
         vendor = device_info.get('vendor', 'unknown').lower()
         
@@ -297,60 +778,155 @@ class NetworkDeviceChecker:
             # 安全连接
             ssh = self.safe_connect(device_info)
             if not ssh:
-                result['error'] = "连接失败"
+                result['error'] = f"连接失败: {self.connect_error(device_info['ip']) or '未知原因'}"
                 return result
             
-            # 创建交互式Shell
-            channel = ssh.invoke_shell()
-            channel.settimeout(self.config['cmd_timeout'])
+            ntp_command = 'display current-configuration | include ntp'
+            commands = [ntp_command] + ([custom_cmd] if custom_cmd else [])
             
-            # 等待欢迎信息
-            time.sleep(1)
-            channel.recv(65535)
+            # 增量模式：变化指示未变且上次输出仍在时直接沿用
+            indicator = None
+            indicator_cmd = incremental.indicator_command(vendor) if incremental else None
+            if indicator_cmd:
+                indicator_out, channel = self.execute_command_auto(ssh, channel, indicator_cmd, ip, vendor)
+                indicator, previous = incremental.evaluate(ip, commands, indicator_out)
+                if previous is not None:
+                    outputs = [p['output'] for p in previous]
+                    result['ntp_config'] = outputs[0]
+                    result['has_ntp'] = self._parse_has_ntp(outputs[0])
+                    if custom_cmd:
+                        result['custom_output'] = outputs[1]
+                        result['has_custom'] = bool(outputs[1])
+                    result['unchanged'] = True
+                    result['status'] = 'success'
+                    logging.info(f"[{ip}] 设备未变化，沿用上次结果，NTP: {result['has_ntp']}")
+                    return result
+            
+            # Huawei 需要进入系统视图，只能走交互式Shell；其他设备支持 exec 时走 exec，
+            # 否则在首条命令时再创建交互式Shell（等待欢迎信息并学习提示符）
+            if vendor == 'huawei' and channel is None:
+                channel = self.open_shell(ssh, ip, vendor)
             
             # 进入系统视图（仅Huawei设备）
             if vendor == 'huawei':
                 logging.debug(f"[{ip}] 进入系统视图")
                 channel.send('system-view\n')
-                time.sleep(1)
-                channel.recv(65535)
+                self.wait_for_prompt(channel)
             
             # 检查NTP配置
-            ntp_command = 'display current-configuration | include ntp'
-            ntp_output = self.safe_execute_command(channel, ntp_command, ip)
+            ntp_output, channel = self.execute_command_auto(ssh, channel, ntp_command, ip, vendor)
             result['ntp_config'] = ntp_output
-            
-            # 精确判断NTP配置
-            if ntp_output and 'ntp' in ntp_output.lower():
-                # 进一步过滤，排除注释和无效行
-                ntp_lines = [line for line in ntp_output.split('\n') 
-                           if 'ntp' in line.lower() and not line.strip().startswith('#')]
-                result['has_ntp'] = len(ntp_lines) > 0
-            else:
-                result['has_ntp'] = False
+            result['has_ntp'] = self._parse_has_ntp(ntp_output)
             
             # 检查自定义命令
             if custom_cmd:
-                custom_output = self.safe_execute_command(channel, custom_cmd, ip)
+                custom_output, channel = self.execute_command_auto(ssh, channel, custom_cmd, ip, vendor)
                 result['custom_output'] = custom_output
                 result['has_custom'] = bool(custom_output)
             
             # 退出系统视图（如果进入过）
             if vendor == 'huawei':
                 channel.send('return\n')
-                time.sleep(0.5)
+                self.wait_for_prompt(channel, fallback_delay=0.5)
             
             result['status'] = 'success'
             logging.info(f"[{ip}] 检查完成，NTP: {result['has_ntp']}")
             
+            if incremental is not None:
+                outputs = [{'cmd': ntp_command, 'output': result['ntp_config']}]
+                if custom_cmd:
+                    outputs.append({'cmd': custom_cmd, 'output': result['custom_output']})
+                result['diffs'] = incremental.record(
+                    {'ip': ip, 'success': True, 'indicator': indicator, 'outputs': outputs})
+            
         except Exception as e:
             result['error'] = str(e)
             logging.error(f"[{ip}] 检查过程中异常: {e}")
+            self.invalidate_shell(channel)
             
         finally:
             # 安全断开连接
             self.safe_disconnect(ssh, channel, ip)
-        
+
+        return result
+
+    @metrics.timed('device')
+    def check_device_compliance(self, device_info: Dict, checks, keep_outputs: bool = False) -> Dict:
+        """
+        一个会话内评估多项合规检查：只执行检查所需的最少命令（完整配置只拉取一次），
+        全部检查针对同一份输出评估。checks 为 compliance.RuleSet（多台设备共用，只编译一次）或 Check 列表。
+        结果 checks 为 {检查名: {'passed', 'reason'}}，failed 为未通过的检查名；
+        keep_outputs 时附带 outputs（[{'cmd', 'output'}]，可交给 parsers.frames）
+        """
+        ip = device_info['ip']
+        vendor = device_info.get('vendor', 'unknown').lower()
+        rules = checks if isinstance(checks, compliance.RuleSet) else compliance.RuleSet(checks)
+        commands = rules.plan_commands(vendor)
+
+        result = {
+            'ip': ip,
+            'vendor': vendor,
+            'status': 'failed',
+            'error': '',
+            'compliant': False,
+            'checks': {},
+            'failed': [],
+            'commands': len(commands),
+            'check_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        ssh = None
+        channel = None
+
+        try:
+            if self.exit_handler.exit_flag:
+                result['error'] = "脚本被中断"
+                return result
+
+            ssh = self.safe_connect(device_info)
+            if not ssh:
+                result['error'] = f"连接失败: {self.connect_error(ip) or '未知原因'}"
+                return result
+
+            # 与 check_device_ntp 相同：Huawei 走交互式Shell并进入系统视图
+            if vendor == 'huawei':
+                channel = self.open_shell(ssh, ip, vendor)
+                channel.send('system-view\n')
+                self.wait_for_prompt(channel)
+
+            outputs = {}
+            for command in commands:
+                outputs[command], channel = self.execute_command_auto(ssh, channel, command, ip, vendor)
+
+            if vendor == 'huawei':
+                channel.send('return\n')
+                self.wait_for_prompt(channel, fallback_delay=0.5)
+
+            if keep_outputs:
+                result['outputs'] = [{'cmd': cmd, 'output': out} for cmd, out in outputs.items()]
+            # 任何一条命令失败都不评估：报错文本不是配置，只含 forbid 的检查会被误判为通过
+            errors = [f"{cmd}: {error}" for cmd, error in
+                      ((cmd, compliance.command_error(out, cmd)) for cmd, out in outputs.items()) if error]
+            if errors:
+                result['error'] = '命令执行失败: ' + '; '.join(errors)
+                logging.error(f"[{ip}] 合规检查未评估，{result['error']}")
+                return result
+
+            result['checks'] = rules.evaluate(outputs, vendor)
+            result['failed'] = [name for name, check in result['checks'].items() if not check['passed']]
+            result['compliant'] = not result['failed']
+            result['status'] = 'success'
+            logging.info(f"[{ip}] 合规检查完成，{len(commands)} 条命令，"
+                         f"未通过: {', '.join(result['failed']) or '无'}")
+
+        except Exception as e:
+            result['error'] = str(e)
+            logging.error(f"[{ip}] 合规检查过程中异常: {e}")
+            self.invalidate_shell(channel)
+
+        finally:
+            self.safe_disconnect(ssh, channel, ip)
+
         return result
 
 def main():
@@ -362,12 +938,19 @@ def main():
         'max_workers': 8,            # 生产环境建议5-10
         'readonly_mode': True,       # 确保只读
         'enable_logging': True,      # 生产环境建议True
+        'incremental': False,        # True 时跳过配置未变化的设备，另出差异报告
+        'adaptive': {'enabled': False, 'max': 50},  # 自适应并发（AIMD），max_workers 为初始值
+        'rate_limits': {},           # 令牌桶限速，格式同 Increase_Paramiko 的 rate_limits 配置
+        'retry': {'attempts': 3, 'circuit_breaker': {'path': 'ntp_circuit_breaker.json'}},  # 连接重试与熔断
+        'metrics': True,             # 分阶段耗时统计，结束时输出 ntp_metrics_*.json / .prom
+        'recording': {'enabled': False, 'dir': 'ntp_recordings'},  # 录制原始会话，供 replay_sessions.py 离线回放
         'log_file': f'network_check_{datetime.now().strftime("%Y%m%d_%H%M")}.log'
     }
     
     INPUT_FILE = 'devices.csv'
     OUTPUT_FILE = f'no_config_devices_{datetime.now().strftime("%Y%m%d_%H%M")}.csv'
     REPORT_FILE = f'check_report_{datetime.now().strftime("%Y%m%d_%H%M")}.txt'
+    DIFF_FILE = f'ntp_diff_{datetime.now().strftime("%Y%m%d_%H%M")}.txt'
     
     print("=" * 70)
     print("📡 网络设备NTP配置检查工具")
@@ -398,7 +981,16 @@ def main():
         print(f"📋 总设备数: {len(df)}")
         
         # 初始化检查器
-        checker = NetworkDeviceChecker(CONFIG)
+        limiter = concurrency.from_config(CONFIG['adaptive'], CONFIG['max_workers'])
+        retry, breaker = retry_policy.from_config(CONFIG['retry'])
+        checker = NetworkDeviceChecker(CONFIG, limiter=limiter,
+                                       throttle=rate_limit.from_config(CONFIG['rate_limits']),
+                                       retry=retry, breaker=breaker,
+                                       phase_metrics=metrics.PhaseMetrics() if CONFIG['metrics'] else None,
+                                       recorder=recording.from_config(CONFIG['recording'],
+                                                                      datetime.now().strftime("%Y%m%d_%H%M")))
+        incremental = FingerprintStore('ntp_incremental') if CONFIG['incremental'] else None
+        diff_report = DiffReport(DIFF_FILE) if incremental else None
         
         # 存储结果
         all_results = []
@@ -407,8 +999,9 @@ def main():
         print(f"\n🚀 开始并发检查，线程数: {CONFIG['max_workers']}")
         print("-" * 70)
         
-        # 使用线程池
-        with ThreadPoolExecutor(max_workers=CONFIG['max_workers']) as executor:
+        # 使用线程池（自适应模式下线程数取上限，实际在途数由控制器放行）
+        check = partial(limiter.run, checker.check_device_ntp) if limiter else checker.check_device_ntp
+        with ThreadPoolExecutor(max_workers=limiter.max_limit if limiter else CONFIG['max_workers']) as executor:
             # 提交所有任务
             future_to_device = {}
             for _, row in df.iterrows():
@@ -417,7 +1010,7 @@ def main():
                     break
                 
                 device_ip = row['ip']
-                future = executor.submit(checker.check_device_ntp, row.to_dict())
+                future = executor.submit(check, row.to_dict(), None, incremental)
                 future_to_device[future] = device_ip
             
             # 处理完成的任务
@@ -434,6 +1027,9 @@ def main():
                 
                 try:
                     result = future.result(timeout=300)  # 5分钟超时
+                    if diff_report:
+                        diff_report.write({'ip': result['ip'], 'success': result['status'] == 'success',
+                                           'unchanged': result.get('unchanged')}, result.pop('diffs', []))
                     all_results.append(result)
                     
                     # 显示进度
@@ -465,6 +1061,29 @@ def main():
         
         print("\n" + "=" * 70)
         
+        if incremental:
+            incremental.save()
+            diff_report.close()
+            c = diff_report.counts
+            print(f"🔁 增量模式: 有变化 {c['changed']} 台, 跳过 {c['unchanged']} 台, 差异报告: {DIFF_FILE}")
+        
+        if breaker:
+            breaker.save()
+        
+        if checker.recorder is not None:
+            checker.recorder.close()
+            print(f"🎞️  会话录制: {checker.recorder.path}")
+        
+        if checker.metrics is not None:
+            metrics_file = f'ntp_metrics_{datetime.now().strftime("%Y%m%d_%H%M")}'
+            checker.metrics.write_json(f'{metrics_file}.json')
+            checker.metrics.write_prometheus(f'{metrics_file}.prom')
+            print(f"⏱️  分阶段耗时:\n{checker.metrics.report()}")
+        
+        if limiter:
+            curve_file = limiter.write_curve(f'concurrency_{datetime.now().strftime("%Y%m%d_%H%M")}.csv')
+            print(f"⚙️  自适应并发: {limiter.summary()}，曲线: {curve_file}")
+        
         # 生成统计报告
         success_count = sum(1 for r in all_results if r['status'] == 'success')
         ntp_configured = sum(1 for r in all_results if r.get('has_ntp'))
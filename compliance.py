@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+声明式合规检查
+每项检查声明要用的命令（默认完整配置）和必须出现 / 不得出现的配置行（正则，按行匹配），
+plan_commands 求出一组检查实际需要的最少命令：
+    display current-configuration | include/exclude/begin ... 一律归并为一次完整配置，过滤在本地完成
+    同一命令只执行一次
+NetworkDeviceChecker.check_device_compliance 在一个会话里执行这些命令，再对同一份输出评估全部检查
+（RuleSet：全部规则一次扫描，见 rule_engine）。
+检查定义（JSON 文件为同格式的列表）:
+    {'name': 'snmp', 'description': '...', 'require': [正则...], 'forbid': [正则...],
+     'command': 'display current-configuration | include snmp',   # 可选
+     'vendors': ['h3c', 'huawei']}                                  # 可选，缺省适用全部厂商
+"""
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import rule_engine
+
+FULL_CONFIG = 'display current-configuration'
+
+DEFAULT_CHECKS = [
+    {'name': 'ntp', 'description': '配置了 NTP 服务器',
+     'require': [r'^\s*ntp(-service)?\s+unicast-server\s+\S+']},
+    {'name': 'snmp', 'description': '启用 SNMP 且未使用默认团体字',
+     'require': [r'^\s*snmp-agent\b'],
+     'forbid': [r'^\s*snmp-agent\s+community\s+(read|write)\s+(simple\s+|cipher\s+)?(public|private)\b']},
+    {'name': 'syslog', 'description': '配置了日志服务器',
+     'require': [r'^\s*info-center\s+loghost\s+\S+']},
+    {'name': 'aaa', 'description': '使用 HWTACACS/RADIUS 集中认证',
+     'require': [r'^\s*(hwtacacs|radius)(\s+scheme|-server\s+template)\s+\S+']},
+    {'name': 'telnet', 'description': '未开启 Telnet 服务',
+     'forbid': [r'^\s*telnet\s+server\s+enable\b']},
+    {'name': 'banner', 'description': '配置了登录提示信息',
+     'require': [r'^\s*header\s+(login|motd|shell|incoming)\b']},
+]
+
+_FILTER_RE = re.compile(r'^\s*(?P<base>.*?)\s*\|\s*(?P<kind>include|exclude|begin)\s+(?P<pattern>.+?)\s*$',
+                        re.IGNORECASE)
+_CONFIG_RE = re.compile(r'^dis\w*\s+cur\w*(?:-\w+)?$', re.IGNORECASE)
+# 设备拒绝命令时输出开头的报错（^ 位置标记、% Unrecognized ...、Error: ...）
+_VENDOR_ERROR_RE = re.compile(r'^\s*(?:\^\s*$|%|error:)', re.IGNORECASE)
+_ERROR_HEAD_LINES = 3  # 只看开头几行，配置正文里的 % 分隔符（如 header login %）不算报错
+
+
+def _normalize(command: str) -> str:
+    return ' '.join(command.split())
+
+
+def split_command(command: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+    """
+    检查命令 -> (实际执行的命令, 本地过滤)
+    完整配置的 | include/exclude/begin 在本地过滤，其他命令原样执行
+    """
+    command = _normalize(command)
+    m = _FILTER_RE.match(command)
+    base = m.group('base') if m else command
+    if _CONFIG_RE.match(base):
+        return FULL_CONFIG, (m.group('kind').lower(), m.group('pattern')) if m else None
+    return command, None
+
+
+def command_error(output: str, command: str = FULL_CONFIG) -> Optional[str]:
+    """
+    命令执行失败的原因（检查器的 ERROR: 结果、设备报错），成功返回 None；
+    只有完整配置的空输出算失败，其他命令（如会话、用户列表）可以正常地没有输出
+    """
+    if output.startswith('ERROR:'):
+        return output
+    head = [line.strip() for line in output.splitlines() if line.strip()][:_ERROR_HEAD_LINES]
+    if not head:
+        return '无输出' if command == FULL_CONFIG else None
+    if any(_VENDOR_ERROR_RE.match(line) for line in head):
+        return next((line for line in head if line != '^'), head[0])
+    return None
+
+
+def apply_filter(output: str, kind: str, pattern: str) -> str:
+    """按设备的 | include/exclude/begin 语义（正则、区分大小写、逐行匹配）过滤输出"""
+    regex = re.compile(pattern)
+    lines = output.splitlines()
+    if kind == 'include':
+        return '\n'.join(line for line in lines if regex.search(line))
+    if kind == 'begin':
+        first = next((i for i, line in enumerate(lines) if regex.search(line)), len(lines))
+        return '\n'.join(lines[first:])
+    return '\n'.join(line for line in lines if not regex.search(line))
+
+
+class Check:
+    """一项声明式检查：require 的每条正则都要命中，forbid 的任何一条都不能命中（均按行匹配）"""
+
+    def __init__(self, name: str, require: Iterable[str] = (), forbid: Iterable[str] = (),
+                 command: str = FULL_CONFIG, description: str = '', vendors: Iterable[str] = None):
+        if not require and not forbid:
+            raise ValueError(f"检查 {name} 没有 require/forbid 规则")
+        self.name = name
+        self.description = description
+        self.command = _normalize(command)
+        multiline = [p for p in list(require) + list(forbid) if rule_engine.has_newline(p)]
+        if multiline:
+            raise ValueError(f"检查 {name} 的规则按行匹配，不能包含换行符: {', '.join(multiline)}")
+        self.require = [re.compile(p, re.MULTILINE) for p in require]
+        self.forbid = [re.compile(p, re.MULTILINE) for p in forbid]
+        self.vendors = {v.lower() for v in vendors} if vendors else None
+        self.base_command, self.filter = split_command(command)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Check':
+        return cls(data['name'], data.get('require', ()), data.get('forbid', ()),
+                   data.get('command', FULL_CONFIG), data.get('description', ''), data.get('vendors'))
+
+    def applies_to(self, vendor: str) -> bool:
+        return self.vendors is None or (vendor or '').lower() in self.vendors
+
+
+def load_checks(source=None) -> List[Check]:
+    """检查列表：None 为内置 DEFAULT_CHECKS，字符串/Path 为 JSON 文件，否则为 dict 列表"""
+    if source is None:
+        source = DEFAULT_CHECKS
+    elif isinstance(source, (str, Path)):
+        source = json.loads(Path(source).read_text(encoding='utf-8'))
+    checks = [c if isinstance(c, Check) else Check.from_dict(c) for c in source]
+    names = [c.name for c in checks]
+    duplicated = {n for n in names if names.count(n) > 1}
+    if duplicated:
+        raise ValueError(f"检查名称重复: {', '.join(sorted(duplicated))}")
+    return checks
+
+
+def plan_commands(checks: Iterable[Check], vendor: str = None) -> List[str]:
+    """适用于该厂商的检查所需的最少命令（按首次出现顺序去重）"""
+    commands = []
+    for check in checks:
+        if check.applies_to(vendor) and check.base_command not in commands:
+            commands.append(check.base_command)
+    return commands
+
+
+class RuleSet:
+    """
+    编译后的检查集合（每次运行编译一次，所有设备共用）
+    每条规则预先取出必然出现的字面关键字，同一份输出上全部规则的关键字合成一个扫描器：
+    评估时每份输出只扫描一遍找出候选行，只有关键字出现过的规则才在候选行上逐行验证；
+    取不出关键字的规则退化为全文搜索，命中跨行时再逐行验证。规则一律按行匹配（不跨行）
+    """
+
+    def __init__(self, checks: Iterable[Check]):
+        self.checks = list(checks)
+        self._keywords = {}  # 规则正则 -> 预筛选关键字（None 为全文匹配）
+        groups = defaultdict(set)  # (执行的命令, 本地过滤) -> 关键字
+        for check in self.checks:
+            for regex in check.require + check.forbid:
+                keywords = rule_engine.literals_of(regex.pattern, regex.flags)
+                self._keywords[regex] = keywords
+                groups[(check.base_command, check.filter)].update(keywords or ())
+        self._scanners = {group: rule_engine.KeywordScanner(keywords) for group, keywords in groups.items()}
+
+    def plan_commands(self, vendor: str = None) -> List[str]:
+        return plan_commands(self.checks, vendor)
+
+    def evaluate(self, outputs: Dict[str, str], vendor: str = None) -> Dict[str, Dict]:
+        """对同一份采集结果（命令 -> 输出）评估全部适用的检查，返回 {检查名: {'passed', 'reason'}}"""
+        results = {}
+        scanned = {}  # 每份（过滤后的）输出只扫描一次
+        for check in self.checks:
+            if not check.applies_to(vendor):
+                continue
+            group = (check.base_command, check.filter)
+            if group not in scanned:
+                # 统一换行符（CRLF 输出的行尾不留 \r），过滤、扫描和全文搜索看到的是同样的行
+                text = '\n'.join(outputs.get(check.base_command, '').splitlines())
+                if check.filter:
+                    text = apply_filter(text, *check.filter)
+                scanned[group] = text, self._scanners[group].scan(text)
+            text, hits = scanned[group]
+            passed, reason = True, ''
+            for regex in check.require:
+                if self._first_line(regex, text, hits, self._scanners[group]) is None:
+                    passed, reason = False, f"缺少: {regex.pattern}"
+                    break
+            else:
+                for regex in check.forbid:
+                    line = self._first_line(regex, text, hits, self._scanners[group])
+                    if line is not None:
+                        passed, reason = False, f"违规: {line.strip()}"
+                        break
+            results[check.name] = {'passed': passed, 'reason': reason}
+        return results
+
+    def _first_line(self, regex, text: str, hits, scanner) -> Optional[str]:
+        """规则命中的第一行，未命中返回 None"""
+        keywords = self._keywords[regex]
+        if keywords is None:
+            # 全文搜索找到最左的命中；命中落在一行之内即为结果，跨行（如 \s 匹配了换行）时按该行单独验证
+            pos = 0
+            while True:
+                m = regex.search(text, pos)
+                if m is None:
+                    return None
+                start = text.rfind('\n', 0, m.start()) + 1
+                end = text.find('\n', m.start())
+                end = len(text) if end < 0 else end
+                line = text[start:end]
+                if m.end() <= end or regex.search(line):
+                    return line
+                pos = end + 1
+        for line in scanner.lines(hits, keywords):
+            if regex.search(line):
+                return line
+        return None
+
+
+def evaluate(checks: Iterable[Check], outputs: Dict[str, str], vendor: str = None) -> Dict[str, Dict]:
+    """一次性评估（多台设备时先构建 RuleSet 复用）"""
+    return RuleSet(checks).evaluate(outputs, vendor)
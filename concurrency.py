@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应并发控制（AIMD）
+固定并发数在高速局域网上偏低，在 TACACS/RADIUS 或慢速站点前又容易把认证服务器压垮，
+导致整批设备同时认证失败。本模块按新建连接的 连接+认证 耗时和失败率动态调整在途会话数：
+    每收集 window 个样本评估一次：
+      失败率 <= error_threshold 且 p90 耗时未明显劣化 → 上限加 increase（加性增）
+      否则 → 上限乘 backoff（乘性减），降速前已发起的连接样本不再参与评估
+每次调整记录一行，运行结束可导出并发曲线用于调参。
+"""
+import asyncio
+import csv
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+ASYNC_RECHECK_INTERVAL = 0.5  # 协程等待时重新检查上限的间隔（上限可能在其他线程中被调高）
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发控制器，线程与协程均可使用"""
+
+    def __init__(self, initial: int = 5, min_limit: int = 1, max_limit: int = 100, window: int = 20,
+                 increase: float = 2, backoff: float = 0.5, error_threshold: float = 0.1,
+                 latency_factor: float = 3.0, latency_target: Optional[float] = None):
+        """
+        initial / min_limit / max_limit: 初始、最小、最大在途会话数
+        window: 每次评估所需的连接样本数
+        error_threshold: 窗口内连接/认证失败率超过该值即降速
+        latency_factor: p90 耗时超过“无负载基线”（历史窗口中位数的最小值）的倍数即降速
+        latency_target: 指定时用固定的 p90 耗时上限（秒）代替基线倍数
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.window = max(1, window)
+        self.increase = increase
+        self.backoff = backoff
+        self.error_threshold = error_threshold
+        self.latency_factor = latency_factor
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self.baseline = None         # 无负载时的连接耗时（秒）
+        self.curve: List[Dict] = []  # 每次调整的记录
+
+        self._cond = threading.Condition()
+        self._samples = deque()
+        self._window_peak = 0        # 本窗口内的最大在途数，上限没用满时不再加
+        self._last_decrease = 0.0
+        self._start = time.monotonic()
+        self._async_cond = None
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    # ---------------- 线程接口 ----------------
+    def acquire(self):
+        with self._cond:
+            self._cond.wait_for(self._try_acquire_locked)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def run(self, fn, *args, **kwargs):
+        """在并发上限内执行 fn（供线程池 submit）"""
+        self.acquire()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.release()
+
+    # ---------------- 协程接口 ----------------
+    async def acquire_async(self):
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        async with self._async_cond:
+            while not self._try_acquire():
+                try:
+                    await asyncio.wait_for(self._async_cond.wait(), ASYNC_RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release_async(self):
+        self.release()
+        async with self._async_cond:
+            self._async_cond.notify()
+
+    # ---------------- 反馈 ----------------
+    def record(self, latency: float, ok: bool):
+        """记录一次新建连接的 连接+认证 耗时与结果（连接池复用的连接不记录）"""
+        now = time.monotonic()
+        with self._cond:
+            if now - latency < self._last_decrease:
+                return
+            self._samples.append((latency, ok))
+            if len(self._samples) >= self.window:
+                self._evaluate(now)
+
+    def _evaluate(self, now: float):
+        samples = list(self._samples)
+        self._samples.clear()
+        errors = sum(1 for _, ok in samples if not ok) / len(samples)
+        latencies = sorted(lat for lat, ok in samples if ok)
+        p90 = latencies[int(len(latencies) * 0.9)] if latencies else None
+        if latencies:
+            median = latencies[len(latencies) // 2]
+            self.baseline = median if self.baseline is None else min(self.baseline, median)
+
+        threshold = self.latency_target or (self.baseline * self.latency_factor if self.baseline else None)
+        degraded = errors > self.error_threshold or (p90 is not None and threshold and p90 > threshold)
+        old = self.limit
+        if degraded:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_decrease = now
+            event = 'decrease'
+        elif self._window_peak >= int(self.limit):
+            self.limit = min(self.max_limit, self.limit + self.increase)
+            event = 'increase'
+        else:
+            event = 'hold'
+        self._window_peak = self.in_flight
+
+        self.curve.append({
+            'elapsed': round(now - self._start, 2),
+            'limit': int(self.limit),
+            'previous': int(old),
+            'in_flight': self.in_flight,
+            'error_rate': round(errors, 3),
+            'p90_latency': round(p90, 3) if p90 is not None else '',
+            'baseline': round(self.baseline, 3) if self.baseline is not None else '',
+            'event': event,
+        })
+        if int(self.limit) > int(old):
+            self._cond.notify_all()
+
+    def _try_acquire_locked(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._window_peak = max(self._window_peak, self.in_flight)
+            return True
+        return False
+
+    def _try_acquire(self) -> bool:
+        with self._cond:
+            return self._try_acquire_locked()
+
+    # ---------------- 报告 ----------------
+    def write_curve(self, path):
+        """导出并发曲线 CSV"""
+        fields = ['elapsed', 'limit', 'previous', 'in_flight', 'error_rate', 'p90_latency', 'baseline', 'event']
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.curve)
+        return path
+
+    def summary(self) -> str:
+        decreases = sum(1 for c in self.curve if c['event'] == 'decrease')
+        peak = max([c['limit'] for c in self.curve] + [int(self.limit)])
+        return (f"最终并发 {int(self.limit)}，峰值 {peak}，降速 {decreases} 次，"
+                f"无负载连接耗时 {self.baseline or 0:.2f}s")
+
+
+def from_config(config: Dict, initial: int) -> Optional[AdaptiveConcurrency]:
+    """按 execution.adaptive 配置创建控制器，未启用返回 None"""
+    if not config or not config.get('enabled'):
+        return None
+    return AdaptiveConcurrency(
+        initial=initial,
+        min_limit=config.get('min', 1),
+        max_limit=config.get('max', 100),
+        window=config.get('window', 20),
+        increase=config.get('increase', 2),
+        backoff=config.get('backoff', 0.5),
+        error_threshold=config.get('error_threshold', 0.1),
+        latency_factor=config.get('latency_factor', 3.0),
+        latency_target=config.get('latency_target'),
+    )
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSH 连接池
+按 (ip, port, username) 复用已认证的连接，连续执行 NTP 检查、批量命令等多个任务时
+每台设备只做一次 TCP + 密钥交换 + 认证。连接空闲时可连同交互式 shell 一起保留，
+下次直接复用，省去 invoke_shell 和欢迎信息等待。
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+class _PooledConnection:
+    """池中的一条连接"""
+
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.shell = None        # 空闲时保留的交互式通道
+        self.last_used = time.monotonic()
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        try:
+            if self.shell is not None:
+                self.shell.close()
+        except Exception:
+            pass
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """按设备复用 SSH 连接的连接池（线程安全）"""
+
+    def __init__(self, max_per_host: int = 1, idle_timeout: float = 300,
+                 keepalive: int = 30, acquire_timeout: float = 60):
+        """
+        max_per_host: 每台设备同时存在的连接数上限（空闲 + 借出）
+        idle_timeout: 空闲超过该秒数的连接被回收
+        keepalive: Transport 保活间隔（秒），0 表示不发送保活
+        acquire_timeout: 达到单设备上限时等待空闲连接的最长时间
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: Dict[Tuple, List[_PooledConnection]] = {}
+        self._leased: Dict[int, _PooledConnection] = {}   # id(client) -> 连接
+        self._counts: Dict[Tuple, int] = {}
+        self._closed = False
+        self._reaper = None
+
+    @staticmethod
+    def make_key(device_info: Dict, default_port: int = 22) -> Tuple:
+        return (device_info['ip'],
+                int(device_info.get('port') or default_port),
+                device_info.get('username') or device_info.get('user'))
+
+    def acquire(self, key: Tuple, connect: Callable):
+        """
+        借出一条连接：优先复用空闲连接，否则调用 connect() 新建
+        connect 返回 SSHClient 或 None（连接失败），失败时返回 None
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            self._start_reaper()
+            while True:
+                idle = self._idle.get(key)
+                while idle:
+                    conn = idle.pop()
+                    if conn.is_alive():
+                        conn.last_used = time.monotonic()
+                        self._leased[id(conn.client)] = conn
+                        logging.debug(f"[{key[0]}] 复用池中连接")
+                        return conn.client
+                    self._discard(conn)
+
+                if self._counts.get(key, 0) < self.max_per_host:
+                    self._counts[key] = self._counts.get(key, 0) + 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.warning(f"[{key[0]}] 等待连接池空闲连接超时")
+                    return None
+                self._cond.wait(remaining)
+
+        # 握手在锁外进行，不阻塞其他设备
+        client = None
+        try:
+            client = connect()
+        finally:
+            with self._cond:
+                if client is None:
+                    self._counts[key] -= 1
+                    self._cond.notify_all()
+                else:
+                    if self.keepalive:
+                        client.get_transport().set_keepalive(self.keepalive)
+                    self._leased[id(client)] = _PooledConnection(key, client)
+        return client
+
+    def owns(self, client) -> bool:
+        with self._cond:
+            return id(client) in self._leased
+
+    def take_shell(self, client):
+        """取出连接上保留的交互式通道（没有或已失效返回 None）"""
+        with self._cond:
+            conn = self._leased.get(id(client))
+            if conn is None or conn.shell is None:
+                return None
+            shell, conn.shell = conn.shell, None
+        if shell.closed or shell.eof_received:
+            return None
+        return shell
+
+    def release(self, client, shell=None, broken: bool = False):
+        """归还连接；shell 仍可用时一并保留，broken=True 时直接关闭"""
+        with self._cond:
+            conn = self._leased.pop(id(client), None)
+            if conn is None:
+                return
+            if broken or self._closed or not conn.is_alive():
+                self._discard(conn)
+            else:
+                if shell is not None and not (shell.closed or shell.eof_received):
+                    conn.shell = shell
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(conn.key, []).append(conn)
+            self._cond.notify_all()
+
+    def evict_idle(self) -> int:
+        """回收空闲超时或已断开的连接，返回回收数量"""
+        now = time.monotonic()
+        evicted = 0
+        with self._cond:
+            for key, idle in list(self._idle.items()):
+                keep = []
+                for conn in idle:
+                    if now - conn.last_used > self.idle_timeout or not conn.is_alive():
+                        self._discard(conn)
+                        evicted += 1
+                    else:
+                        keep.append(conn)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+            if evicted:
+                self._cond.notify_all()
+        return evicted
+
+    def close_all(self):
+        """关闭所有空闲连接；借出中的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            for idle in self._idle.values():
+                for conn in idle:
+                    self._discard(conn)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'idle': sum(len(v) for v in self._idle.values()),
+                'leased': len(self._leased),
+                'hosts': len(self._counts),
+            }
+
+    def _discard(self, conn: _PooledConnection):
+        """关闭连接并释放单设备计数（调用方持有锁）"""
+        conn.close()
+        self._counts[conn.key] = self._counts.get(conn.key, 1) - 1
+        if self._counts[conn.key] <= 0:
+            del self._counts[conn.key]
+
+    def _start_reaper(self):
+        if self._reaper is not None or self._closed:
+            return
+        interval = max(1.0, min(self.idle_timeout / 2, 30))
+
+        def reap():
+            while not self._closed:
+                time.sleep(interval)
+                try:
+                    n = self.evict_idle()
+                    if n:
+                        logging.debug(f"连接池回收空闲连接 {n} 条")
+                except Exception as e:
+                    logging.warning(f"连接池回收异常: {e}")
+
+        self._reaper = threading.Thread(target=reap, name='ssh-pool-reaper', daemon=True)
+        self._reaper.start()
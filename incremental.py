@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量执行
+每台设备记录上次运行的“变化指示”输出摘要和每条命令的输出摘要（指纹）。
+本次运行先执行一条廉价的指示命令（配置提交记录/最后修改时间），与上次一致且命令集合未变时
+跳过其余命令，结果沿用上次保存的输出（标记 unchanged）；有变化的设备照常执行，并与上次输出逐条比较生成差异报告。
+没有可信指示命令的厂商（如 H3C 未开启配置自动归档）不做增量判断，照常全量执行。
+
+存储目录（默认 results/incremental）:
+    fingerprints.json        {ip: {indicator, commands: {cmd: {hash, len}}, run_id}}
+    outputs/xx/<hash>.txt    上次输出正文（按内容寻址，只保留仍被引用的）
+"""
+import difflib
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from result_sink import output_hash
+
+# 各厂商的变化指示命令：输出只在配置变化时改变，且远比完整配置短。
+# H3C 的 display archive configuration 只在开启配置自动归档（archive configuration interval）时
+# 随配置变化，不作为默认值；已开启的网络通过 indicator_commands={'h3c': ...} 显式启用
+INDICATOR_COMMANDS = {
+    'huawei': 'display configuration commit list 1',               # VRP8 最近一次提交
+    'cisco': 'show running-config | include Last configuration change',
+}
+DEFAULT_VENDOR = 'h3c'
+DIFF_CONTEXT_LINES = 3
+
+# 设备不支持指示命令时的报错，以及检查器自身的 ERROR: 结果（视为“可能有变化”，照常全量执行）
+_INDICATOR_ERROR_RE = re.compile(r'^\s*(%|error:|\^)', re.MULTILINE | re.IGNORECASE)
+
+
+class FingerprintStore:
+    """设备/命令指纹库（线程安全；可 pickle 传给分片工作进程只读使用）"""
+
+    def __init__(self, path='results/incremental', indicator_commands: Dict = None):
+        self.root = Path(path)
+        self.index_path = self.root / 'fingerprints.json'
+        self.outputs_dir = self.root / 'outputs'
+        self.indicator_commands = dict(INDICATOR_COMMANDS, **(indicator_commands or {}))
+        self._lock = threading.Lock()
+        self._devices = {}
+        if self.index_path.exists():
+            with open(self.index_path, encoding='utf-8') as f:
+                self._devices = json.load(f)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def indicator_command(self, vendor: str = None) -> Optional[str]:
+        """设备的变化指示命令，未配置返回 None（不做增量判断）"""
+        return self.indicator_commands.get((vendor or DEFAULT_VENDOR).lower())
+
+    def evaluate(self, ip: str, commands: List[str], indicator_output: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """
+        根据指示命令输出判断设备是否变化
+        返回 (indicator, previous)：indicator 为本次指示摘要（命令报错时为 None）；
+        未变化时 previous 为上次保存的输出 [{'cmd', 'output'}]，否则（含上次输出已缺失）为 None
+        """
+        if (not indicator_output.strip() or indicator_output.startswith('ERROR:')
+                or _INDICATOR_ERROR_RE.search(indicator_output)):
+            return None, None
+        indicator = output_hash(indicator_output)
+        with self._lock:
+            entry = self._devices.get(ip)
+        if not entry or entry.get('indicator') != indicator:
+            return indicator, None
+        fingerprints = entry.get('commands', {})
+        if any(cmd not in fingerprints for cmd in commands):
+            return indicator, None
+        # 输出正文随结果一起交给 ResultWriter，本次运行的结果文件自成一体
+        previous = []
+        for cmd in commands:
+            text = self.output(fingerprints[cmd]['hash'])
+            if text is None:
+                return indicator, None
+            previous.append({'cmd': cmd, 'output': text})
+        return indicator, previous
+
+    def output(self, h: str) -> Optional[str]:
+        """按摘要读取上次保存的输出正文"""
+        path = self._output_path(h)
+        return path.read_text(encoding='utf-8') if path.exists() else None
+
+    def record(self, result: Dict, run_id: str = None) -> List[Dict]:
+        """
+        记录一台设备的本次结果，返回与上次相比的差异
+        [{'cmd', 'status': 'changed'|'new', 'diff': 统一差异文本}]；失败或未变化的设备不更新指纹
+        """
+        if not result.get('success') or result.get('unchanged'):
+            return []
+        ip = result['ip']
+        with self._lock:
+            entry = self._devices.get(ip, {})
+        old = entry.get('commands', {})
+
+        diffs = []
+        fingerprints = {}
+        for o in result.get('outputs', []):
+            cmd, text = o['cmd'], o['output']
+            h = output_hash(text)
+            fingerprints[cmd] = {'hash': h, 'len': len(text)}
+            self._save_output(h, text)
+            if cmd not in old:
+                if old:
+                    diffs.append({'cmd': cmd, 'status': 'new', 'diff': text})
+                continue
+            if old[cmd]['hash'] != h:
+                previous = self.output(old[cmd]['hash']) or ''
+                diff = '\n'.join(difflib.unified_diff(
+                    previous.splitlines(), text.splitlines(),
+                    fromfile=f'{ip} {cmd} (上次)', tofile=f'{ip} {cmd} (本次)',
+                    n=DIFF_CONTEXT_LINES, lineterm=''))
+                diffs.append({'cmd': cmd, 'status': 'changed', 'diff': diff})
+
+        # 有命令执行出错（输出为 ERROR: ...）时不记录指示摘要，下次仍全量执行
+        failed = any(o['output'].startswith('ERROR:') for o in result.get('outputs', []))
+        with self._lock:
+            self._devices[ip] = {'indicator': None if failed else result.get('indicator'),
+                                 'commands': fingerprints, 'run_id': run_id}
+        return diffs
+
+    def save(self):
+        """写回指纹库，并删除不再被引用的输出文件"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._devices, ensure_ascii=False)
+            referenced = {fp['hash'] for entry in self._devices.values()
+                          for fp in entry.get('commands', {}).values()}
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(data, encoding='utf-8')
+        tmp_path.replace(self.index_path)
+
+        removed = 0
+        for path in self.outputs_dir.glob('*/*.txt'):
+            if path.stem not in referenced:
+                path.unlink()
+                removed += 1
+        if removed:
+            logging.debug(f"增量指纹库清理过期输出 {removed} 个")
+
+    def _output_path(self, h: str) -> Path:
+        return self.outputs_dir / h[:2] / f'{h}.txt'
+
+    def _save_output(self, h: str, text: str):
+        path = self._output_path(h)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            tmp_path.write_text(text, encoding='utf-8')
+            tmp_path.replace(path)
+
+
+class DiffReport:
+    """差异报告：只记录输出有变化的设备/命令，边执行边写入"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.counts = {'unchanged': 0, 'changed': 0, 'same': 0, 'failed': 0}
+        self._file = open(self.path, 'w', encoding='utf-8')
+
+    def write(self, result: Dict, diffs: List[Dict]):
+        """追加一台设备的差异"""
+        if not result.get('success'):
+            self.counts['failed'] += 1
+            return
+        if result.get('unchanged'):
+            self.counts['unchanged'] += 1
+            return
+        if not diffs:
+            self.counts['same'] += 1
+            return
+        self.counts['changed'] += 1
+        for d in diffs:
+            status = '变化' if d['status'] == 'changed' else '新增命令'
+            self._file.write(f"===== {result['ip']}  {d['cmd']}  [{status}] =====\n")
+            self._file.write(d['diff'].rstrip('\n') + '\n\n')
+        self._file.flush()
+
+    def close(self) -> Path:
+        if not self._file.closed:
+            c = self.counts
+            self._file.write(f"# 汇总: 有变化 {c['changed']} 台, 指示未变跳过 {c['unchanged']} 台, "
+                             f"重新执行但输出相同 {c['same']} 台, 失败 {c['failed']} 台\n")
+            self._file.close()
+        return self.path
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步日志管道
+工作线程只把日志记录放入有界队列，由单个写线程统一落盘/输出到控制台：
+    设备日志（device.<ip> 记录器）按设备写入 logs/<ip>_<时间戳>.log，按大小轮转，可 gzip 压缩；
+    同时打开的设备日志文件数有上限（LRU 关闭），不再每台设备常驻两个句柄
+    其他日志（根记录器）写入主日志文件（如 network_checker.log）
+队列满时的策略（overflow）:
+    drop   DEBUG/INFO 直接丢弃，WARNING 及以上最多等待 block_timeout 秒后丢弃
+    block  所有级别最多等待 block_timeout 秒后丢弃
+两种策略下 SSH 线程的等待都有上限，丢弃条数在停止时汇报。
+"""
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+DEVICE_LOGGER = 'device'
+DEVICE_FORMAT = '%(asctime)s | %(levelname)-8s | %(message)s'
+MAIN_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONSOLE_FORMAT = '%(asctime)s | %(levelname)-8s | %(source)s | %(message)s'
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """有界队列入队：队列满时按策略限时等待或丢弃，从不无限阻塞调用方"""
+
+    def __init__(self, log_queue, overflow: str = 'drop', block_timeout: float = 0.05):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            if self.overflow == 'block' or record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # 队列可能已满，停止标记必须等到入队
+        self.queue.put(self._sentinel)
+
+
+class _Router(logging.Handler):
+    """写线程中运行：设备记录按 IP 分文件，其他记录写主日志，同时输出到控制台"""
+
+    def __init__(self, log_dir: Path, run_ts: str, main_log=None, max_bytes=10 * 1024 * 1024,
+                 backup_count=3, compress=False, max_open_files=64, console=True,
+                 console_level=logging.INFO):
+        super().__init__()
+        self.log_dir = log_dir
+        self.run_ts = run_ts
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.max_open_files = max(1, max_open_files)
+        self._files = OrderedDict()  # ip -> handler（LRU）
+        self._prefix = DEVICE_LOGGER + '.'
+
+        self.main = None
+        if main_log:
+            self.main = self._rotating(Path(main_log))
+            self.main.setFormatter(logging.Formatter(MAIN_FORMAT))
+        self.console = None
+        if console:
+            self.console = logging.StreamHandler(sys.stdout)
+            self.console.setLevel(console_level)
+            self.console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    def _rotating(self, path: Path) -> logging.handlers.RotatingFileHandler:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8', delay=True)
+        if self.compress:
+            handler.namer = lambda name: name + '.gz'
+            handler.rotator = _gzip_rotator
+        return handler
+
+    def _device_handler(self, ip: str):
+        handler = self._files.get(ip)
+        if handler is not None:
+            self._files.move_to_end(ip)
+            return handler
+        if len(self._files) >= self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        handler = self._rotating(self.log_dir / f'{ip}_{self.run_ts}.log')
+        handler.setFormatter(logging.Formatter(DEVICE_FORMAT))
+        self._files[ip] = handler
+        return handler
+
+    def emit(self, record):
+        if record.name.startswith(self._prefix):
+            record.source = record.name[len(self._prefix):]
+            self._device_handler(record.source).handle(record)
+        else:
+            record.source = record.name
+            if self.main is not None:
+                self.main.handle(record)
+        if self.console is not None and record.levelno >= self.console.level:
+            self.console.handle(record)
+
+    def close(self):
+        for handler in self._files.values():
+            handler.close()
+        self._files.clear()
+        if self.main is not None:
+            self.main.close()
+        if self.console is not None:
+            self.console.flush()
+        super().close()
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class LogPipeline:
+    """队列 + 单写线程的日志管道"""
+
+    def __init__(self, log_dir='logs', main_log=None, level=logging.INFO, queue_size=10000,
+                 overflow='drop', block_timeout=0.05, max_bytes=10 * 1024 * 1024, backup_count=3,
+                 compress=False, max_open_files=64, console=True):
+        self.pid = os.getpid()
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.handler = BoundedQueueHandler(self.queue, overflow, block_timeout)
+        self.router = _Router(self.log_dir, datetime.now().strftime('%Y%m%d_%H%M%S'), main_log, max_bytes,
+                              backup_count, compress, max_open_files, console)
+        self.listener = _Listener(self.queue, self.router)
+        self.level = level
+
+    def start(self):
+        self.listener.start()
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        root.addHandler(self.handler)
+        device = logging.getLogger(DEVICE_LOGGER)
+        device.setLevel(logging.INFO)
+        device.propagate = False
+        device.addHandler(self.handler)
+        logging.getLogger('paramiko').setLevel(logging.WARNING)
+        return self
+
+    def detach(self):
+        logging.getLogger().removeHandler(self.handler)
+        logging.getLogger(DEVICE_LOGGER).removeHandler(self.handler)
+
+    def stop(self):
+        """摘除队列处理器，写完队列中剩余的记录后关闭文件"""
+        self.detach()
+        self.listener.stop()
+        self.router.close()
+        if self.handler.dropped:
+            print(f"⚠ 日志队列已满，共丢弃 {self.handler.dropped} 条日志", file=sys.stderr)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def start(**options) -> LogPipeline:
+    """启动进程内唯一的日志管道（已启动时直接返回，参数以首次调用为准）"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None and _pipeline.pid != os.getpid():
+            # fork 出的子进程继承了父进程的管道对象，但写线程不在子进程中
+            _pipeline.detach()
+            _pipeline = None
+        if _pipeline is None:
+            _pipeline = LogPipeline(**options).start()
+        return _pipeline
+
+
+def shutdown():
+    """停止日志管道（可重复调用）"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None and _pipeline.pid == os.getpid():
+            _pipeline.stop()
+        _pipeline = None
+
+
+def device_logger(ip: str) -> logging.Logger:
+    """设备日志记录器，记录经管道写入该设备的日志文件"""
+    start()
+    return logging.getLogger(f'{DEVICE_LOGGER}.{ip}')
+
+
+def options_from_config(config: dict, main_log=None, level=logging.INFO) -> dict:
+    """logging 配置段转换为 start() 参数"""
+    config = config or {}
+    return {
+        'log_dir': config.get('dir', 'logs'),
+        'main_log': main_log,
+        'level': level,
+        'queue_size': config.get('queue_size', 10000),
+        'overflow': config.get('overflow', 'drop'),
+        'block_timeout': config.get('block_timeout', 0.05),
+        'max_bytes': config.get('max_bytes', 10 * 1024 * 1024),
+        'backup_count': config.get('backup_count', 3),
+        'compress': config.get('compress', False),
+        'max_open_files': config.get('max_open_files', 64),
+        'console': config.get('console', True),
+    }
+
+
+atexit.register(shutdown)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段耗时统计
+记录每台设备各阶段的耗时和字节数，运行结束导出 Prometheus 文本文件（node_exporter textfile 格式）
+和 JSON 汇总（各阶段、各命令的 p50/p90/p99）。
+阶段:
+    tcp_connect   TCP 三次握手
+    kex           SSH 版本交换 + 密钥交换
+    auth          认证
+    shell_open    invoke_shell + 等待首个提示符（复用连接池中的通道不计）
+    exec_command  exec 方式执行单条命令（bytes 为输出字节数）
+    shell_command 交互式通道执行单条命令
+    pipeline      流水线方式执行一批命令
+    disconnect    断开/归还连接
+    device        单台设备从连接到断开的总耗时
+"""
+import inspect
+import json
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional
+
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = 'netcheck'
+# 按命令统计的阶段
+COMMAND_PHASES = ('exec_command', 'shell_command')
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class PhaseMetrics:
+    """各阶段耗时/字节数采样（线程安全；可 pickle 传给分片工作进程，结束时回传合并）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = defaultdict(list)     # phase -> [(秒, 字节)]
+        self._commands = defaultdict(list)   # command -> [(秒, 字节)]
+        self._errors = defaultdict(int)      # phase -> 失败次数
+
+    def __getstate__(self):
+        return {'samples': self.export()}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.merge(state['samples'])
+
+    def record(self, phase: str, seconds: float, nbytes: int = 0, command: str = None, ok: bool = True):
+        with self._lock:
+            self._phases[phase].append((seconds, nbytes))
+            if command is not None and phase in COMMAND_PHASES:
+                self._commands[command].append((seconds, nbytes))
+            if not ok:
+                self._errors[phase] += 1
+
+    def export(self) -> Dict:
+        """原始采样，用于跨进程合并"""
+        with self._lock:
+            return {'phases': {k: list(v) for k, v in self._phases.items()},
+                    'commands': {k: list(v) for k, v in self._commands.items()},
+                    'errors': dict(self._errors)}
+
+    def merge(self, samples: Dict):
+        with self._lock:
+            for phase, values in samples.get('phases', {}).items():
+                self._phases[phase].extend(tuple(v) for v in values)
+            for command, values in samples.get('commands', {}).items():
+                self._commands[command].extend(tuple(v) for v in values)
+            for phase, count in samples.get('errors', {}).items():
+                self._errors[phase] += count
+
+    @staticmethod
+    def _stats(values) -> Dict:
+        durations = sorted(v[0] for v in values)
+        stats = {'count': len(durations), 'sum': round(sum(durations), 6),
+                 'bytes': sum(v[1] for v in values)}
+        for q in QUANTILES:
+            stats[f'p{int(q * 100)}'] = round(percentile(durations, q), 6)
+        stats['max'] = round(durations[-1], 6) if durations else 0.0
+        return stats
+
+    def summary(self) -> Dict:
+        with self._lock:
+            phases = {p: dict(self._stats(v), errors=self._errors.get(p, 0)) for p, v in self._phases.items()}
+            commands = {c: self._stats(v) for c, v in self._commands.items()}
+        return {'phases': phases, 'commands': commands}
+
+    def write_json(self, path) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding='utf-8')
+        return path
+
+    def write_prometheus(self, path) -> Path:
+        """Prometheus 文本格式（summary 类型），先写临时文件再替换，避免采集到半个文件"""
+        summary = self.summary()
+        lines = []
+
+        def emit(name, help_text, label, items):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name}_seconds {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name}_seconds summary')
+            for key, stats in items:
+                value = _escape(key)
+                for q in QUANTILES:
+                    lines.append(f'{METRIC_PREFIX}_{name}_seconds{{{label}="{value}",quantile="{q}"}} '
+                                 f'{stats[f"p{int(q * 100)}"]}')
+                lines.append(f'{METRIC_PREFIX}_{name}_seconds_sum{{{label}="{value}"}} {stats["sum"]}')
+                lines.append(f'{METRIC_PREFIX}_{name}_seconds_count{{{label}="{value}"}} {stats["count"]}')
+            lines.append(f'# HELP {METRIC_PREFIX}_{name}_bytes_total 输出字节数')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name}_bytes_total counter')
+            for key, stats in items:
+                lines.append(f'{METRIC_PREFIX}_{name}_bytes_total{{{label}="{_escape(key)}"}} {stats["bytes"]}')
+
+        emit('phase', '各阶段耗时', 'phase', sorted(summary['phases'].items()))
+        lines.append(f'# HELP {METRIC_PREFIX}_phase_errors_total 各阶段失败次数')
+        lines.append(f'# TYPE {METRIC_PREFIX}_phase_errors_total counter')
+        for phase, stats in sorted(summary['phases'].items()):
+            lines.append(f'{METRIC_PREFIX}_phase_errors_total{{phase="{_escape(phase)}"}} {stats["errors"]}')
+        emit('command', '单条命令耗时', 'command', sorted(summary['commands'].items()))
+
+        path = Path(path)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        tmp_path.replace(path)
+        return path
+
+    def report(self) -> str:
+        """控制台输出用的简表"""
+        rows = [f"{'阶段':<16}{'次数':>8}{'p50(s)':>10}{'p90(s)':>10}{'p99(s)':>10}{'合计(s)':>12}"]
+        for phase, s in sorted(self.summary()['phases'].items(), key=lambda item: -item[1]['sum']):
+            rows.append(f"{phase:<16}{s['count']:>8}{s['p50']:>10.3f}{s['p90']:>10.3f}{s['p99']:>10.3f}{s['sum']:>12.1f}")
+        return '\n'.join(rows)
+
+
+def observe(checker, phase: str, started: float, output=None, command: str = None, ok: bool = None):
+    """记录一次阶段耗时（checker.metrics 为 None 时不记录）；output 为输出文本或设备结果"""
+    metrics = getattr(checker, 'metrics', None)
+    if metrics is None:
+        return
+    nbytes = 0
+    if isinstance(output, dict):
+        # run_device 结果为 success，check_device_ntp 结果为 status
+        ok = output.get('success', output.get('status', 'success') == 'success') if ok is None else ok
+    elif output:
+        nbytes = len(output.encode('utf-8', errors='replace'))
+        ok = not output.startswith('ERROR:') if ok is None else ok
+    metrics.record(phase, time.perf_counter() - started, nbytes, command, True if ok is None else ok)
+
+
+def timed(phase: str, checker_arg: int = 0, command_arg: int = None):
+    """
+    装饰器：记录函数/协程的耗时，返回值为输出文本或设备结果（返回 None 不记录）
+    checker_arg / command_arg 为 checker 和命令在位置参数中的下标（方法的 self 为 0）
+    """
+    def decorator(fn):
+        def finish(args, kwargs, started, output):
+            if output is None:
+                return
+            checker = args[checker_arg] if len(args) > checker_arg else kwargs.get('checker')
+            command = args[command_arg] if command_arg is not None and len(args) > command_arg else None
+            observe(checker, phase, started, output, command)
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                output = await fn(*args, **kwargs)
+                finish(args, kwargs, started, output)
+                return output
+        else:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                output = fn(*args, **kwargs)
+                finish(args, kwargs, started, output)
+                return output
+        return wrapper
+    return decorator
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def from_config(config: Optional[Dict]) -> Optional[PhaseMetrics]:
+    """按 metrics 配置创建采集器，未启用返回 None"""
+    if not config or not config.get('enabled'):
+        return None
+    return PhaseMetrics()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟 H3C/Huawei 设备（基于 paramiko ServerInterface），用于在不连真实交换机的情况下测吞吐
+每台虚拟设备监听 127.0.0.1 上的一个端口，模拟:
+    提示符      <主机名> 用户视图，system-view 后 [主机名]，return/quit 返回
+    分页        输出超过 page_lines 行时显示 ---- More ----，空格翻页、q 中止；
+                screen-length disable（H3C）/ screen-length 0 temporary（Huawei）后不再分页
+    延迟        rtt: 每条命令响应前的延迟；auth_delay: 认证延迟（模拟 AAA/TACACS）
+    输出大小    output_size: display current-configuration 的字节数，支持 | include/exclude/begin 过滤
+    exec 通道   exec=False 时拒绝 exec 请求（多数 Huawei 设备的行为），只能走交互式 Shell
+用法:
+    python mock_device.py --count 200 --base-port 20000 --rtt 0.02 --output-size 65536
+    python mock_device.py --count 10 --vendor huawei --no-exec
+"""
+import argparse
+import logging
+import re
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List
+
+import paramiko
+
+# 虚拟设备默认参数
+DEFAULT_PROFILE = {
+    'vendor': 'h3c',          # h3c / huawei（影响关闭分页命令和报错格式）
+    'username': 'admin',
+    'password': 'admin',
+    'rtt': 0.0,               # 每条命令响应前的延迟（秒）
+    'auth_delay': 0.0,        # 认证延迟（秒）
+    'output_size': 16384,     # display current-configuration 输出字节数
+    'page_lines': 24,         # 每页行数，0 表示不分页
+    'exec': True,             # 是否支持 exec 通道
+}
+
+EXEC_REPLY_DELAY = 0.01  # exec 通道开始输出前的最短延迟（秒）
+PAGING_COMMANDS = {'h3c': 'screen-length disable', 'huawei': 'screen-length 0 temporary'}
+MORE_PROMPT = '  ---- More ----'
+# 翻页后设备用退格序列擦掉分页符
+MORE_ERASE = '\x1b[16D' + ' ' * 16 + '\x1b[16D'
+UNRECOGNIZED = {
+    'h3c': "                    ^\r\n % Unrecognized command found at '^' position.",
+    'huawei': "                    ^\r\nError: Unrecognized command found at '^' position.",
+}
+BANNER = '\r\n******************************************************************************\r\n' \
+         '* Copyright (c) 2004-2026 Mock Technologies Co., Ltd. All rights reserved.   *\r\n' \
+         '* Without the owner\'s prior written consent,                                 *\r\n' \
+         '* no decompiling or reverse-engineering shall be allowed.                    *\r\n' \
+         '******************************************************************************\r\n\r\n'
+
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def host_key() -> paramiko.PKey:
+    """所有虚拟设备共用一把主机密钥（ECDSA 生成快）"""
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.ECDSAKey.generate()
+        return _host_key
+
+
+class MockDevice:
+    """一台虚拟设备：主机名、参数和生成好的命令输出"""
+
+    def __init__(self, hostname: str, port: int, profile: Dict = None):
+        self.hostname = hostname
+        self.port = port
+        self.profile = {**DEFAULT_PROFILE, **(profile or {})}
+        self.vendor = self.profile['vendor']
+        self.config_text = self._build_config()
+        self.sessions = 0
+        self.commands = 0
+        self.logins = 0
+        self._lock = threading.Lock()
+
+    def _build_config(self) -> str:
+        """按 output_size 生成 display current-configuration 输出"""
+        head = [f' sysname {self.hostname}', '#', ' clock timezone BJ add 08:00:00', '#',
+                ' ntp-service enable', ' ntp-service unicast-server 10.0.0.1', '#']
+        lines = list(head)
+        size = sum(len(line) + 2 for line in lines)
+        index = 1
+        while size < self.profile['output_size']:
+            block = [f'interface GigabitEthernet1/0/{index}',
+                     f' description to-{self.hostname}-access-{index:04d}',
+                     ' port link-type trunk',
+                     ' port trunk permit vlan 10 20 30 100 to 200',
+                     '#']
+            lines.extend(block)
+            size += sum(len(line) + 2 for line in block)
+            index += 1
+        lines.append('return')
+        return '\r\n'.join(lines)
+
+    def output(self, command: str) -> str:
+        """命令输出（不含回显和提示符），不认识的命令返回厂商格式的报错"""
+        with self._lock:
+            self.commands += 1
+        command, _, pipe = command.partition('|')
+        words = command.split()
+        if words[:2] in (['display', 'current-configuration'], ['dis', 'cur']):
+            return _apply_filter(self.config_text, pipe)
+        if words[:2] == ['display', 'version']:
+            text = ('Mock Comware Software, Version 7.1.070, Release 6728P22\r\n'
+                    f'{self.hostname} uptime is 0 weeks, 3 days, 4 hours, 12 minutes\r\n'
+                    'Last reboot reason : User reboot')
+            return _apply_filter(text, pipe)
+        if words[:2] == ['display', 'clock']:
+            return _apply_filter(time.strftime('%H:%M:%S BJ %a %m/%d/%Y'), pipe)
+        if words[:3] in (['display', 'interface', 'brief'], ['display', 'ip', 'interface']):
+            rows = ['Interface            Link Protocol Primary IP      Description']
+            rows += [f'GE1/0/{i:<15}UP   UP       --              access-{i:04d}'
+                     for i in range(1, self.config_text.count('interface GigabitEthernet') + 1)]
+            return _apply_filter('\r\n'.join(rows), pipe)
+        if words[:3] == ['display', 'archive', 'configuration'] or \
+                words[:4] == ['display', 'configuration', 'commit', 'list']:
+            return ' No. TimeStamp          FileName\r\n 1   2026-10-01 08:00   startup.cfg'
+        return UNRECOGNIZED.get(self.vendor, UNRECOGNIZED['h3c'])
+
+    def _count_session(self):
+        with self._lock:
+            self.sessions += 1
+
+
+def _apply_filter(text: str, pipe: str) -> str:
+    """模拟 | include / exclude / begin 输出过滤（正则）"""
+    pipe = pipe.strip()
+    if not pipe:
+        return text
+    mode, _, pattern = pipe.partition(' ')
+    try:
+        regex = re.compile(pattern.strip())
+    except re.error:
+        return text
+    lines = text.split('\r\n')
+    if mode.startswith('inc'):
+        lines = [line for line in lines if regex.search(line)]
+    elif mode.startswith('exc'):
+        lines = [line for line in lines if not regex.search(line)]
+    elif mode.startswith('beg'):
+        for i, line in enumerate(lines):
+            if regex.search(line):
+                lines = lines[i:]
+                break
+        else:
+            lines = []
+    return '\r\n'.join(lines)
+
+
+class _DeviceServer(paramiko.ServerInterface):
+    def __init__(self, device: MockDevice):
+        self.device = device
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        profile = self.device.profile
+        if profile['auth_delay']:
+            time.sleep(profile['auth_delay'])
+        if username == profile['username'] and password == profile['password']:
+            with self.device._lock:
+                self.device.logins += 1
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.device._count_session()
+        threading.Thread(target=_Shell(channel, self.device).run, daemon=True).start()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        if not self.device.profile['exec']:
+            return False
+        self.device._count_session()
+        threading.Thread(target=_run_exec, args=(channel, self.device, command.decode('utf-8', 'replace')),
+                         daemon=True).start()
+        return True
+
+
+def _run_exec(channel, device: MockDevice, command: str):
+    try:
+        # 至少等传输线程发出 exec 请求的成功应答，输出和关闭抢在应答之前时客户端会报 Channel closed
+        time.sleep(max(device.profile['rtt'], EXEC_REPLY_DELAY))
+        channel.sendall(device.output(command).encode('utf-8') + b'\r\n')
+        channel.send_exit_status(0)
+    except Exception:
+        pass
+    finally:
+        channel.close()
+
+
+class _Shell:
+    """交互式 Shell：逐行读命令，按视图回显提示符，超过一页时分页"""
+
+    def __init__(self, channel, device: MockDevice):
+        self.channel = channel
+        self.device = device
+        self.system_view = False
+        self.paging = device.profile['page_lines'] > 0
+        self._buffer = b''
+
+    @property
+    def prompt(self) -> str:
+        return f'[{self.device.hostname}]' if self.system_view else f'<{self.device.hostname}>'
+
+    def run(self):
+        try:
+            self.channel.sendall((BANNER + self.prompt).encode('utf-8'))
+            while True:
+                line = self._read_line()
+                if line is None:
+                    break
+                if not self._handle(line.strip()):
+                    break
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+        finally:
+            self.channel.close()
+
+    def _fill(self) -> bool:
+        data = self.channel.recv(4096)
+        if not data:
+            return False
+        self._buffer += data
+        return True
+
+    def _read_line(self):
+        while True:
+            for sep in (b'\n', b'\r'):
+                index = self._buffer.find(sep)
+                if index >= 0:
+                    line = self._buffer[:index]
+                    self._buffer = self._buffer[index + 1:]
+                    if sep == b'\r' and self._buffer.startswith(b'\n'):
+                        self._buffer = self._buffer[1:]
+                    return line.decode('utf-8', 'replace')
+            if not self._fill():
+                return None
+
+    def _read_key(self):
+        if not self._buffer and not self._fill():
+            return None
+        key, self._buffer = self._buffer[:1], self._buffer[1:]
+        return key
+
+    def _handle(self, command: str) -> bool:
+        """处理一行输入，返回 False 表示会话结束"""
+        profile = self.device.profile
+        if profile['rtt']:
+            time.sleep(profile['rtt'])
+        echo = command + '\r\n'
+        if not command:
+            self.channel.sendall(('\r\n' + self.prompt).encode('utf-8'))
+            return True
+        if command in ('quit', 'return') and self.system_view:
+            self.system_view = False
+            self.channel.sendall((echo + self.prompt).encode('utf-8'))
+            return True
+        if command == 'quit':
+            return False
+        if command in ('system-view', 'sys'):
+            self.system_view = True
+            self.channel.sendall((echo + 'System View: return to User View with Ctrl+Z.\r\n' +
+                                  self.prompt).encode('utf-8'))
+            return True
+        if command == PAGING_COMMANDS.get(self.device.vendor) or command in PAGING_COMMANDS.values():
+            self.paging = False
+            self.channel.sendall((echo + self.prompt).encode('utf-8'))
+            return True
+        self._send_paged(echo, self.device.output(command).split('\r\n'))
+        return True
+
+    def _send_paged(self, echo: str, lines: List[str]):
+        page = self.device.profile['page_lines']
+        if not self.paging or len(lines) <= page:
+            self.channel.sendall((echo + '\r\n'.join(lines) + '\r\n' + self.prompt).encode('utf-8'))
+            return
+        head, start, step = echo, 0, page
+        while True:
+            chunk = lines[start:start + step]
+            start += step
+            if start >= len(lines):
+                self.channel.sendall((head + '\r\n'.join(chunk) + '\r\n' + self.prompt).encode('utf-8'))
+                return
+            self.channel.sendall((head + '\r\n'.join(chunk) + '\r\n' + MORE_PROMPT).encode('utf-8'))
+            key = self._read_key()
+            if key is None:
+                raise EOFError
+            head = MORE_ERASE
+            if key in (b'q', b'Q', b'\x03'):
+                self.channel.sendall((head + '\r\n' + self.prompt).encode('utf-8'))
+                return
+            # 回车翻一行，其他键翻一页
+            step = 1 if key in (b'\r', b'\n') else page
+
+
+class MockFleet:
+    """一组虚拟设备：每台一个本地端口，单个线程统一 accept，每个连接一个 paramiko Transport"""
+
+    def __init__(self, count: int, base_port: int = 20000, host: str = '127.0.0.1', profile: Dict = None,
+                 hostname_prefix: str = 'SW-MOCK'):
+        self.host = host
+        self.devices = [MockDevice(f'{hostname_prefix}-{i + 1:04d}', base_port + i, profile)
+                        for i in range(count)]
+        self._selector = selectors.DefaultSelector()
+        self._sockets = []
+        self._transports = []
+        self._transports_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._key = host_key()
+        for device in self.devices:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.host, device.port))
+            sock.listen(128)
+            sock.setblocking(False)
+            self._selector.register(sock, selectors.EVENT_READ, device)
+            self._sockets.append(sock)
+        self._thread = threading.Thread(target=self._accept_loop, name='mock-fleet-accept', daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=0.5):
+                try:
+                    conn, _ = key.fileobj.accept()
+                except OSError:
+                    continue
+                conn.setblocking(True)
+                # 握手在各自线程中进行，慢客户端不阻塞其他设备的 accept
+                threading.Thread(target=self._serve, args=(conn, key.data), daemon=True).start()
+
+    def _serve(self, conn, device: MockDevice):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self._key)
+        try:
+            # 只做端口探测的连接（如 port_scan）会在握手时断开，忽略即可
+            transport.start_server(server=_DeviceServer(device))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+            return
+        with self._transports_lock:
+            self._transports = [t for t in self._transports if t.is_active()]
+            self._transports.append(transport)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for sock in self._sockets:
+            self._selector.unregister(sock)
+            sock.close()
+        self._sockets.clear()
+        with self._transports_lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+
+    def stats(self) -> Dict:
+        return {'logins': sum(d.logins for d in self.devices),
+                'sessions': sum(d.sessions for d in self.devices),
+                'commands': sum(d.commands for d in self.devices)}
+
+
+def profile_from_args(args) -> Dict:
+    return {
+        'vendor': args.vendor,
+        'username': args.username,
+        'password': args.password,
+        'rtt': args.rtt,
+        'auth_delay': args.auth_delay,
+        'output_size': args.output_size,
+        'page_lines': args.page_lines,
+        'exec': args.exec,
+    }
+
+
+def add_profile_args(parser: argparse.ArgumentParser):
+    """虚拟设备参数（bench_throughput.py 共用）"""
+    parser.add_argument('--vendor', choices=sorted(PAGING_COMMANDS), default=DEFAULT_PROFILE['vendor'])
+    parser.add_argument('--username', default=DEFAULT_PROFILE['username'])
+    parser.add_argument('--password', default=DEFAULT_PROFILE['password'])
+    parser.add_argument('--rtt', type=float, default=DEFAULT_PROFILE['rtt'], help='每条命令响应延迟（秒）')
+    parser.add_argument('--auth-delay', type=float, default=DEFAULT_PROFILE['auth_delay'], help='认证延迟（秒）')
+    parser.add_argument('--output-size', type=int, default=DEFAULT_PROFILE['output_size'],
+                        help='display current-configuration 输出字节数')
+    parser.add_argument('--page-lines', type=int, default=DEFAULT_PROFILE['page_lines'], help='每页行数，0 不分页')
+    parser.add_argument('--no-exec', dest='exec', action='store_false', help='拒绝 exec 通道，只能走交互式 Shell')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='本地模拟 H3C/Huawei 设备')
+    parser.add_argument('--count', type=int, default=10, help='虚拟设备数')
+    parser.add_argument('--base-port', type=int, default=20000, help='第一台设备的端口，其余依次递增')
+    parser.add_argument('--host', default='127.0.0.1')
+    add_profile_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    fleet = MockFleet(args.count, args.base_port, args.host, profile_from_args(args)).start()
+    print(f"已启动 {args.count} 台虚拟设备: {args.host}:{args.base_port}-{args.base_port + args.count - 1}，"
+          f"账号 {args.username}/{args.password}（Ctrl+C 停止）", flush=True)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
+        stats = fleet.stats()
+        print(f"已停止，登录 {stats['logins']} 次，会话 {stats['sessions']} 个，命令 {stats['commands']} 条")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+display 输出结构化解析
+按命令匹配模板（H3C Comware / Huawei VRP 格式），把输出解析为带类型的记录（dict），
+再按模板汇总为全网 DataFrame，用向量化查询回答全网问题，不再逐台逐行匹配字符串:
+    tables = parsers.frames(parsers.iter_jsonl('results/results_20261018_101500.jsonl'))
+    tables['interface'].query('crc > 0')[['ip', 'interface', 'crc']]
+    tables['ntp_status'].query('not synchronized')
+模板（一条命令可匹配多个模板，如完整配置同时给出 ntp_config）:
+    interface        display interface [接口]          每个接口一条：状态/速率/双工/收发包字节/CRC/错误数
+    interface_brief  display [ip] interface brief      每个接口一条（H3C 路由/桥模式两种表头、Huawei 表头）
+    ntp_status       display ntp-service status        每台设备一条：是否同步/层数/参考源/偏移
+    ntp_config       display current-configuration     每条 NTP 配置语句一条（| include ntp 亦可）
+    version          display version                   每台设备一条：厂商/版本/型号/运行时长
+    route            display ip routing-table          每条路由一条（ECMP 续行沿用上一目的网段）
+命令行:
+    python parsers.py results/results_<ts>.jsonl --table interface --query "crc > 0" [--csv out.csv]
+"""
+import argparse
+import re
+import sys
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from result_sink import iter_results
+
+_MISSING = {'', '-', '--', 'N/A', 'n/a'}
+
+
+def _int(value) -> Optional[int]:
+    if value is None or value.strip() in _MISSING:
+        return None
+    try:
+        return int(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _float(value) -> Optional[float]:
+    if value is None or value.strip() in _MISSING:
+        return None
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return value if value not in _MISSING else None
+
+
+class Template:
+    """解析模板：命令匹配正则、列类型（pandas dtype）和解析函数"""
+
+    def __init__(self, name: str, command: str, columns: Dict[str, str], parse: Callable[[str], List[Dict]]):
+        self.name = name
+        self.command_re = re.compile(command, re.IGNORECASE)
+        self.columns = columns
+        self.parse = parse
+
+    def matches(self, command: str) -> bool:
+        return self.command_re.match(' '.join(command.split())) is not None
+
+
+# ---------------- display interface ----------------
+_IF_NAME = r'[A-Za-z][A-Za-z\-]*\d[\w/.:]*'
+_IF_HEADER_RE = re.compile(rf'^(?P<name>{_IF_NAME})(?:\s+current state\s*:\s*(?P<state>.+?))?\s*$', re.IGNORECASE)
+_IF_FIELDS = [
+    ('state', re.compile(r'^\s*Current state\s*:\s*(.+?)\s*$', re.IGNORECASE), _text),
+    ('protocol', re.compile(r'Line protocol (?:current )?state\s*:\s*(\S+)', re.IGNORECASE), _text),
+    ('description', re.compile(r'^\s*Description\s*:\s*(.*?)\s*$', re.IGNORECASE), _text),
+    ('bandwidth_kbps', re.compile(r'Bandwidth\s*:\s*(\d+)\s*kbps', re.IGNORECASE), _int),
+    ('mtu', re.compile(r'Maximum (?:Transmit Unit|transmission unit|frame length)\s*(?:is|:)\s*(\d+)',
+                       re.IGNORECASE), _int),
+]
+_IF_SPEED_RE = re.compile(r'(?:^|\s)(\d+)(G|M)bps-speed mode|Speed\s*:\s*(\d+)', re.IGNORECASE)
+_IF_DUPLEX_RE = re.compile(r'(full|half)-duplex mode|Duplex\s*:\s*(FULL|HALF)', re.IGNORECASE)
+# 收发统计：H3C "Input (total):  123 packets, 4567 bytes"，Huawei "Input:  123 packets, 4567 bytes"
+_IF_TOTAL_RE = re.compile(r'^\s*(Input|Output)(?: \(total\))?\s*:\s*(\d+|-)\s+packets,\s*(\d+|-)\s+bytes', re.IGNORECASE)
+_IF_SECTION_RE = re.compile(r'^\s*(Input|Output)\b', re.IGNORECASE)
+_IF_CRC_RE = re.compile(r'(\d+)\s+CRC\b|\bCRC\s*:\s*(\d+)', re.IGNORECASE)
+_IF_ERRORS_RE = re.compile(r'(\d+)\s+(input|output) errors|Total Error\s*:\s*(\d+)', re.IGNORECASE)
+
+INTERFACE_COLUMNS = {
+    'interface': 'string', 'state': 'string', 'protocol': 'string', 'description': 'string',
+    'bandwidth_kbps': 'Int64', 'speed_mbps': 'Int64', 'duplex': 'string', 'mtu': 'Int64',
+    'input_packets': 'Int64', 'input_bytes': 'Int64', 'output_packets': 'Int64', 'output_bytes': 'Int64',
+    'crc': 'Int64', 'input_errors': 'Int64', 'output_errors': 'Int64',
+}
+
+
+def parse_interface(text: str) -> List[Dict]:
+    records = []
+    record = None
+    section = None
+    for line in text.splitlines():
+        header = _IF_HEADER_RE.match(line) if line[:1].strip() else None
+        if header and not _IF_SECTION_RE.match(line):
+            record = dict.fromkeys(INTERFACE_COLUMNS)
+            record['interface'] = header.group('name')
+            # Huawei: "GigabitEthernet0/0/1 current state : UP (ifindex: 5)"
+            record['state'] = _text(re.sub(r'\s*\(.*$', '', header.group('state') or ''))
+            records.append(record)
+            section = None
+            continue
+        if record is None:
+            continue
+        for key, regex, convert in _IF_FIELDS:
+            m = regex.search(line)
+            if m and record[key] is None:
+                record[key] = convert(m.group(1))
+        m = _IF_SPEED_RE.search(line)
+        if m and record['speed_mbps'] is None:
+            record['speed_mbps'] = int(m.group(1)) * (1000 if m.group(2).upper() == 'G' else 1) \
+                if m.group(1) else int(m.group(3))
+        m = _IF_DUPLEX_RE.search(line)
+        if m and record['duplex'] is None:
+            record['duplex'] = (m.group(1) or m.group(2)).lower()
+        m = _IF_SECTION_RE.match(line)
+        if m:
+            section = m.group(1).lower()
+        m = _IF_TOTAL_RE.match(line)
+        if m:
+            direction = m.group(1).lower()
+            if record[f'{direction}_packets'] is None:
+                record[f'{direction}_packets'] = _int(m.group(2))
+                record[f'{direction}_bytes'] = _int(m.group(3))
+        m = _IF_CRC_RE.search(line)
+        if m and record['crc'] is None:
+            record['crc'] = int(m.group(1) or m.group(2))
+        m = _IF_ERRORS_RE.search(line)
+        if m:
+            direction = (m.group(2) or section or '').lower()
+            if direction in ('input', 'output') and record[f'{direction}_errors'] is None:
+                record[f'{direction}_errors'] = int(m.group(1) or m.group(3))
+    return records
+
+
+# ---------------- display interface brief ----------------
+# 表头名 -> 列名（H3C 路由模式/桥模式、Huawei、display ip interface brief）
+_BRIEF_HEADER = {
+    'interface': 'interface', 'link': 'link', 'phy': 'link', 'physical': 'link', 'protocol': 'protocol',
+    'primary_ip': 'primary_ip', 'ip_address': 'primary_ip', 'speed': 'speed', 'duplex': 'duplex',
+    'type': 'type', 'pvid': 'pvid', 'inuti': 'in_util', 'oututi': 'out_util', 'inerrors': 'in_errors',
+    'outerrors': 'out_errors', 'description': 'description',
+}
+_BRIEF_HEADER_ALIASES = [('Primary IP', 'Primary_IP'), ('IP Address/Mask', 'IP_Address'), ('IP Address', 'IP_Address')]
+INTERFACE_BRIEF_COLUMNS = {
+    'interface': 'string', 'link': 'string', 'protocol': 'string', 'primary_ip': 'string',
+    'speed': 'string', 'duplex': 'string', 'type': 'string', 'pvid': 'Int64',
+    'in_util': 'Float64', 'out_util': 'Float64', 'in_errors': 'Int64', 'out_errors': 'Int64',
+    'description': 'string',
+}
+
+
+def _percent(value) -> Optional[float]:
+    return _float(value.rstrip('%')) if value else None
+
+
+_BRIEF_CONVERT = {'pvid': _int, 'in_errors': _int, 'out_errors': _int, 'in_util': _percent, 'out_util': _percent}
+
+
+def parse_interface_brief(text: str) -> List[Dict]:
+    records = []
+    columns = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith('Interface'):
+            for name, alias in _BRIEF_HEADER_ALIASES:
+                stripped = stripped.replace(name, alias)
+            columns = [_BRIEF_HEADER.get(name.lower()) for name in stripped.split()]
+            continue
+        if stripped.startswith('Brief'):
+            # H3C 路由模式/桥模式两张表，表头不同
+            columns = None
+            continue
+        # 跳过图例行（Link: ADM - administratively down、*down: administratively down 等）
+        if columns is None or line[:1].isspace() or ':' in stripped.split()[0]:
+            continue
+        # 描述可能含空格，只对描述之前的列按空白切分；描述可以为空
+        has_description = columns[-1] == 'description'
+        fields = stripped.split(None, len(columns) - 1) if has_description else stripped.split()
+        if len(fields) < len(columns) - has_description:
+            continue
+        record = dict.fromkeys(INTERFACE_BRIEF_COLUMNS)
+        for column, value in zip(columns, fields):
+            if column is not None:
+                record[column] = _BRIEF_CONVERT.get(column, _text)(value)
+        records.append(record)
+    return records
+
+
+# ---------------- display ntp-service status ----------------
+NTP_STATUS_COLUMNS = {
+    'synchronized': 'boolean', 'status': 'string', 'stratum': 'Int64', 'reference': 'string',
+    'offset_ms': 'Float64', 'root_delay_ms': 'Float64', 'root_dispersion_ms': 'Float64',
+}
+_NTP_KV_RE = re.compile(r'^\s*([A-Za-z][A-Za-z ]*?)\s*:\s*(.*?)\s*$')
+_NTP_MS_RE = re.compile(r'(-?[\d.]+)\s*(ms|s)?', re.IGNORECASE)
+
+
+def _milliseconds(value: str) -> Optional[float]:
+    m = _NTP_MS_RE.match(value or '')
+    if not m:
+        return None
+    number = float(m.group(1))
+    return number * 1000 if (m.group(2) or '').lower() == 's' else number
+
+
+def parse_ntp_status(text: str) -> List[Dict]:
+    fields = {}
+    for line in text.splitlines():
+        m = _NTP_KV_RE.match(line)
+        if m:
+            fields.setdefault(m.group(1).lower(), m.group(2))
+    if 'clock status' not in fields:
+        return []
+    status = fields['clock status'].lower()
+    reference = fields.get('reference clock id') or fields.get('system peer')
+    return [{
+        'synchronized': status.startswith('synchronized'),
+        'status': status,
+        'stratum': _int(fields.get('clock stratum')),
+        'reference': _text(reference),
+        'offset_ms': _milliseconds(fields.get('clock offset')),
+        'root_delay_ms': _milliseconds(fields.get('root delay')),
+        'root_dispersion_ms': _milliseconds(fields.get('root dispersion')),
+    }]
+
+
+# ---------------- NTP 配置语句 ----------------
+NTP_CONFIG_COLUMNS = {
+    'statement': 'string', 'kind': 'string', 'address': 'string', 'vpn_instance': 'string', 'source': 'string',
+}
+# H3C: ntp-service unicast-server 10.0.0.1 [vpn-instance X] [source LoopBack0]
+# Huawei: ntp-service unicast-server 10.0.0.1 [source-interface LoopBack0] / ntp unicast-server ...
+# 整段输出一次 finditer，不逐行匹配
+_NTP_STATEMENT_RE = re.compile(r'^[ \t]*(?:ntp-service|ntp)[ \t]+(?P<rest>.*?)[ \t\r]*$',
+                               re.IGNORECASE | re.MULTILINE)
+_NTP_PEER_RE = re.compile(r'^(?:ipv6 )?unicast-(?P<kind>server|peer)\s+(?P<address>\S+)', re.IGNORECASE)
+_NTP_VPN_RE = re.compile(r'\bvpn-instance\s+(\S+)', re.IGNORECASE)
+_NTP_SOURCE_RE = re.compile(r'\bsource(?:-interface)?\s+(\S+)', re.IGNORECASE)
+
+
+def parse_ntp_config(text: str) -> List[Dict]:
+    records = []
+    for m in _NTP_STATEMENT_RE.finditer(text):
+        rest = m.group('rest')
+        peer = _NTP_PEER_RE.match(rest)
+        vpn = _NTP_VPN_RE.search(rest)
+        source = _NTP_SOURCE_RE.search(rest)
+        records.append({
+            'statement': m.group(0).strip(),
+            'kind': peer.group('kind').lower() if peer else rest.split()[0].lower() if rest else None,
+            'address': peer.group('address') if peer else None,
+            'vpn_instance': vpn.group(1) if vpn else None,
+            'source': source.group(1) if source else None,
+        })
+    return records
+
+
+# ---------------- display version ----------------
+VERSION_COLUMNS = {
+    'vendor': 'string', 'software': 'string', 'version': 'string', 'release': 'string', 'model': 'string',
+    'uptime_seconds': 'Int64', 'reboot_reason': 'string',
+}
+_VERSION_RE = re.compile(r'Version\s+([\w.\-]+)(?:,\s*Release\s+(\w+)|\s*\(([^)]+)\))?', re.IGNORECASE)
+_UPTIME_RE = re.compile(r'^\s*(?P<model>.+?)\s+uptime is\s+(?P<uptime>.+?)\s*$', re.IGNORECASE)
+_UPTIME_UNITS = {'year': 31536000, 'week': 604800, 'day': 86400, 'hour': 3600, 'minute': 60, 'second': 1}
+_UPTIME_PART_RE = re.compile(r'(\d+)\s+(year|week|day|hour|minute|second)s?', re.IGNORECASE)
+_REBOOT_RE = re.compile(r'Last reboot reason\s*:\s*(.+?)\s*$', re.IGNORECASE)
+
+
+def parse_version(text: str) -> List[Dict]:
+    record = dict.fromkeys(VERSION_COLUMNS)
+    lower = text.lower()
+    record['vendor'] = 'huawei' if 'huawei' in lower or 'vrp' in lower else \
+        'h3c' if 'h3c' in lower or 'comware' in lower else None
+    for line in text.splitlines():
+        m = _VERSION_RE.search(line)
+        if m and record['version'] is None:
+            record['software'] = line[:m.start()].strip(' ,') or None
+            record['version'] = m.group(1)
+            record['release'] = m.group(2) or m.group(3)
+            continue
+        m = _UPTIME_RE.match(line)
+        if m and record['model'] is None:
+            words = [w for w in m.group('model').split() if w.upper() not in ('H3C', 'HUAWEI')]
+            record['model'] = words[0] if words else None
+            record['uptime_seconds'] = sum(int(n) * _UPTIME_UNITS[unit.lower()]
+                                           for n, unit in _UPTIME_PART_RE.findall(m.group('uptime')))
+            continue
+        m = _REBOOT_RE.search(line)
+        if m:
+            record['reboot_reason'] = m.group(1)
+    return [record] if record['version'] or record['model'] else []
+
+
+# ---------------- display ip routing-table ----------------
+ROUTE_COLUMNS = {
+    'destination': 'string', 'prefix_len': 'Int64', 'protocol': 'string', 'preference': 'Int64',
+    'cost': 'Int64', 'flags': 'string', 'next_hop': 'string', 'interface': 'string',
+}
+_ROUTE_RE = re.compile(
+    r'^\s*(?P<dest>[\d.]+/\d+)?\s+(?P<proto>[A-Za-z][\w\-]*)\s+(?P<pre>\d+)\s+(?P<cost>\d+)\s+'
+    r'(?:(?P<flags>[A-Z]+)\s+)?(?P<nexthop>[\d.]+)\s+(?P<iface>\S+)\s*$')
+
+
+def parse_route(text: str) -> List[Dict]:
+    records = []
+    destination = None
+    for line in text.splitlines():
+        m = _ROUTE_RE.match(line)
+        if not m:
+            continue
+        if m.group('dest'):
+            destination = m.group('dest')
+        elif destination is None:
+            continue
+        network, prefix = destination.split('/')
+        records.append({
+            'destination': network, 'prefix_len': int(prefix), 'protocol': m.group('proto'),
+            'preference': int(m.group('pre')), 'cost': int(m.group('cost')), 'flags': m.group('flags'),
+            'next_hop': m.group('nexthop'), 'interface': m.group('iface'),
+        })
+    return records
+
+
+# 命令缩写：display → dis/disp...，interface → int/inter... 均可匹配
+TEMPLATES = [
+    Template('interface_brief', r'^dis\w*\s+(ip\s+)?int\w*\s+br\w*', INTERFACE_BRIEF_COLUMNS, parse_interface_brief),
+    Template('interface', r'^dis\w*\s+int\w*(?!\s+br)(\s+\S+)?\s*$', INTERFACE_COLUMNS, parse_interface),
+    Template('ntp_status', r'^dis\w*\s+ntp(-service)?\s+st\w*', NTP_STATUS_COLUMNS, parse_ntp_status),
+    Template('ntp_config', r'^dis\w*\s+cur\w*', NTP_CONFIG_COLUMNS, parse_ntp_config),
+    Template('version', r'^dis\w*\s+ver\w*\s*$', VERSION_COLUMNS, parse_version),
+    Template('route', r'^dis\w*\s+ip\s+rout\w*', ROUTE_COLUMNS, parse_route),
+]
+TEMPLATES_BY_NAME = {t.name: t for t in TEMPLATES}
+
+
+def templates_for(command: str) -> List[Template]:
+    return [t for t in TEMPLATES if t.matches(command)]
+
+
+def parse(command: str, output: str) -> Dict[str, List[Dict]]:
+    """按命令解析一段输出，返回 {模板名: 记录列表}；没有匹配的模板时返回空字典"""
+    return {t.name: t.parse(output or '') for t in templates_for(command)}
+
+
+def empty_frame(name: str) -> pd.DataFrame:
+    columns = TEMPLATES_BY_NAME[name].columns
+    return pd.DataFrame({'ip': pd.Series(dtype='string'),
+                         **{c: pd.Series(dtype=dtype) for c, dtype in columns.items()}})
+
+
+def _frame(name: str, rows: List[Dict]) -> pd.DataFrame:
+    if not rows:
+        return empty_frame(name)
+    columns = TEMPLATES_BY_NAME[name].columns
+    df = pd.DataFrame.from_records(rows, columns=['ip', *columns])
+    return df.astype({'ip': 'string', **columns})
+
+
+def frames(results: Iterable[Dict], tables: Iterable[str] = None) -> Dict[str, pd.DataFrame]:
+    """
+    设备结果（run_device 格式: {'ip', 'success', 'outputs': [{'cmd', 'output'}]}）解析为各模板的 DataFrame
+    每行带 ip 列；tables 指定时只解析这些模板。没有数据的模板也返回空表（列和类型齐全）
+    """
+    wanted = set(tables) if tables else set(TEMPLATES_BY_NAME)
+    rows = {name: [] for name in wanted}
+    for result in results:
+        if not result.get('success'):
+            continue
+        ip = result['ip']
+        for item in result.get('outputs', []):
+            if 'output' not in item:
+                continue
+            for template in templates_for(item['cmd']):
+                if template.name in wanted:
+                    rows[template.name].extend({'ip': ip, **record} for record in template.parse(item['output']))
+    return {name: _frame(name, rows[name]) for name in wanted}
+
+
+def frames_from_outputs(df: pd.DataFrame, tables: Iterable[str] = None) -> Dict[str, pd.DataFrame]:
+    """ip/command/output 三列的表（如 ResultsStore.query(columns=[...]) 的结果）解析为各模板的 DataFrame"""
+    results = ({'ip': ip, 'success': True, 'outputs': [{'cmd': command, 'output': output}]}
+               for ip, command, output in df[['ip', 'command', 'output']].itertuples(index=False)
+               if isinstance(output, str))
+    return frames(results, tables)
+
+
+def iter_jsonl(path):
+    """逐台读取 ResultWriter 写出的结果（还原去重的输出）"""
+    return iter_results(path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='解析结果文件中的 display 输出并查询')
+    parser.add_argument('jsonl', help='结果文件 results/results_<时间戳>.jsonl')
+    parser.add_argument('--table', choices=sorted(TEMPLATES_BY_NAME), required=True, help='解析模板')
+    parser.add_argument('--query', help='pandas 查询表达式，如 "crc > 0"')
+    parser.add_argument('--csv', help='结果另存为 CSV')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = frames(iter_jsonl(args.jsonl), [args.table])[args.table]
+    if args.query:
+        df = df.query(args.query)
+    if args.csv:
+        df.to_csv(args.csv, index=False, encoding='utf-8-sig')
+        print(f"{len(df)} 行已保存: {args.csv}")
+    else:
+        with pd.option_context('display.max_rows', 200, 'display.width', 200):
+            print(df.to_string(index=False) if len(df) else '（无匹配记录）')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
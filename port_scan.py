@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TCP 端口可达性预扫描
+SSH 阶段之前用非阻塞 socket 对整个清单同时发起 TCP 连接（只做三次握手，不发任何数据），
+短超时内握手成功的设备才交给 SSH 工作线程；不可达的设备直接记入报告，
+不再在 paramiko 里占用一个工作线程等满 ssh.timeout。
+"""
+import errno
+import logging
+import os
+import selectors
+import socket
+import sys
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# Windows 的 select() 最多监视 512 个 socket
+MAX_PARALLEL_LIMIT = 500 if sys.platform == 'win32' else 4096
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, 'WSAEWOULDBLOCK', -1)}
+
+
+def _fd_budget(requested: int) -> int:
+    """并发数不超过进程文件描述符上限（预留一部分给日志/结果文件）"""
+    limit = min(requested, MAX_PARALLEL_LIMIT)
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            limit = min(limit, max(16, soft - 128))
+    except (ImportError, ValueError, OSError):
+        pass
+    return max(1, limit)
+
+
+def _start(host: str, port: int):
+    """发起非阻塞连接，返回 (socket, 已完成时的结果)；结果 None 表示可达"""
+    try:
+        family, socktype, proto, _, addr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+    except (socket.gaierror, UnicodeError) as e:
+        return None, f'地址解析失败: {e}'
+    try:
+        sock = socket.socket(family, socktype, proto)
+    except OSError as e:  # 文件描述符耗尽、本机不支持 IPv6 等
+        return None, f'无法创建连接: {e}'
+    try:
+        sock.setblocking(False)
+        code = sock.connect_ex(addr)
+    except OSError as e:
+        sock.close()
+        return None, f'连接失败: {e}'
+    if code == 0:
+        sock.close()
+        return None, None
+    if code in _IN_PROGRESS:
+        return sock, None
+    sock.close()
+    return None, _reason(code)
+
+
+def _reason(code: int) -> str:
+    if code == errno.ECONNREFUSED:
+        return '端口拒绝连接'
+    if code in (errno.EHOSTUNREACH, errno.ENETUNREACH):
+        return '路由不可达'
+    return f'连接失败: {os.strerror(code)}'
+
+
+def scan(targets: Iterable[Tuple[str, int]], timeout: float = 1.5,
+         max_parallel: int = 2000) -> Dict[Tuple[str, int], Optional[str]]:
+    """
+    并发检测 (host, port) 是否可建立 TCP 连接
+    返回 {(host, port): None（可达）或不可达原因}
+    """
+    pending = list(dict.fromkeys(targets))
+    results: Dict[Tuple[str, int], Optional[str]] = {}
+    max_parallel = _fd_budget(max_parallel)
+    selector = selectors.DefaultSelector()
+    deadlines = {}
+    index = 0
+    try:
+        while index < len(pending) or deadlines:
+            # 补足在途连接
+            while index < len(pending) and len(deadlines) < max_parallel:
+                target = pending[index]
+                index += 1
+                sock, reason = _start(*target)
+                if sock is None:
+                    results[target] = reason
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE, target)
+                deadlines[sock] = time.monotonic() + timeout
+
+            now = time.monotonic()
+            wait = max(0.0, min(deadlines.values()) - now) if deadlines else 0
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                results[key.data] = None if code == 0 else _reason(code)
+                selector.unregister(sock)
+                del deadlines[sock]
+                sock.close()
+
+            # 超时未完成握手
+            now = time.monotonic()
+            for sock in [s for s, deadline in deadlines.items() if deadline <= now]:
+                results[selector.get_key(sock).data] = f'连接超时（{timeout}s）'
+                selector.unregister(sock)
+                del deadlines[sock]
+                sock.close()
+    finally:
+        for sock in list(deadlines):
+            selector.unregister(sock)
+            sock.close()
+        selector.close()
+    return results
+
+
+def partition(devices, default_port: int = 22, timeout: float = 1.5, max_parallel: int = 2000):
+    """
+    按端口可达性拆分设备清单
+    返回 (reachable, unreachable)，unreachable 为 [(device, 原因)]
+    """
+    def target(device):
+        return device['ip'], int(device.get('port') or default_port)
+
+    started = time.monotonic()
+    results = scan((target(d) for d in devices), timeout, max_parallel)
+    reachable, unreachable = [], []
+    for device in devices:
+        reason = results.get(target(device))
+        if reason is None:
+            reachable.append(device)
+        else:
+            unreachable.append((device, reason))
+    logging.info(f"端口预扫描 {len(devices)} 台设备，可达 {len(reachable)} 台，"
+                 f"耗时 {time.monotonic() - started:.1f}s")
+    return reachable, unreachable
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行期性能剖析（可选，按次开启）
+    cprofile  cProfile 采集，输出 .prof（snakeviz 等可打开）和按累计耗时排序的文本报告；
+              Python 3.12+ 的 cProfile 基于 sys.monitoring，对所有线程生效且同时只能有一个在采集，
+              start() 开启一个进程级剖析器；更早的版本只采集调用所在线程，每台设备的处理函数
+              在各自线程中单独采集后合并（asyncio 引擎下采集事件循环线程）
+    sampling  后台线程按固定间隔采样所有线程的调用栈，输出折叠栈文件（flamegraph.pl / speedscope 可直接打开），
+              开销与线程数和采样间隔相关，不受被测代码调用次数影响
+"""
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+
+REPORT_LINES = 40  # 文本报告中列出的函数数
+PROCESS_WIDE = sys.version_info >= (3, 12)  # cProfile 是否对所有线程生效（同时只能开启一个）
+
+
+class CallProfiler:
+    """
+    cProfile：3.12+ 在 start()/stop() 之间开启一个进程级剖析器；
+    更早的版本包装处理函数，每次调用单独采集后合并（cProfile 只采集调用所在线程）。
+    剖析器开启失败（已有其他剖析器在采集）时只告警、照常执行，剖析不影响设备处理
+    """
+
+    suffix = '.prof'
+
+    def __init__(self, process_wide: bool = PROCESS_WIDE):
+        self.process_wide = process_wide
+        self._stats = None
+        self._profile = None
+        self._lock = threading.Lock()
+
+    def wrap(self, fn):
+        if self.process_wide:
+            return fn
+
+        @wraps(fn)
+        def profiled(*args, **kwargs):
+            profile = self._enable()
+            if profile is None:
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._collect(profile)
+        return profiled
+
+    def start(self):
+        if self.process_wide:
+            self._profile = self._enable()
+        return self
+
+    def stop(self):
+        if self._profile is not None:
+            self._collect(self._profile)
+            self._profile = None
+
+    def _enable(self):
+        """开启一个剖析器，失败返回 None"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # Another profiling tool is already active
+            logging.warning(f"cProfile 无法开启，本次不采集: {e}")
+            return None
+        return profile
+
+    def _collect(self, profile):
+        """停止采集并合并结果；没有采集到数据的剖析器直接丢弃"""
+        try:
+            profile.disable()
+            profile.create_stats()
+            if not profile.stats:
+                return
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+        except Exception as e:
+            logging.warning(f"cProfile 结果合并失败: {e}")
+
+    def write(self, path) -> Path:
+        """写出 <path>.prof 和 <path>.txt，返回 .prof 路径"""
+        path = Path(path).with_suffix(self.suffix)
+        with self._lock:
+            if self._stats is None:
+                return None
+            self._stats.dump_stats(str(path))
+            text = io.StringIO()
+            pstats.Stats(str(path), stream=text).sort_stats('cumulative').print_stats(REPORT_LINES)
+        path.with_suffix('.txt').write_text(text.getvalue(), encoding='utf-8')
+        return path
+
+
+class SamplingProfiler:
+    """采样剖析：定时抓取所有线程的调用栈并计数"""
+
+    suffix = '.folded'
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def wrap(self, fn):
+        return fn
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{Path(code.co_filename).name}:{code.co_name}')
+                    frame = frame.f_back
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path) -> Path:
+        """写出折叠栈文件（每行: 栈 次数）"""
+        path = Path(path).with_suffix(self.suffix)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+def create(mode: str = None, interval: float = 0.01):
+    """按模式创建剖析器：cprofile / sampling，其他值返回 None"""
+    if mode == 'cprofile':
+        return CallProfiler()
+    if mode == 'sampling':
+        return SamplingProfiler(interval)
+    return None
+
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+厂商提示符配置
+每个厂商一组预编译正则；登录后从欢迎信息末尾学习设备的主机名提示符（如 <SW-CORE-01>），
+之后只在输出末尾匹配该主机名，不再用通用的 [>\\]#] 结尾规则误判以 ] 或 > 结尾的输出行。
+"""
+import re
+from typing import Optional
+
+MORE_PATTERNS = [
+    '---- More ----',
+    '--More--',
+    'Press any key to continue',
+    '---(more)---'
+]
+
+
+class SessionPrompt:
+    """单个会话学习到的提示符"""
+
+    def __init__(self, profile: 'PromptProfile', hostname: str, literal: str):
+        self.profile = profile
+        self.hostname = hostname
+        self.literal = literal
+        # 同一主机名在其他视图下的提示符（如 [SW-CORE-01]、[SW-CORE-01-GigabitEthernet1/0/1]）
+        self._view_re = re.compile(
+            r'(?:^|[\r\n])' + profile.session_template.format(host=re.escape(hostname)) + r'\s*$'
+        )
+        # 提示符后紧跟命令回显的行（流水线输出的命令分界）
+        self._echo_re = re.compile(
+            r'^\s*' + profile.session_template.format(host=re.escape(hostname)) + r'[ \t]*(?P<echo>\S.*?)\s*$'
+        )
+
+    def is_prompt(self, tail: str) -> bool:
+        """输出末尾是否为本会话的提示符"""
+        text = tail.rstrip()
+        if text.endswith(self.literal):
+            head = text[:-len(self.literal)]
+            if not head or head[-1] in '\r\n':
+                return True
+        return self._view_re.search(text) is not None
+
+    def is_prompt_line(self, line: str) -> bool:
+        """单行是否为本会话的提示符（用于清理输出）"""
+        line = line.strip()
+        return line == self.literal or self._view_re.search(line) is not None
+
+    def echo_of(self, line: str) -> Optional[str]:
+        """行首为本会话提示符且后跟命令回显时返回回显内容，否则返回 None"""
+        m = self._echo_re.match(line)
+        return m.group('echo') if m else None
+
+    def has_more(self, text: str) -> bool:
+        return self.profile.has_more(text)
+
+    def __repr__(self):
+        return f"SessionPrompt({self.profile.name}, {self.literal!r})"
+
+
+class PromptProfile:
+    """厂商提示符配置（正则在创建时预编译）"""
+
+    def __init__(self, name: str, prompt: str, session_template: str, more_patterns=None,
+                 disable_paging: str = None):
+        """
+        prompt: 任意主机名提示符的正则片段，需包含命名分组 host
+        session_template: 已知主机名后的提示符正则片段，{host} 处填入转义后的主机名
+        disable_paging: 关闭当前会话分页的命令
+        """
+        self.name = name
+        self.session_template = session_template
+        self.disable_paging = disable_paging
+        self.prompt_re = re.compile(r'(?:^|[\r\n])(?P<prompt>' + prompt + r')\s*$')
+        self.more_re = re.compile('|'.join(re.escape(p) for p in (more_patterns or MORE_PATTERNS)))
+
+    def is_prompt(self, tail: str) -> bool:
+        return self.prompt_re.search(tail) is not None
+
+    def has_more(self, text: str) -> bool:
+        return self.more_re.search(text) is not None
+
+    def learn(self, text: str) -> Optional[SessionPrompt]:
+        """从输出末尾学习提示符，失败返回 None"""
+        m = self.prompt_re.search(text[-256:])
+        if not m:
+            return None
+        return SessionPrompt(self, m.group('host'), m.group('prompt'))
+
+
+# H3C/Huawei: <HOST> 用户视图，[HOST]/[HOST-view] 系统视图，Huawei VRP8 为 [~HOST]/[*HOST]
+_COMWARE_PROMPT = r'[<\[][~*]?(?P<host>[\w.\-/:@]+)[>\]]'
+_COMWARE_SESSION = r'[<\[][~*]?{host}(?:-[^\s<>\[\]]+)?[>\]]'
+
+VENDOR_PROFILES = {
+    'h3c': PromptProfile('h3c', _COMWARE_PROMPT, _COMWARE_SESSION,
+                         disable_paging='screen-length disable'),
+    'huawei': PromptProfile('huawei', _COMWARE_PROMPT, _COMWARE_SESSION,
+                            disable_paging='screen-length 0 temporary'),
+    # Cisco: HOST> / HOST# / HOST(config-if)#
+    'cisco': PromptProfile('cisco', r'(?P<host>[\w.\-/:@]+)(?:\([\w\-/.]+\))?[>#]',
+                           r'{host}(?:\([\w\-/.]+\))?[>#]',
+                           disable_paging='terminal length 0'),
+}
+
+
+def get_profile(vendor: str) -> Optional[PromptProfile]:
+    """按厂商名取配置，未知厂商返回 None"""
+    return VENDOR_PROFILES.get((vendor or '').lower())
+
+
+def learn_prompt(text: str, vendor: str = None) -> Optional[SessionPrompt]:
+    """按厂商学习提示符；厂商未知时依次尝试各配置"""
+    profile = get_profile(vendor)
+    profiles = [profile] if profile else [VENDOR_PROFILES['h3c'], VENDOR_PROFILES['cisco']]
+    for p in profiles:
+        session = p.learn(text)
+        if session:
+            return session
+    return None
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+令牌桶限速
+三类共享令牌桶，只在确实需要限速的地方降速，不再对所有设备统一 sleep：
+    command  每台设备每秒下发的命令数（保护设备控制平面）
+    session  每个站点每秒新建的 SSH 会话数（站点取清单 site 列，否则按 IP 网段）
+    login    每个 AAA 服务器每秒的登录数（取清单 aaa 列，否则按 servers 网段映射，否则归入 default）
+rate 为 0 表示不限速。令牌按预约方式发放：调用方拿到需要等待的秒数后自行 sleep，
+线程（time.sleep）与协程（asyncio.sleep）共用同一组桶。
+"""
+import ipaddress
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """令牌桶（线程安全）：rate 个/秒，最多积累 burst 个"""
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """预约 tokens 个令牌，返回需要等待的秒数（令牌可透支，等待期间到账）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """按设备/站点/AAA 分组的令牌桶集合"""
+
+    def __init__(self, config: Dict = None, share: int = 1):
+        """
+        config: {'command_per_device': {rate, burst},
+                 'session_per_site': {rate, burst, prefix},
+                 'login_per_aaa': {rate, burst, servers: {网段: AAA 名}}}
+        share: 多进程分片时每个进程分得的份数，站点/AAA 速率按 1/share 缩放
+               （同一站点/AAA 的设备分散在各进程中；每台设备只属于一个进程，设备命令速率不缩放）
+        """
+        config = config or {}
+        self._specs = {}
+        for kind, key in (('command', 'command_per_device'), ('session', 'session_per_site'),
+                          ('login', 'login_per_aaa')):
+            spec = config.get(key) or {}
+            divisor = 1 if kind == 'command' else max(1, share)
+            rate = float(spec.get('rate') or 0) / divisor
+            if rate > 0:
+                self._specs[kind] = (rate, max(1.0, float(spec.get('burst', 1)) / divisor))
+        self.site_prefix = int((config.get('session_per_site') or {}).get('prefix', 24))
+        self.aaa_servers = [(ipaddress.ip_network(net, strict=False), name)
+                            for net, name in ((config.get('login_per_aaa') or {}).get('servers') or {}).items()]
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.waited = {kind: 0.0 for kind in ('command', 'session', 'login')}  # 累计限速等待（秒）
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._specs)
+
+    def site_of(self, device_info: Dict) -> str:
+        site = device_info.get('site')
+        if site:
+            return str(site)
+        try:
+            return str(ipaddress.ip_network(f"{device_info['ip']}/{self.site_prefix}", strict=False))
+        except ValueError:
+            return device_info['ip']
+
+    def aaa_of(self, device_info: Dict) -> str:
+        aaa = device_info.get('aaa')
+        if aaa:
+            return str(aaa)
+        try:
+            addr = ipaddress.ip_address(device_info['ip'])
+        except ValueError:
+            return 'default'
+        for net, name in self.aaa_servers:
+            if addr in net:
+                return name
+        return 'default'
+
+    def connect_delay(self, device_info: Dict) -> float:
+        """新建会话前需要等待的秒数（同时占用站点和 AAA 两个桶）"""
+        return max(self._reserve('session', self.site_of(device_info)),
+                   self._reserve('login', self.aaa_of(device_info)))
+
+    def command_delay(self, device_ip: str, count: int = 1) -> float:
+        """向设备下发 count 条命令前需要等待的秒数"""
+        return self._reserve('command', device_ip, count)
+
+    def wait_connect(self, device_info: Dict):
+        time.sleep(self.connect_delay(device_info))
+
+    def wait_command(self, device_ip: str, count: int = 1):
+        time.sleep(self.command_delay(device_ip, count))
+
+    def _reserve(self, kind: str, key: str, tokens: float = 1) -> float:
+        spec = self._specs.get(kind)
+        if spec is None:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get((kind, key))
+            if bucket is None:
+                bucket = self._buckets[(kind, key)] = TokenBucket(*spec)
+        delay = bucket.reserve(tokens)
+        if delay:
+            with self._lock:
+                self.waited[kind] += delay
+        return delay
+
+
+def from_config(config: Optional[Dict], share: int = 1) -> Optional[RateLimiter]:
+    """按 rate_limits 配置创建限速器，没有任何生效的桶时返回 None"""
+    limiter = RateLimiter(config, share)
+    return limiter if limiter.enabled else None
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话录制与离线回放
+录制: 连接建立后包装 SSHClient/Transport/Channel，把每个通道收发的原始字节按时间戳写入
+      <dir>/<ip>_<序号>.rec.gz（gzip 压缩的 JSON Lines，每个连接一个文件）:
+          首行   {"ip", "port", "vendor", "profile", "started"}
+          事件   {"t": 相对秒数, "ch": 通道号, "ev": open/exec/in/out/eof/error/exit/close, ...}
+                 in/out 的 data 为 base64
+回放: ReplaySource 提供与 SSHClient 接口一致的回放连接，交给 NetworkDeviceChecker(replay=...) 后
+      读取/清理/检查逻辑原样运行，只是数据来自录制文件，不连设备、不等待:
+          invoke_shell       取下一个录制的交互式通道
+          exec_command(cmd)  取下一个执行同一命令的录制 exec 通道（录制时失败的照样抛异常）
+          send(data)         跳到录制中发送相同内容的位置，之后的输出才可读
+          recv               依次返回录制的输出；下一步应由客户端发送时视为 EOF（对应实时运行中的读超时）
+      发送内容与录制对不上时（如改动了命令序列）该通道提前 EOF，并计入 diverged；
+      请求录制中没有的 exec 命令或交互式通道同样计入 diverged。
+"""
+import base64
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import paramiko
+
+SUFFIX = '.rec.gz'
+
+
+def _to_bytes(data) -> bytes:
+    return data.encode('utf-8') if isinstance(data, str) else bytes(data)
+
+
+class _Session:
+    """一个连接的录制文件（多个通道线程共用，写入加锁）"""
+
+    def __init__(self, path: Path, header: Dict, compresslevel: int):
+        self.path = path
+        # 独占创建：分片进程处理同一 IP（清单中重复）时不互相覆盖
+        self._file = gzip.open(path, 'xt', encoding='utf-8', compresslevel=compresslevel)
+        self._file.write(json.dumps(header, ensure_ascii=False) + '\n')
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._channels = 0
+
+    def next_channel(self) -> int:
+        with self._lock:
+            self._channels += 1
+            return self._channels
+
+    def write(self, channel: int, event: str, data: bytes = None, **fields):
+        record = {'t': round(time.perf_counter() - self._started, 6), 'ch': channel, 'ev': event, **fields}
+        if data is not None:
+            record['data'] = base64.b64encode(data).decode('ascii')
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingChannel:
+    """通道包装：记录收发的原始字节，其余属性/方法透传"""
+
+    def __init__(self, channel, session: _Session, kind: str):
+        self._channel = channel
+        self._session = session
+        self._id = session.next_channel()
+        self._closed = False
+        session.write(self._id, 'open', kind=kind)
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    def recv(self, nbytes: int) -> bytes:
+        data = self._channel.recv(nbytes)
+        self._session.write(self._id, 'in' if data else 'eof', data or None)
+        return data
+
+    def send(self, data) -> int:
+        data = _to_bytes(data)
+        sent = self._channel.send(data)
+        self._session.write(self._id, 'out', data[:sent])
+        return sent
+
+    def sendall(self, data):
+        data = _to_bytes(data)
+        self._channel.sendall(data)
+        self._session.write(self._id, 'out', data)
+
+    def exec_command(self, command: str):
+        self._session.write(self._id, 'exec', cmd=command)
+        try:
+            self._channel.exec_command(command)
+        except Exception as e:
+            self._session.write(self._id, 'error', error=str(e))
+            raise
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            if self._channel.exit_status_ready():
+                self._session.write(self._id, 'exit', status=self._channel.exit_status)
+            self._session.write(self._id, 'close')
+        self._channel.close()
+
+
+class _RecordingTransport:
+    def __init__(self, transport, session: _Session):
+        self._transport = transport
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._transport, name)
+
+    def open_session(self, *args, **kwargs):
+        return RecordingChannel(self._transport.open_session(*args, **kwargs), self._session, 'session')
+
+
+class RecordingClient:
+    """SSHClient 包装：新开的通道都经 RecordingChannel 录制，关闭连接时写完文件"""
+
+    def __init__(self, client: paramiko.SSHClient, session: _Session):
+        self._client = client
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def invoke_shell(self, *args, **kwargs):
+        return RecordingChannel(self._client.invoke_shell(*args, **kwargs), self._session, 'shell')
+
+    def get_transport(self):
+        transport = self._client.get_transport()
+        return _RecordingTransport(transport, self._session) if transport is not None else None
+
+    def close(self):
+        try:
+            self._client.close()
+        finally:
+            self._session.close()
+
+
+class SessionRecorder:
+    """按连接录制原始字节流；可 pickle 传给分片工作进程（各进程各自写文件）"""
+
+    def __init__(self, path='results/recordings', compresslevel: int = 6):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.compresslevel = compresslevel
+        self._lock = threading.Lock()
+        self._seq = defaultdict(int)
+        self._sessions = []
+
+    def __getstate__(self):
+        return {'path': self.path, 'compresslevel': self.compresslevel}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['compresslevel'])
+
+    def wrap(self, client: paramiko.SSHClient, device_info: Dict) -> RecordingClient:
+        ip = device_info['ip']
+        header = {'ip': ip, 'started': datetime.now().isoformat(timespec='seconds'),
+                  **{k: device_info[k] for k in ('port', 'vendor', 'profile') if device_info.get(k)}}
+        while True:
+            with self._lock:
+                self._seq[ip] += 1
+                path = self.path / f"{ip}_{self._seq[ip]:03d}{SUFFIX}"
+            try:
+                session = _Session(path, header, self.compresslevel)
+                break
+            except FileExistsError:
+                continue
+        with self._lock:
+            self._sessions = [s for s in self._sessions if s._file is not None]
+            self._sessions.append(session)
+        return RecordingClient(client, session)
+
+    def close(self):
+        """写完仍未关闭的连接（如连接池中保留的连接）"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+
+class _ChannelRecord:
+    """录制文件中的一个通道"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.command = None
+        self.error = None
+        self.exit_status = None
+        self.events = []  # [(in/out/eof, bytes)]
+        self.used = False
+
+
+class ReplayChannel:
+    """按录制内容回放的通道，接口与 paramiko.Channel 的常用部分一致"""
+
+    def __init__(self, client: 'ReplayClient', record: _ChannelRecord = None):
+        self._client = client
+        self._record = record
+        self._pos = 0
+        self._pending = b''  # recv(nbytes) 未取完的部分
+        self.closed = False
+
+    def _events(self) -> List:
+        return self._record.events if self._record is not None else []
+
+    def exec_command(self, command: str):
+        self._record = self._client._take(lambda r: r.kind == 'session' and r.command == command)
+        if self._record is None:
+            # 命令不在录制中（命令列表改了），回退路径的结果同样无从对应
+            self._client.diverged += 1
+            raise paramiko.SSHException(f'录制中没有 exec 命令: {command}')
+        if self._record.error:
+            raise paramiko.SSHException(self._record.error)
+
+    def recv_ready(self) -> bool:
+        events = self._events()
+        return bool(self._pending) or (self._pos < len(events) and events[self._pos][0] == 'in')
+
+    @property
+    def eof_received(self) -> bool:
+        return not self.recv_ready()
+
+    def recv(self, nbytes: int) -> bytes:
+        if not self._pending:
+            events = self._events()
+            if self._pos < len(events) and events[self._pos][0] in ('in', 'eof'):
+                self._pending = events[self._pos][1]
+                self._pos += 1
+        data, self._pending = self._pending[:nbytes], self._pending[nbytes:]
+        return data
+
+    def send(self, data) -> int:
+        data = _to_bytes(data)
+        events = self._events()
+        for index in range(self._pos, len(events)):
+            if events[index][0] == 'out' and events[index][1] == data:
+                self._pos = index + 1
+                self._pending = b''
+                return len(data)
+        # 发送内容与录制不一致，之后的输出无从对应
+        self._client.diverged += 1
+        self._pos = len(events)
+        self._pending = b''
+        return len(data)
+
+    def sendall(self, data):
+        self.send(data)
+
+    def settimeout(self, timeout):
+        pass
+
+    def exit_status_ready(self) -> bool:
+        return self._record is not None and self._record.exit_status is not None
+
+    def recv_exit_status(self) -> int:
+        return self._record.exit_status if self.exit_status_ready() else -1
+
+    def close(self):
+        self.closed = True
+
+
+class ReplayClient:
+    """一个录制连接的回放（同时充当 Transport）"""
+
+    def __init__(self, header: Dict, channels: List[_ChannelRecord]):
+        self.header = header
+        self._channels = channels
+        self._lock = threading.Lock()
+        self.diverged = 0
+        self.active = True
+
+    def _take(self, match) -> Optional[_ChannelRecord]:
+        with self._lock:
+            for record in self._channels:
+                if not record.used and match(record):
+                    record.used = True
+                    return record
+        return None
+
+    def invoke_shell(self, *args, **kwargs) -> ReplayChannel:
+        record = self._take(lambda r: r.kind == 'shell')
+        if record is None:
+            self._client.diverged += 1
+            raise paramiko.SSHException('录制中没有更多交互式通道')
+        return ReplayChannel(self, record)
+
+    def get_transport(self):
+        return self
+
+    def open_session(self, *args, **kwargs) -> ReplayChannel:
+        return ReplayChannel(self)
+
+    def is_active(self) -> bool:
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+    def close(self):
+        self.active = False
+
+
+def load(path) -> ReplayClient:
+    """读取一个录制文件"""
+    channels = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        for line in f:
+            event = json.loads(line)
+            kind = event['ev']
+            if kind == 'open':
+                channels[event['ch']] = _ChannelRecord(event['kind'])
+                continue
+            record = channels.get(event['ch'])
+            if record is None:
+                continue
+            if kind in ('in', 'out', 'eof'):
+                record.events.append((kind, base64.b64decode(event.get('data', ''))))
+            elif kind == 'exec':
+                record.command = event['cmd']
+            elif kind == 'error':
+                record.error = event['error']
+            elif kind == 'exit':
+                record.exit_status = event['status']
+    return ReplayClient(header, list(channels.values()))
+
+
+def read_header(path) -> Dict:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.loads(f.readline())
+
+
+class ReplaySource:
+    """一次录制（目录）的回放来源：同一设备的多个连接按录制顺序依次回放"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._files = defaultdict(list)  # ip -> [录制文件]
+        self._headers = []
+        for file in sorted(self.path.glob(f'*{SUFFIX}')):
+            header = read_header(file)
+            self._files[header['ip']].append(file)
+            self._headers.append(header)
+        self._lock = threading.Lock()
+        self.clients = []
+
+    def devices(self) -> List[Dict]:
+        """录制中的设备，每个录制连接一项（device_info 格式，run_device / check_device_ntp 均可用）"""
+        return [{'ip': header['ip'], 'user': '', 'pwd': '', 'username': '', 'password': '',
+                 **{k: header[k] for k in ('port', 'vendor', 'profile') if k in header}}
+                for header in self._headers]
+
+    def connect(self, device_info: Dict) -> Optional[ReplayClient]:
+        """取该设备下一个录制连接，没有时返回 None"""
+        with self._lock:
+            files = self._files.get(device_info['ip'])
+            if not files:
+                return None
+            file = files.pop(0)
+        client = load(file)
+        with self._lock:
+            self.clients.append(client)
+        return client
+
+
+def from_config(config: Optional[Dict], run_id: str) -> Optional[SessionRecorder]:
+    """按 recording 配置创建录制器（目录下按运行编号分子目录），未启用返回 None"""
+    if not config or not config.get('enabled'):
+        return None
+    return SessionRecorder(Path(config.get('dir', 'results/recordings')) / run_id,
+                           config.get('compresslevel', 6))
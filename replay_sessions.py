@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线回放录制的会话（见 recording.py），不连设备重新跑一遍 读取 → 清理 → 检查 流程
+改动 _clean_output、提示符识别或 NTP 判断逻辑后，用同一份录制即可在几秒内重新评估全网设备。
+回放按录制时的交互顺序进行，命令列表和 pipeline 等执行方式需与录制时一致，
+对不上的通道计入 diverged（该通道提前结束，结果可能不完整）。
+用法:
+    python replay_sessions.py results/recordings/20261018_101500                       # run_device，命令取 commands.txt
+    python replay_sessions.py ntp_recordings/20261018_1015 --target check_device_ntp --json replay.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import log_pipeline
+import recording
+from check_paramiko import NetworkDeviceChecker
+from Increase_Paramiko import run_device
+
+TARGETS = ('run_device', 'check_device_ntp')
+
+
+def replay(path, target='run_device', cmds=None, custom_cmd=None, pipeline=False, parallel_channels=1,
+           config=None):
+    """回放一个录制目录，返回 (结果列表, ReplaySource)；交互与录制对不上的设备结果带 diverged 通道数"""
+    source = recording.ReplaySource(path)
+    checker = NetworkDeviceChecker({
+        'enable_logging': False,
+        'safe_disconnect': False,  # 回放连接无需发送 quit 和等待
+        **(config or {}),
+    }, replay=source)
+    results = []
+    for device in source.devices():
+        opened = len(source.clients)
+        if target == 'run_device':
+            result = run_device(device, cmds or [], checker, parallel_channels, pipeline)
+        else:
+            result = checker.check_device_ntp(device, custom_cmd)
+        diverged = sum(client.diverged for client in source.clients[opened:])
+        if diverged:
+            result['diverged'] = diverged
+        results.append(result)
+    return results, source
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='离线回放录制的设备会话')
+    parser.add_argument('path', help='录制目录（如 results/recordings/<运行编号>）')
+    parser.add_argument('--target', choices=TARGETS, default='run_device', help='回放经过的处理流程')
+    parser.add_argument('--commands', default='commands.txt', help='run_device 的命令文件（与录制时一致）')
+    parser.add_argument('--custom-cmd', help='check_device_ntp 的自定义命令（与录制时一致）')
+    parser.add_argument('--pipeline', action='store_true', help='录制时使用了流水线模式')
+    parser.add_argument('--parallel-channels', type=int, default=1, help='录制时的并行通道数')
+    parser.add_argument('--vendor', default='', help='默认厂商（录制中没有厂商信息时使用）')
+    parser.add_argument('--json', help='结果另存为 JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not Path(args.path).is_dir():
+        sys.exit(f'录制目录不存在: {args.path}')
+    cmds = []
+    if args.target == 'run_device':
+        if not Path(args.commands).exists():
+            sys.exit(f'命令文件不存在: {args.commands}')
+        cmds = [l.strip() for l in open(args.commands, encoding='utf-8') if l.strip()]
+    # 回放很快，逐台的 INFO 日志反而成为瓶颈，只保留告警
+    log_pipeline.start(level=logging.WARNING, console=False)
+    logging.getLogger(log_pipeline.DEVICE_LOGGER).setLevel(logging.WARNING)
+
+    started = time.perf_counter()
+    try:
+        results, source = replay(args.path, args.target, cmds, args.custom_cmd, args.pipeline,
+                                 args.parallel_channels, {'vendor': args.vendor})
+    finally:
+        log_pipeline.shutdown()
+    elapsed = time.perf_counter() - started
+
+    if args.target == 'run_device':
+        ok = [r for r in results if r.get('success') and not r.get('diverged')]
+    else:
+        ok = [r for r in results if r['status'] == 'success' and not r.get('diverged')]
+    print(f"回放设备 {len(results)} 台，成功 {len(ok)} 台，失败 {len(results) - len(ok)} 台，"
+          f"耗时 {elapsed:.2f}s（{len(results) / elapsed if elapsed else 0:.0f} 台/秒）")
+    if args.target == 'check_device_ntp':
+        print(f"NTP已配置 {sum(1 for r in results if r.get('has_ntp'))} 台")
+    diverged = [r for r in results if r.get('diverged')]
+    if diverged:
+        print(f"⚠ {len(diverged)} 台设备的交互与录制不一致（命令或执行方式与录制时不同？），结果不完整")
+    for result in results:
+        if result.get('error'):
+            print(f"  ERROR: {result['ip']} {result['error']}")
+        elif result.get('diverged'):
+            print(f"  ERROR: {result['ip']} {result['diverged']} 个通道与录制不一致")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2, default=str),
+                                   encoding='utf-8')
+        print(f"结果已保存: {args.json}")
+    return 0 if len(ok) == len(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
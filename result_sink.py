@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式结果写入
+每台设备完成后立即把结果追加到 JSONL 和 CSV（输出预览），按批刷盘；
+主进程只保留 ip/成功/错误等摘要，内存占用与在途设备数相关而不是设备总数，
+中途崩溃时已完成设备的结果也已落盘。
+
+命令输出按内容寻址去重：同样的输出（如同型号设备的 display version）只在
+results_<ts>.outputs.jsonl 中保存一份，设备结果里只记录 output_hash 引用。
+"""
+import csv
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+CSV_HEADER = ['IP', 'Command', 'Success', 'OutputLen', 'Output']
+PREVIEW_CHARS = 200  # CSV 中输出预览的最大字符数
+
+
+def output_hash(output: str) -> str:
+    """输出内容的寻址键"""
+    return hashlib.sha1(output.encode('utf-8')).hexdigest()
+
+
+def csv_rows(result):
+    """单台设备结果转换为 CSV 行"""
+    ip = result['ip']
+    if not result['success']:
+        return [[ip, '', 'FAIL', '', result.get('error', '未知错误')]]
+    # 增量模式下未变化的设备沿用上次输出，标记为 UNCHANGED
+    status = 'UNCHANGED' if result.get('unchanged') else 'OK'
+    rows = []
+    for o in result['outputs']:
+        if 'output' not in o:
+            rows.append([ip, o['cmd'], status, o.get('output_len', ''), ''])
+            continue
+        output_preview = o['output'][:PREVIEW_CHARS] + '...' if len(o['output']) > PREVIEW_CHARS else o['output']
+        rows.append([ip, o['cmd'], status, len(o['output']), output_preview])
+    return rows
+
+
+def summarize(result):
+    """结果摘要（不含命令输出），用于统计和邮件正文"""
+    return {'ip': result['ip'], 'success': result['success'], 'error': result.get('error'),
+            'unchanged': bool(result.get('unchanged'))}
+
+
+def iter_results(jsonl_path, blobs_path=None):
+    """
+    逐台读取 ResultWriter 写出的结果，按 output_hash 还原完整输出
+    blobs_path 默认为同目录的 <名称>.outputs.jsonl；去重后的输出整体载入内存（每种输出一份）
+    """
+    jsonl_path = Path(jsonl_path)
+    blobs_path = Path(blobs_path) if blobs_path else jsonl_path.with_suffix('.outputs.jsonl')
+    blobs = dict(iter_blobs(blobs_path)) if blobs_path.exists() else {}
+    with open(jsonl_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            for o in result.get('outputs', []):
+                if 'output' not in o:
+                    o['output'] = blobs.get(o['output_hash'], '')
+            yield result
+
+
+def iter_blobs(blobs_path):
+    """逐条读取去重输出文件，产出 (output_hash, output)"""
+    with open(blobs_path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                blob = json.loads(line)
+                yield blob['hash'], blob['output']
+
+
+class ResultWriter:
+    """结果写入器：设备结果 JSONL + 去重输出 JSONL + CSV，每 flush_every 台设备刷盘一次"""
+
+    def __init__(self, result_dir, flush_every: int = 50, prefix: str = 'results'):
+        ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+        result_dir = Path(result_dir)
+        result_dir.mkdir(exist_ok=True)
+        self.csv_path = result_dir / f'{prefix}_{ts}.csv'
+        self.jsonl_path = self.csv_path.with_suffix('.jsonl')
+        self.blobs_path = self.csv_path.with_suffix('.outputs.jsonl')
+        self.flush_every = max(1, flush_every)
+        self.summaries = []
+
+        self._csv_file = open(self.csv_path, 'w', newline='', encoding='utf-8-sig')
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(CSV_HEADER)
+        self._jsonl_file = open(self.jsonl_path, 'w', encoding='utf-8')
+        self._blobs_file = open(self.blobs_path, 'w', encoding='utf-8')
+        self._seen = set()   # 已写出的 output_hash
+        self._unflushed = 0
+        self.bytes_total = 0    # 去重前的输出总字节数
+        self.bytes_stored = 0   # 实际写出的输出字节数
+
+    def write(self, result):
+        """追加一台设备的结果，调用后不再持有完整输出"""
+        self._csv.writerows(csv_rows(result))
+        self._jsonl_file.write(json.dumps(self._dedup(result), ensure_ascii=False) + '\n')
+        self.summaries.append(summarize(result))
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def _dedup(self, result):
+        """输出替换为 output_hash 引用，首次出现的输出写入去重文件"""
+        if not result.get('outputs'):
+            return result
+        outputs = []
+        for o in result['outputs']:
+            if 'output' not in o:
+                outputs.append(o)
+                continue
+            h = output_hash(o['output'])
+            size = len(o['output'].encode('utf-8'))
+            self.bytes_total += size
+            if h not in self._seen:
+                self._seen.add(h)
+                self.bytes_stored += size
+                self._blobs_file.write(json.dumps({'hash': h, 'output': o['output']}, ensure_ascii=False) + '\n')
+            ref = {k: v for k, v in o.items() if k != 'output'}
+            ref['output_hash'] = h
+            ref['output_len'] = len(o['output'])
+            outputs.append(ref)
+        return dict(result, outputs=outputs)
+
+    def flush(self):
+        self._csv_file.flush()
+        self._jsonl_file.flush()
+        self._blobs_file.flush()
+        self._unflushed = 0
+
+    def close(self):
+        """刷盘并关闭文件，返回 (csv_path, jsonl_path)"""
+        if not self._csv_file.closed:
+            self.flush()
+            self._csv_file.close()
+            self._jsonl_file.close()
+            self._blobs_file.close()
+        return self.csv_path, self.jsonl_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
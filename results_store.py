@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史结果列式存储
+每次运行的 JSONL 结果转存为 Parquet（zstd 压缩），按运行日期分区：
+    <root>/runs/run_date=YYYY-MM-DD/run_<run_id>.parquet   每行一条 (设备, 命令) 结果，只存 output_hash
+    <root>/blobs/blobs_<run_id>.parquet                     输出正文，每种内容全库只存一份
+行组内按 ip、command 排序，按设备/命令过滤时可借行组统计跳过无关数据；
+比较“哪些设备的输出变了”只需 output_hash，不必读取输出正文。
+查询只读取需要的列和分区，返回 pandas DataFrame。依赖 pyarrow（可选安装）。
+"""
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from result_sink import iter_blobs, output_hash
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装时只禁用历史存储，不影响批量执行
+    pa = ds = pq = None
+
+INGEST_BATCH_ROWS = 5000  # 转存时每批写入的行数，限制内存占用
+RUN_ID_FORMAT = '%Y%m%d_%H%M%S'
+
+SCHEMA = pa.schema([
+    ('run_id', pa.string()),
+    ('run_time', pa.timestamp('s')),
+    ('ip', pa.string()),
+    ('command', pa.string()),
+    ('success', pa.bool_()),
+    ('error', pa.string()),
+    ('output_len', pa.int64()),
+    ('output_hash', pa.string()),
+    ('unchanged', pa.bool_()),     # 增量模式下指示未变、沿用上次输出的设备
+]) if pa else None
+
+BLOB_SCHEMA = pa.schema([
+    ('output_hash', pa.string()),
+    ('output', pa.string()),
+]) if pa else None
+
+
+def result_rows(result, run_id, run_time, add_blob):
+    """
+    单台设备结果展开为存储行（失败设备一行，command 为空）
+    输出正文交给 add_blob(output_hash, output)；已是 output_hash 引用的输出（ResultWriter 格式）直接引用
+    """
+    base = {'run_id': run_id, 'run_time': run_time, 'ip': result['ip']}
+    if not result['success']:
+        return [dict(base, command='', success=False, error=result.get('error', '未知错误'),
+                     output_len=None, output_hash=None, unchanged=False)]
+    rows = []
+    for o in result['outputs']:
+        if 'output' in o:
+            h = output_hash(o['output'])
+            add_blob(h, o['output'])
+            length = len(o['output'])
+        else:
+            h, length = o['output_hash'], o.get('output_len')
+        rows.append(dict(base, command=o['cmd'], success=True, error=None,
+                         output_len=length, output_hash=h, unchanged=bool(result.get('unchanged'))))
+    return rows
+
+
+class ResultsStore:
+    """按运行日期分区的 Parquet 结果库"""
+
+    def __init__(self, root='results/store'):
+        if pa is None:
+            raise ImportError('历史结果存储需要 pyarrow，请先执行: pip install pyarrow')
+        self.root = Path(root)
+        self.runs_dir = self.root / 'runs'
+        self.blobs_dir = self.root / 'blobs'
+        self._partitioning = ds.partitioning(pa.schema([('run_date', pa.string())]), flavor='hive')
+
+    # ---------------- 写入 ----------------
+    def ingest_jsonl(self, jsonl_path, run_id: str = None) -> Path:
+        """
+        转存一次运行的 JSONL 结果（ResultWriter 的输出）及其去重输出文件，逐批读取不整体加载
+        run_id 默认取文件名中的时间戳（results_<run_id>.jsonl）
+        """
+        jsonl_path = Path(jsonl_path)
+        run_id = run_id or jsonl_path.stem.split('_', 1)[-1]
+        blobs_path = jsonl_path.with_suffix('.outputs.jsonl')
+        blobs = iter_blobs(blobs_path) if blobs_path.exists() else None
+
+        def results():
+            with open(jsonl_path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+        return self.write_run(results(), run_id, blobs)
+
+    def write_run(self, results, run_id: str, blobs=None) -> Path:
+        """
+        写入一次运行的全部结果（results 可为生成器），返回结果 Parquet 文件路径
+        blobs: 结果中 output_hash 引用对应的 (output_hash, output)，库中已有的内容不再重复写入
+        """
+        run_time = datetime.strptime(run_id, RUN_ID_FORMAT)
+        part_dir = self.runs_dir / f'run_date={run_time:%Y-%m-%d}'
+        part_dir.mkdir(parents=True, exist_ok=True)
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        path = part_dir / f'run_{run_id}.parquet'
+        # 写完再改名，查询时不会读到写了一半的文件（点开头的文件查询时自动忽略）
+        tmp_path = part_dir / f'.run_{run_id}.parquet.tmp'
+        blob_path = self.blobs_dir / f'blobs_{run_id}.parquet'
+        blob_tmp_path = self.blobs_dir / f'.blobs_{run_id}.parquet.tmp'
+
+        known = self._blob_hashes()
+        rows, blob_rows = [], []
+        blob_count = 0
+
+        def add_blob(h, output):
+            nonlocal blob_rows, blob_count
+            if h in known:
+                return
+            known.add(h)
+            blob_rows.append({'output_hash': h, 'output': output})
+            blob_count += 1
+            if len(blob_rows) >= INGEST_BATCH_ROWS:
+                blob_writer.write_table(pa.Table.from_pylist(blob_rows, schema=BLOB_SCHEMA))
+                blob_rows = []
+
+        def flush(rows):
+            table = pa.Table.from_pylist(rows, schema=SCHEMA)
+            writer.write_table(table.sort_by([('ip', 'ascending'), ('command', 'ascending')]))
+
+        with pq.ParquetWriter(tmp_path, SCHEMA, compression='zstd') as writer, \
+                pq.ParquetWriter(blob_tmp_path, BLOB_SCHEMA, compression='zstd') as blob_writer:
+            for result in results:
+                rows.extend(result_rows(result, run_id, run_time, add_blob))
+                if len(rows) >= INGEST_BATCH_ROWS:
+                    flush(rows)
+                    rows = []
+            if rows:
+                flush(rows)
+            for h, output in blobs or ():
+                add_blob(h, output)
+            if blob_rows:
+                blob_writer.write_table(pa.Table.from_pylist(blob_rows, schema=BLOB_SCHEMA))
+
+        # 输出先于结果可见，查询时引用总能找到正文
+        if blob_count:
+            blob_tmp_path.replace(blob_path)
+        else:
+            blob_tmp_path.unlink()
+        tmp_path.replace(path)
+        return path
+
+    def _blob_hashes(self) -> set:
+        """库中已有输出的 output_hash（只读这一列）"""
+        if not any(self.blobs_dir.glob('blobs_*.parquet')):
+            return set()
+        table = ds.dataset(self.blobs_dir, format='parquet').to_table(columns=['output_hash'])
+        return set(table.column('output_hash').to_pylist())
+
+    def outputs(self, hashes) -> dict:
+        """按 output_hash 取输出正文"""
+        hashes = list(set(hashes))
+        if not hashes or not any(self.blobs_dir.glob('blobs_*.parquet')):
+            return {}
+        table = ds.dataset(self.blobs_dir, format='parquet').to_table(
+            filter=ds.field('output_hash').isin(hashes))
+        return dict(zip(table.column('output_hash').to_pylist(), table.column('output').to_pylist()))
+
+    # ---------------- 查询 ----------------
+    def runs(self):
+        """已存储的 run_id 列表（按时间升序），只看文件名不读数据"""
+        return sorted(p.stem[len('run_'):] for p in self.runs_dir.glob('run_date=*/run_*.parquet'))
+
+    def query(self, columns=None, ips=None, commands=None, since=None, until=None,
+              last_runs: int = None, success: bool = None) -> pd.DataFrame:
+        """
+        查询历史结果
+        columns: 需要的列（默认不含 output 正文；包含 output 时按 output_hash 从去重库取回）
+        ips / commands: 只取这些设备 / 命令
+        since / until: 运行日期范围（datetime、date 或 'YYYY-MM-DD'），用于分区裁剪
+        last_runs: 只取最近 N 次运行
+        """
+        if columns is None:
+            columns = list(SCHEMA.names)
+        if not self.runs_dir.exists():
+            return pd.DataFrame(columns=columns)
+        with_output = 'output' in columns
+        read_columns = [c for c in columns if c != 'output']
+        if with_output and 'output_hash' not in read_columns:
+            read_columns.append('output_hash')
+
+        flt = None
+
+        def add(expr):
+            nonlocal flt
+            flt = expr if flt is None else flt & expr
+
+        if last_runs:
+            run_ids = self.runs()[-last_runs:]
+            if not run_ids:
+                return pd.DataFrame(columns=columns)
+            add(ds.field('run_id').isin(run_ids))
+            first = datetime.strptime(run_ids[0], RUN_ID_FORMAT)
+            since = max(_as_date(since), f'{first:%Y-%m-%d}') if since else f'{first:%Y-%m-%d}'
+        if since:
+            add(ds.field('run_date') >= _as_date(since))
+        if until:
+            add(ds.field('run_date') <= _as_date(until))
+        if ips:
+            add(ds.field('ip').isin(list(ips)))
+        if commands:
+            add(ds.field('command').isin(list(commands)))
+        if success is not None:
+            add(ds.field('success') == success)
+
+        dataset = ds.dataset(self.runs_dir, format='parquet', partitioning=self._partitioning,
+                             schema=SCHEMA.append(pa.field('run_date', pa.string())))
+        df = dataset.to_table(columns=read_columns, filter=flt).to_pandas()
+        if with_output:
+            blobs = self.outputs(df['output_hash'].dropna())
+            df['output'] = df['output_hash'].map(blobs)
+        return df[columns]
+
+    def changed(self, command: str, last_runs: int = None, since=None, ips=None) -> pd.DataFrame:
+        """
+        指定命令输出发生过变化的设备（只读 run_id/ip/output_hash 三列）
+        返回列: ip, versions（不同输出个数）, runs（参与比较的运行数）, last_changed_run
+        """
+        df = self.query(columns=['run_id', 'ip', 'output_hash'], ips=ips, commands=[command],
+                        since=since, last_runs=last_runs, success=True)
+        if df.empty:
+            return pd.DataFrame(columns=['ip', 'versions', 'runs', 'last_changed_run'])
+
+        df = df.sort_values(['ip', 'run_id'])
+        df['changed'] = df.groupby('ip')['output_hash'].shift().ne(df['output_hash'])
+        # 每台设备的第一次记录不算变化
+        df.loc[df.groupby('ip').head(1).index, 'changed'] = False
+        summary = df.groupby('ip').agg(
+            versions=('output_hash', 'nunique'),
+            runs=('run_id', 'nunique'),
+        )
+        last = df[df['changed']].groupby('ip')['run_id'].max().rename('last_changed_run')
+        summary = summary.join(last)
+        return summary[summary['versions'] > 1].reset_index()
+
+
+def _as_date(value) -> str:
+    """日期参数统一为 'YYYY-MM-DD'，与分区值做字符串比较"""
+    if isinstance(value, str):
+        return value[:10]
+    if isinstance(value, timedelta):
+        value = datetime.now() - value
+    return f'{value:%Y-%m-%d}'
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连接重试与熔断
+RetryPolicy: 可重试的连接错误（欢迎信息超时、连接被重置、AAA 抖动等）按指数退避 + 全抖动重试，
+             认证失败不重试（避免锁账号、加重 AAA 负担）
+CircuitBreaker: 记录持续不可达的设备（跨运行持久化到 JSON）。连续失败达到阈值后熔断（open），
+                冷却期内直接跳过，不再耗费 ssh_timeout + banner_timeout；冷却期满后放行一次探测（half-open），
+                探测成功恢复（closed），失败则重新熔断且冷却期加倍
+"""
+import errno
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import paramiko
+
+# 错误分类
+AUTH = 'auth'                # 认证失败：不重试，不计入熔断
+UNREACHABLE = 'unreachable'  # 连接超时/拒绝/路由不可达：重试，计入熔断
+TRANSIENT = 'transient'      # 握手阶段的偶发错误：重试，不计入熔断
+
+_UNREACHABLE_ERRNOS = {errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ETIMEDOUT}
+
+
+def classify(exc: BaseException) -> str:
+    """连接异常分类"""
+    if isinstance(exc, paramiko.AuthenticationException):
+        return AUTH
+    if isinstance(exc, paramiko.ssh_exception.NoValidConnectionsError):
+        return UNREACHABLE
+    if isinstance(exc, (socket.timeout, TimeoutError, ConnectionRefusedError)):
+        return UNREACHABLE
+    if isinstance(exc, OSError) and exc.errno in _UNREACHABLE_ERRNOS:
+        return UNREACHABLE
+    return TRANSIENT
+
+
+class RetryPolicy:
+    """指数退避重试策略（全抖动：等待时间在 [0, min(max_delay, base_delay * 2^n)] 内均匀分布）"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 10.0):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, kind: str, attempt: int) -> bool:
+        """attempt 为已失败的次数（从 1 开始）"""
+        return kind != AUTH and attempt < self.attempts
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def sleep(self, attempt: int):
+        time.sleep(self.delay(attempt))
+
+
+class CircuitBreaker:
+    """按设备的熔断器（线程安全，状态持久化；可 pickle 传给分片工作进程）"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, path: Optional[str] = 'results/circuit_breaker.json', failure_threshold: int = 3,
+                 open_seconds: float = 3600, max_open_seconds: float = 86400):
+        """
+        failure_threshold: 连续多少次（跨运行累计）不可达后熔断
+        open_seconds: 首次熔断的冷却时间；半开探测失败后加倍，最多 max_open_seconds
+        """
+        self.path = Path(path) if path else None
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict] = {}
+        self._probing = set()
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._hosts = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"熔断状态文件读取失败，忽略: {e}")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_probing'] = set()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def state(self, ip: str) -> str:
+        with self._lock:
+            return self._state_locked(ip, time.time())
+
+    def allow(self, ip: str) -> bool:
+        """是否允许连接：熔断冷却期内拒绝；冷却期满只放行一个探测"""
+        with self._lock:
+            state = self._state_locked(ip, time.time())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and ip not in self._probing:
+                self._probing.add(ip)
+                logging.info(f"[{ip}] 熔断冷却期满，半开探测")
+                return True
+            return False
+
+    def record_success(self, ip: str):
+        with self._lock:
+            self._probing.discard(ip)
+            if self._hosts.pop(ip, None) is not None:
+                logging.info(f"[{ip}] 连接恢复，解除熔断")
+
+    def end_probe(self, ip: str):
+        """结束半开探测但不改变状态（探测以认证失败等与可达性无关的结果结束），下次仍可再探测"""
+        with self._lock:
+            self._probing.discard(ip)
+
+    def record_failure(self, ip: str):
+        """记录一次不可达（认证失败等不应调用）"""
+        now = time.time()
+        with self._lock:
+            probing = ip in self._probing
+            self._probing.discard(ip)
+            entry = self._hosts.setdefault(ip, {'failures': 0})
+            entry['failures'] += 1
+            entry['last_failure'] = now
+            if probing:
+                entry['cooldown'] = min(self.max_open_seconds, entry.get('cooldown', self.open_seconds) * 2)
+                entry['opened_at'] = now
+                logging.warning(f"[{ip}] 半开探测失败，重新熔断 {entry['cooldown']:.0f}s")
+            elif entry['failures'] >= self.failure_threshold and 'opened_at' not in entry:
+                entry['cooldown'] = self.open_seconds
+                entry['opened_at'] = now
+                logging.warning(f"[{ip}] 连续 {entry['failures']} 次不可达，熔断 {entry['cooldown']:.0f}s")
+
+    def open_hosts(self):
+        """当前处于熔断状态的设备"""
+        now = time.time()
+        with self._lock:
+            return [ip for ip in self._hosts if self._state_locked(ip, now) == self.OPEN]
+
+    def export(self, ips) -> Dict[str, Optional[Dict]]:
+        """导出指定设备的状态（未记录的为 None），供分片工作进程回传主进程"""
+        with self._lock:
+            return {ip: self._hosts.get(ip) for ip in ips}
+
+    def merge(self, entries: Dict[str, Optional[Dict]]):
+        """合并 export 的结果（各分片设备互不重叠，直接覆盖）"""
+        with self._lock:
+            for ip, entry in entries.items():
+                if entry is None:
+                    self._hosts.pop(ip, None)
+                else:
+                    self._hosts[ip] = entry
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._hosts, ensure_ascii=False, indent=1)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(data, encoding='utf-8')
+        tmp_path.replace(self.path)
+
+    def _state_locked(self, ip: str, now: float) -> str:
+        entry = self._hosts.get(ip)
+        if not entry or 'opened_at' not in entry:
+            return self.CLOSED
+        if now - entry['opened_at'] < entry.get('cooldown', self.open_seconds):
+            return self.OPEN
+        return self.HALF_OPEN
+
+
+def from_config(config: Optional[Dict]):
+    """按 retry 配置创建 (RetryPolicy, CircuitBreaker)，熔断未启用时后者为 None"""
+    config = config or {}
+    policy = RetryPolicy(config.get('attempts', 3), config.get('base_delay', 1.0), config.get('max_delay', 10.0))
+    breaker_config = config.get('circuit_breaker') or {}
+    breaker = None
+    if breaker_config.get('enabled', True):
+        breaker = CircuitBreaker(breaker_config.get('path', 'results/circuit_breaker.json'),
+                                 breaker_config.get('failure_threshold', 3),
+                                 breaker_config.get('open_seconds', 3600),
+                                 breaker_config.get('max_open_seconds', 86400))
+    return policy, breaker
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多模式匹配
+大量关键字合成一个按前缀树组织的正则（公共前缀只比较一次，效果接近 Aho-Corasick 自动机），
+一次扫描即可找出文本中出现了哪些关键字，不再逐条规则、逐条关键字扫描:
+    KeywordScanner  多 MB 配置中一次扫描找出含关键字的行（合规规则的预筛选，见 compliance.RuleSet）
+    CommandPolicy   危险命令/只读白名单判定，结果按命令缓存，一次运行中每条命令只判定一次
+literals_of 从规则正则中取出必然出现的字面串，作为该规则的预筛选关键字；
+has_newline 找出要求跨行的规则（规则一律按行匹配，加载时拒绝）。
+"""
+import re
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+MIN_LITERAL = 3             # 预筛选关键字的最短长度，更短的规则直接全文匹配
+MAX_CACHED_VERDICTS = 10000  # 命令判定缓存上限（超过后清空重建）
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """关键字 -> 前缀树形式的正则（不含分组捕获），如 ['ntp-service', 'ntp'] -> ntp(?:\\-service)?"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = None
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if '' in node else body
+
+    return build(trie)
+
+
+def _longest_run(items) -> str:
+    best, run = '', []
+    for op, value in list(items) + [(None, None)]:
+        if op is sre_parse.LITERAL:
+            run.append(chr(value))
+            continue
+        if len(run) > len(best):
+            best = ''.join(run)
+        run = []
+    return best
+
+
+def literals_of(pattern: str, flags: int = 0) -> Optional[List[str]]:
+    """
+    正则每次匹配都必然包含其中之一的字面串（小写），作为预筛选关键字:
+    顶层顺序部分的最长字面串，或顶层分支（如 (hwtacacs|radius)）各分支的字面串；
+    太短或取不出时返回 None（该规则只能全文匹配）
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+    best = _longest_run(parsed)
+    if len(best) >= MIN_LITERAL:
+        return [best.lower()]
+    for op, value in parsed:
+        if op is sre_parse.SUBPATTERN and len(value[-1]) == 1:
+            op, value = value[-1][0]
+        if op is sre_parse.BRANCH:
+            runs = [_longest_run(alternative) for alternative in value[1]]
+            if all(len(run) >= MIN_LITERAL for run in runs):
+                return [run.lower() for run in runs]
+    return None
+
+
+def has_newline(pattern: str, flags: int = 0) -> bool:
+    """正则中是否写了换行符（含字符类中的 \\n）：按行匹配时换行符永远匹配不到，说明规则本意是跨行"""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return False
+
+    def walk(items) -> bool:
+        for item in items:
+            if isinstance(item, tuple) and len(item) == 2 and item[0] is sre_parse.LITERAL:
+                if item[1] == ord('\n'):
+                    return True
+            elif isinstance(item, (tuple, list, sre_parse.SubPattern)) and walk(item):
+                return True
+        return False
+
+    return walk(parsed)
+
+
+class KeywordScanner:
+    """
+    一次扫描找出含关键字的行（不区分大小写），返回 {关键字: [(行首偏移, 行)...]}
+    关键字互相包含时只扫描较短的那个（trigger 给出每个关键字实际触发它的关键字），
+    这样同一位置至多一个关键字命中，重叠出现的关键字也不会漏掉
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        keywords = {k.lower() for k in keywords if k}
+        self.keywords = sorted(k for k in keywords if not any(o != k and o in k for o in keywords))
+        self.trigger = {k: next(o for o in self.keywords if o in k) for k in keywords}
+        pattern = trie_pattern(self.keywords)
+        # 区分大小写的正则在小写副本上扫描，比 IGNORECASE 快一个数量级
+        self._search = re.compile(pattern).search if pattern else None
+        self._search_ignorecase = re.compile(pattern, re.IGNORECASE).search if pattern else None
+        self._findall = re.compile(f'(?=({pattern}))').findall if pattern else None
+
+    def scan(self, text: str) -> Dict[str, List[Tuple[int, str]]]:
+        hits = defaultdict(list)
+        if self._search is None:
+            return hits
+        lower = text.lower()
+        if len(lower) == len(text):
+            haystack, search = lower, self._search
+        else:
+            # 个别字符小写后长度变化（如 'İ'），偏移对不上，改为不区分大小写扫描原文
+            haystack, search = text, self._search_ignorecase
+        findall = self._findall
+        pos = 0
+        while True:
+            m = search(haystack, pos)
+            if m is None:
+                break
+            start = haystack.rfind('\n', 0, m.start()) + 1
+            end = haystack.find('\n', m.end())
+            if end < 0:
+                end = len(haystack)
+            for keyword in set(findall(haystack[start:end].lower())):
+                hits[keyword].append((start, text[start:end]))
+            pos = end + 1
+        return hits
+
+    def lines(self, hits: Dict[str, List[Tuple[int, str]]], keywords: Iterable[str]) -> List[str]:
+        """含任一关键字（按触发关键字预筛选）的候选行，按在文本中的顺序"""
+        triggers = {self.trigger[k.lower()] for k in keywords}
+        if len(triggers) == 1:
+            return [line for _, line in hits.get(triggers.pop(), [])]
+        merged = dict(hit for trigger in triggers for hit in hits.get(trigger, []))
+        return [merged[start] for start in sorted(merged)]
+
+
+# dangerous: 命中的第一个危险关键字（按列表顺序）；whitelisted: 含白名单命令；readonly: 以白名单命令开头且不危险
+Verdict = namedtuple('Verdict', 'dangerous whitelisted readonly')
+
+
+class CommandPolicy:
+    """危险命令（子串）与只读白名单（子串/前缀）各合成一个正则，判定结果按命令缓存"""
+
+    def __init__(self, dangerous_commands: Iterable[str], readonly_whitelist: Iterable[str]):
+        self._sources = (list(dangerous_commands), list(readonly_whitelist))
+        self.dangerous_commands = [d.lower() for d in self._sources[0]]
+        self.readonly_whitelist = [w.lower() for w in self._sources[1]]
+        self._dangerous = re.compile(trie_pattern(self.dangerous_commands)) if self.dangerous_commands else None
+        self._whitelist = re.compile(trie_pattern(self.readonly_whitelist)) if self.readonly_whitelist else None
+        self._verdicts = {}
+
+    def matches(self, dangerous_commands, readonly_whitelist) -> bool:
+        """列表是否与构建时一致（检查器的列表被修改后需要重建）"""
+        return self._sources[0] == dangerous_commands and self._sources[1] == readonly_whitelist
+
+    def verdict(self, command: str) -> Verdict:
+        verdict = self._verdicts.get(command)
+        if verdict is None:
+            verdict = self._judge(command.lower().strip())
+            if len(self._verdicts) >= MAX_CACHED_VERDICTS:
+                self._verdicts.clear()
+            self._verdicts[command] = verdict
+        return verdict
+
+    def _judge(self, cmd_lower: str) -> Verdict:
+        dangerous = None
+        if self._dangerous is not None and self._dangerous.search(cmd_lower):
+            # 命中时再按列表顺序取第一个，原因与逐条判断时一致
+            dangerous = next(d for d in self.dangerous_commands if d in cmd_lower)
+        whitelisted = self._whitelist is not None and self._whitelist.search(cmd_lower) is not None
+        readonly = (dangerous is None and self._whitelist is not None
+                    and self._whitelist.match(cmd_lower) is not None)
+        return Verdict(dangerous, whitelisted, readonly)
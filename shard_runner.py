@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程分片执行
+paramiko 的加解密和报文处理都在 Python 里完成，单进程几百个会话就会跑满一个核。
+本模块把设备清单轮转分片给多个工作进程，每个进程内部再用线程池或 asyncio 引擎并发，
+单台设备的结果经队列实时回传给主进程，主进程只负责汇总/报告。
+"""
+import logging
+import multiprocessing
+import queue as queue_module
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+from check_paramiko import NetworkDeviceChecker
+import concurrency
+import rate_limit
+from conn_pool import SSHConnectionPool
+import async_engine
+import log_pipeline
+import profiler
+
+RESULT_POLL_INTERVAL = 1.0  # 主进程检查工作进程存活的间隔（秒）
+
+
+def shard_devices(devices, n):
+    """轮转分片，同一站点的连续设备分散到不同进程"""
+    return [devices[i::n] for i in range(n) if devices[i::n]]
+
+
+def _make_pool(pool_config):
+    if not pool_config or not pool_config.get('enabled'):
+        return None
+    return SSHConnectionPool(
+        max_per_host=pool_config.get('max_per_host', 1),
+        idle_timeout=pool_config.get('idle_timeout', 300),
+        keepalive=pool_config.get('keepalive', 30)
+    )
+
+
+def _shard_worker(shard_id, devices, job, results):
+    """工作进程入口：处理一个分片，每台设备完成后立即把结果放入队列"""
+    positions = {id(device): pos for pos, device in enumerate(devices)}
+    # 每个工作进程有自己的日志写线程（各分片设备不重叠，设备日志文件不会交叉写入），主日志按分片分开
+    log_options = dict(job.get('logging') or {})
+    if log_options.get('main_log'):
+        main_log = Path(log_options['main_log'])
+        log_options['main_log'] = main_log.with_name(f'{main_log.stem}_shard{shard_id}{main_log.suffix}')
+    log_pipeline.start(**log_options)
+
+    def emit(device, result):
+        results.put(('result', (shard_id, positions[id(device)]), result))
+
+    pool = _make_pool(job.get('pool'))
+    # 每个进程独立做自适应并发控制，曲线按分片分别导出
+    limiter = concurrency.from_config(job.get('adaptive'), job.get('max_workers', 5))
+    # 熔断器是主进程的副本，分片结束后把本分片设备的状态回传主进程合并保存
+    breaker = job.get('breaker')
+    # 分阶段耗时同样在本进程采集，结束时回传原始样本由主进程汇总
+    phase_metrics = job.get('metrics')
+    # 会话录制写入同一目录，各分片设备不重叠
+    recorder = job.get('recorder')
+    prof = profiler.create(job.get('profile'), job.get('profile_interval', 0.01))
+    if prof is not None:
+        prof.start()
+    try:
+        # 令牌桶不跨进程共享，速率按进程数均分
+        throttle = rate_limit.from_config(job.get('rate_limits'), job.get('processes', 1))
+        checker = NetworkDeviceChecker(job['checker_config'], pool=pool, limiter=limiter, throttle=throttle,
+                                       retry=job.get('retry'), breaker=breaker, phase_metrics=phase_metrics,
+                                       recorder=recorder)
+        cmds = job['cmds']
+        if job['engine'] == 'async':
+            run_devices = prof.wrap(async_engine.run_devices) if prof else async_engine.run_devices
+            run_devices(
+                devices, cmds, checker,
+                max_sessions=job.get('max_sessions', 1000),
+                connect_workers=job.get('connect_workers', 64),
+                logger_factory=job.get('logger_factory') or logging.getLogger,
+                on_result=emit,
+                parallel_channels=job.get('parallel_channels', 1),
+                pipeline=job.get('pipeline', False),
+                incremental=job.get('incremental')
+            )
+        else:
+            run_device = job['device_runner']
+            if prof is not None:
+                run_device = prof.wrap(run_device)
+            if limiter is not None:
+                run_device = partial(limiter.run, run_device)
+            max_workers = limiter.max_limit if limiter is not None else job.get('max_workers', 5)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_device = {
+                    executor.submit(run_device, device, cmds, checker, job.get('parallel_channels', 1),
+                                    job.get('pipeline', False), job.get('incremental')): device
+                    for device in devices
+                }
+                for future in as_completed(future_to_device):
+                    device = future_to_device[future]
+                    try:
+                        emit(device, future.result())
+                    except Exception as exc:
+                        emit(device, {'ip': device['ip'], 'success': False,
+                                      'error': f'执行异常: {str(exc)}'})
+    finally:
+        if pool:
+            pool.close_all()
+        if recorder is not None:
+            recorder.close()
+        if limiter is not None and job.get('curve_path'):
+            path = Path(job['curve_path'])
+            limiter.write_curve(path.with_name(f'{path.stem}_shard{shard_id}{path.suffix}'))
+        if prof is not None:
+            prof.stop()
+            path = Path(job['profile_path'])
+            prof.write(path.with_name(f'{path.name}_shard{shard_id}'))
+        log_pipeline.shutdown()
+        if phase_metrics is not None:
+            results.put(('metrics', shard_id, phase_metrics.export()))
+        if breaker is not None:
+            results.put(('breaker', shard_id, breaker.export({device['ip'] for device in devices})))
+        results.put(('done', shard_id, None))
+
+
+def run_sharded(devices, job, processes, on_result):
+    """
+    多进程执行所有设备
+    job: 工作进程参数（cmds、checker_config、engine、max_workers、device_runner、incremental 等，须可 pickle）
+         incremental 指纹库在工作进程中只读，由主进程的 on_result 负责记录
+         breaker 熔断器由各工作进程更新副本，结束时回传合并到 job['breaker']
+         metrics 分阶段耗时同样由各工作进程采集，结束时合并到 job['metrics']
+    on_result: 主进程中每台设备完成时回调 on_result(device, result)
+    工作进程异常退出时，其未回传结果的设备记为失败
+    """
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    shards = shard_devices(devices, processes)
+    workers = {}
+    pending = {}
+
+    for shard_id, shard in enumerate(shards):
+        proc = ctx.Process(target=_shard_worker, args=(shard_id, shard, job, results),
+                           name=f'shard-{shard_id}', daemon=True)
+        proc.start()
+        workers[shard_id] = proc
+        pending[shard_id] = dict(enumerate(shard))
+    logging.info(f"启动 {len(shards)} 个工作进程，共 {len(devices)} 台设备")
+
+    running = set(workers)
+    while running:
+        try:
+            kind, key, result = results.get(timeout=RESULT_POLL_INTERVAL)
+        except queue_module.Empty:
+            # 工作进程被杀或崩溃时不会发送 done，这里兜底
+            for shard_id in list(running):
+                if not workers[shard_id].is_alive() and workers[shard_id].exitcode not in (0, None):
+                    running.discard(shard_id)
+                    for device in pending[shard_id].values():
+                        on_result(device, {'ip': device['ip'], 'success': False,
+                                           'error': f'工作进程异常退出: {workers[shard_id].exitcode}'})
+                    pending[shard_id].clear()
+            continue
+
+        if kind == 'done':
+            running.discard(key)
+            continue
+        if kind == 'breaker':
+            job['breaker'].merge(result)
+            continue
+        if kind == 'metrics':
+            job['metrics'].merge(result)
+            continue
+        shard_id, pos = key
+        device = pending[shard_id].pop(pos, None)
+        if device is None:
+            # 工作进程崩溃前已入队的结果：该分片的设备已按失败上报，忽略迟到的结果
+            logging.warning(f"忽略分片 {shard_id} 崩溃后迟到的结果: {result.get('ip')}")
+            continue
+        on_result(device, result)
+
+    for proc in workers.values():
+        proc.join()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""测试公共夹具：仓库根目录加入 sys.path，按需启动本地模拟设备（mock_device）"""
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import log_pipeline  # noqa: E402
+from mock_device import MockFleet  # noqa: E402
+
+
+def pytest_configure(config):
+    # 模拟设备每次启动都是新的主机密钥，检查器按 WarningPolicy 告警
+    config.addinivalue_line('filterwarnings', 'ignore:Unknown .* host key:UserWarning')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _log_pipeline(tmp_path_factory):
+    """整个测试会话共用一个日志管道（日志写到临时目录），在 pytest 关闭输出捕获前停止"""
+    log_dir = tmp_path_factory.mktemp('logs')
+    log_pipeline.start(log_dir=log_dir, main_log=str(log_dir / 'main.log'), console=False)
+    yield
+    log_pipeline.shutdown()
+
+
+@pytest.fixture
+def fleet():
+    """一台 H3C 模拟设备，返回 (fleet, device_info)"""
+    mock = MockFleet(1, base_port=_free_port()).start()
+    device = mock.devices[0]
+    username, password = device.profile['username'], device.profile['password']
+    # check_paramiko 读 username/password，run_device 读 user/pwd（与设备清单两种列名一致）
+    device_info = {'ip': '127.0.0.1', 'port': device.port, 'vendor': device.vendor,
+                   'username': username, 'password': password, 'user': username, 'pwd': password}
+    try:
+        yield mock, device_info
+    finally:
+        mock.stop()
+
+
+@pytest.fixture
+def checker(tmp_path, monkeypatch):
+    """不写日志文件的检查器（工作目录切到临时目录，熔断等状态文件不落到仓库里）"""
+    from check_paramiko import NetworkDeviceChecker
+    monkeypatch.chdir(tmp_path)
+    return NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 5, 'cmd_timeout': 5,
+                                 'vendor': 'h3c'})
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import compliance
+
+
+def test_command_error_detects_failed_output():
+    assert compliance.command_error('ERROR: 连接已断开').startswith('ERROR:')
+    assert compliance.command_error('') == '无输出'
+    assert compliance.command_error(' \n \n') == '无输出'
+    assert compliance.command_error('', 'display users') is None
+    assert 'Unrecognized' in compliance.command_error("^\n % Unrecognized command found at '^' position.")
+    assert 'Unrecognized' in compliance.command_error("^\nError: Unrecognized command found at '^' position.")
+    assert compliance.command_error('#\n sysname SW1\n#\nheader login %\nwelcome\n%') is None
+
+
+def test_check_device_compliance_against_mock(fleet, checker):
+    _, device_info = fleet
+    result = checker.check_device_compliance(device_info, compliance.load_checks())
+    assert result['status'] == 'success', result['error']
+    assert result['checks']['ntp']['passed']
+    assert result['checks']['telnet']['passed']
+    assert not result['checks']['snmp']['passed']
+
+
+def test_check_device_compliance_failed_command_is_not_evaluated(fleet, checker):
+    _, device_info = fleet
+    checks = compliance.load_checks([
+        {'name': 'telnet', 'forbid': [r'^\s*telnet\s+server\s+enable\b'], 'command': 'display bogus-config'},
+    ])
+    result = checker.check_device_compliance(device_info, checks)
+    assert result['status'] == 'failed'
+    assert 'display bogus-config' in result['error'] and 'Unrecognized' in result['error']
+    assert result['checks'] == {} and not result['compliant']
+
+
+def test_check_device_compliance_empty_listing_is_evaluated(fleet, checker):
+    _, device_info = fleet
+    checks = compliance.load_checks(compliance.DEFAULT_CHECKS + [
+        {'name': 'tunnel', 'forbid': [r'^Tun\S*\s+UP'], 'command': 'display interface brief | include Tun'},
+    ])
+    result = checker.check_device_compliance(device_info, checks)
+    assert result['status'] == 'success', result['error']
+    assert result['checks']['tunnel'] == {'passed': True, 'reason': ''}
+
+
+CONFIG = '\n'.join([
+    '#', ' sysname SW1', '#', ' ntp-service unicast-server 10.0.0.1', '#',
+    ' snmp-agent', ' snmp-agent community read public', '#',
+    ' info-center loghost 10.0.0.9', '#', 'hwtacacs scheme tac', '#',
+    ' telnet server enable', '#', 'ab', ' 5', 'ntp', ' server x', '#', 'return',
+])
+
+
+def _naive_evaluate(checks, outputs, vendor=None):
+    """逐条规则、逐行匹配的参照实现"""
+    results = {}
+    for check in checks:
+        if not check.applies_to(vendor):
+            continue
+        text = outputs.get(check.base_command, '')
+        if check.filter:
+            text = compliance.apply_filter(text, *check.filter)
+        lines = text.splitlines()
+        passed, reason = True, ''
+        for regex in check.require:
+            if not any(regex.search(line) for line in lines):
+                passed, reason = False, f"缺少: {regex.pattern}"
+                break
+        else:
+            for regex in check.forbid:
+                line = next((line for line in lines if regex.search(line)), None)
+                if line is not None:
+                    passed, reason = False, f"违规: {line.strip()}"
+                    break
+        results[check.name] = {'passed': passed, 'reason': reason}
+    return results
+
+
+def test_apply_filter_matches_line_by_line():
+    assert compliance.apply_filter(CONFIG, 'include', r'ntp\s+server') == ''
+    assert compliance.apply_filter(CONFIG, 'include', r'ntp-service\s+\S+') == ' ntp-service unicast-server 10.0.0.1'
+    assert compliance.apply_filter('a\nb x\nc', 'begin', r'b\s+x') == 'b x\nc'
+    assert compliance.apply_filter('a\nb\nx', 'begin', r'b\s+x') == ''
+    assert compliance.apply_filter('a\nb\nc', 'exclude', 'b') == 'a\nc'
+
+
+def test_checks_with_newlines_are_rejected():
+    with pytest.raises(ValueError):
+        compliance.Check('multi', require=[r'ntp\n\s+server'])
+    with pytest.raises(ValueError):
+        compliance.load_checks([{'name': 'multi', 'forbid': [r'[\n]x']}])
+
+
+def test_ruleset_matches_per_rule_evaluation():
+    checks = compliance.load_checks(compliance.DEFAULT_CHECKS + [
+        # 取不出关键字的规则（字面串太短）：全文搜索会跨行命中 'ab\n 5'，按行匹配不应命中
+        {'name': 'short', 'require': [r'^ab\s+\d']},
+        {'name': 'short-forbid', 'forbid': [r'^\s*\w\s+\w$']},
+        {'name': 'filtered', 'command': 'display current-configuration | include snmp',
+         'forbid': [r'community\s+read\s+public']},
+        {'name': 'huawei-only', 'vendors': ['huawei'], 'require': [r'^\s*never-present']},
+        {'name': 'version', 'command': 'display version', 'require': [r'Version\s+7']},
+    ])
+    outputs = {compliance.FULL_CONFIG: CONFIG, 'display version': 'Comware Software, Version 7.1.070'}
+    expected = _naive_evaluate(checks, outputs, 'h3c')
+    assert compliance.RuleSet(checks).evaluate(outputs, 'h3c') == expected
+    assert compliance.evaluate(checks, outputs, 'h3c') == expected
+    assert not expected['short']['passed'] and expected['short-forbid']['passed']
+    assert 'huawei-only' not in expected
+    assert expected['version']['passed'] and expected['ntp']['passed']
+    assert expected['snmp'] == {'passed': False, 'reason': '违规: snmp-agent community read public'}
+    assert not expected['telnet']['passed'] and not expected['filtered']['passed']
+
+
+def test_crlf_output_matches_like_filtered_output():
+    checks = compliance.load_checks([
+        {'name': 'plain', 'require': [r'^ntp-service enable$']},
+        {'name': 'short', 'require': [r'^ab$']},
+        {'name': 'filtered', 'command': 'display current-configuration | include ntp',
+         'require': [r'^ntp-service enable$']},
+    ])
+    outputs = {compliance.FULL_CONFIG: '#\r\nntp-service enable\r\nab\r\n#\r\n'}
+    results = compliance.evaluate(checks, outputs)
+    assert all(r['passed'] for r in results.values()), results
+    assert results == _naive_evaluate(checks, outputs)
+
+
+def test_plan_commands_merges_filtered_config():
+    checks = compliance.load_checks([
+        {'name': 'a', 'command': 'display current-configuration | include ntp', 'require': ['ntp']},
+        {'name': 'b', 'command': 'dis cur | begin snmp', 'require': ['snmp']},
+        {'name': 'c', 'command': 'display version', 'require': ['Version']},
+        {'name': 'd', 'vendors': ['huawei'], 'command': 'display clock', 'require': ['x']},
+    ])
+    assert compliance.plan_commands(checks, 'h3c') == [compliance.FULL_CONFIG, 'display version']
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from check_paramiko import NetworkDeviceChecker
+from conn_pool import SSHConnectionPool
+from Increase_Paramiko import run_device_with_ntp
+
+COMMANDS = ['display version', 'display interface brief']
+
+
+def _run(device_info, pool):
+    checker = NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 5, 'cmd_timeout': 5, 'vendor': 'h3c'},
+                                   pool=pool)
+    try:
+        return run_device_with_ntp(device_info, COMMANDS, checker)
+    finally:
+        if pool is not None:
+            pool.close_all()
+
+
+def test_ntp_check_and_commands_share_one_login(fleet, tmp_path, monkeypatch):
+    mock, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    result = _run(device_info, SSHConnectionPool())
+    assert result['success'] and [o['cmd'] for o in result['outputs']] == COMMANDS
+    assert result['ntp'] == {'status': 'success', 'has_ntp': True, 'error': ''}
+    assert mock.devices[0].logins == 1
+
+
+def test_without_pool_each_task_logs_in(fleet, tmp_path, monkeypatch):
+    mock, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    result = _run(device_info, None)
+    assert result['success'] and result['ntp']['has_ntp']
+    assert mock.devices[0].logins == 2
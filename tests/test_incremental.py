@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from Increase_Paramiko import run_device
+from incremental import FingerprintStore
+from result_sink import ResultWriter, iter_results
+
+COMMANDS = ['display version', 'display current-configuration']
+INDICATOR = ' No. TimeStamp          FileName\n 1   2026-10-01 08:00   startup.cfg'
+
+
+def _record(store, outputs, indicator=INDICATOR):
+    store.record({'ip': '10.0.0.1', 'success': True, 'indicator': store.evaluate('10.0.0.1', [], indicator)[0],
+                  'outputs': [{'cmd': cmd, 'output': out} for cmd, out in outputs.items()]})
+
+
+def test_h3c_indicator_is_opt_in(tmp_path):
+    assert FingerprintStore(tmp_path).indicator_command('h3c') is None
+    assert FingerprintStore(tmp_path).indicator_command(None) is None
+    store = FingerprintStore(tmp_path, {'h3c': 'display archive configuration'})
+    assert store.indicator_command('H3C') == 'display archive configuration'
+
+
+def test_evaluate_unchanged_returns_previous_outputs(tmp_path):
+    store = FingerprintStore(tmp_path)
+    _record(store, {'display version': 'v7.1', 'display current-configuration': '#\n sysname SW1'})
+    indicator, previous = store.evaluate('10.0.0.1', COMMANDS, INDICATOR)
+    assert indicator is not None
+    assert previous == [{'cmd': 'display version', 'output': 'v7.1'},
+                        {'cmd': 'display current-configuration', 'output': '#\n sysname SW1'}]
+
+
+def test_evaluate_changed_or_new_commands_run_again(tmp_path):
+    store = FingerprintStore(tmp_path)
+    _record(store, {'display version': 'v7.1'})
+    assert store.evaluate('10.0.0.1', ['display version'], INDICATOR + '\n 2   2026-10-02')[1] is None
+    assert store.evaluate('10.0.0.1', COMMANDS, INDICATOR)[1] is None
+    assert store.evaluate('10.0.0.2', ['display version'], INDICATOR)[1] is None
+
+
+def test_evaluate_rejects_failed_indicator(tmp_path):
+    store = FingerprintStore(tmp_path)
+    for output in ['', 'ERROR: 命令执行超时', "^\n % Unrecognized command found at '^' position.",
+                   "ERROR: Unrecognized command", 'error: unrecognized command']:
+        assert store.evaluate('10.0.0.1', COMMANDS, output) == (None, None)
+
+
+def test_evaluate_missing_previous_output_runs_again(tmp_path):
+    store = FingerprintStore(tmp_path)
+    _record(store, {'display version': 'v7.1'})
+    for path in (tmp_path / 'outputs').glob('*/*.txt'):
+        path.unlink()
+    assert store.evaluate('10.0.0.1', ['display version'], INDICATOR)[1] is None
+
+
+def test_unchanged_device_results_are_self_contained(tmp_path, fleet, checker):
+    _, device_info = fleet
+    store = FingerprintStore(tmp_path / 'incremental', {'h3c': 'display archive configuration'})
+    runs = []
+    for run in range(2):
+        with ResultWriter(tmp_path / f'run{run}') as writer:
+            result = run_device(device_info, COMMANDS, checker, incremental=store)
+            assert result['success'], result.get('error')
+            store.record(result, f'run{run}')
+            writer.write(result)
+        runs.append(list(iter_results(writer.jsonl_path)))
+        store.save()
+
+    first, second = runs[0][0], runs[1][0]
+    assert not first.get('unchanged') and second['unchanged']
+    assert [o['output'] for o in second['outputs']] == [o['output'] for o in first['outputs']]
+    assert all(o['output'] for o in second['outputs'])
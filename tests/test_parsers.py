@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import parsers
+from Increase_Paramiko import run_device
+from result_sink import ResultWriter
+
+H3C_INTERFACE = """GigabitEthernet1/0/1
+Current state: UP
+Line protocol state: UP
+Description: to-core
+Bandwidth: 1000000 kbps
+Maximum transmission unit: 1500
+1000Mbps-speed mode, full-duplex mode
+Input (total):  1200 packets, 345678 bytes
+Input:  3 input errors, 0 runts, 0 giants, 0 throttles
+        2 CRC, 0 frame, 0 overruns, 0 aborts
+Output (total): 800 packets, 123456 bytes
+Output: 0 output errors, 0 underruns, 0 buffer failures
+GigabitEthernet1/0/2
+Current state: DOWN
+Line protocol state: DOWN
+"""
+
+NTP_STATUS = """ Clock status: synchronized
+ Clock stratum: 3
+ System peer: 10.0.0.1
+ Clock offset: 0.2580 ms
+ Root delay: 12.50 ms
+ Root dispersion: 1.2 s
+"""
+
+ROUTE = """Destination/Mask   Proto   Pre Cost        NextHop         Interface
+0.0.0.0/0          Static  60  0           10.0.0.1        Vlan10
+10.1.0.0/16        OSPF    10  2           10.0.0.2        Vlan10
+                   OSPF    10  2           10.0.0.3        Vlan20
+"""
+
+
+def test_parse_interface():
+    first, second = parsers.parse('display interface', H3C_INTERFACE)['interface']
+    assert first['interface'] == 'GigabitEthernet1/0/1' and first['state'] == 'UP'
+    assert first['speed_mbps'] == 1000 and first['duplex'] == 'full' and first['mtu'] == 1500
+    assert (first['input_packets'], first['input_bytes']) == (1200, 345678)
+    assert (first['crc'], first['input_errors'], first['output_errors']) == (2, 3, 0)
+    assert second['state'] == 'DOWN' and second['crc'] is None
+
+
+def test_parse_ntp_status_and_config():
+    [status] = parsers.parse('dis ntp-service status', NTP_STATUS)['ntp_status']
+    assert status['synchronized'] and status['stratum'] == 3 and status['reference'] == '10.0.0.1'
+    assert status['root_dispersion_ms'] == 1200.0
+    config = parsers.parse('display current-configuration',
+                           ' ntp-service enable\n ntp-service unicast-server 10.0.0.1 vpn-instance mgmt source LoopBack0')
+    assert config['ntp_config'][1] == {
+        'statement': 'ntp-service unicast-server 10.0.0.1 vpn-instance mgmt source LoopBack0', 'kind': 'server',
+        'address': '10.0.0.1', 'vpn_instance': 'mgmt', 'source': 'LoopBack0'}
+
+
+def test_parse_route_keeps_ecmp_destination():
+    routes = parsers.parse('display ip routing-table', ROUTE)['route']
+    assert [(r['destination'], r['prefix_len'], r['next_hop']) for r in routes] == [
+        ('0.0.0.0', 0, '10.0.0.1'), ('10.1.0.0', 16, '10.0.0.2'), ('10.1.0.0', 16, '10.0.0.3')]
+
+
+def test_unknown_command_and_empty_frames():
+    assert parsers.parse('display clock', '10:00:00') == {}
+    frame = parsers.frames([], ['interface'])['interface']
+    assert frame.empty and str(frame['crc'].dtype) == 'Int64'
+
+
+def test_frames_from_mock_results(fleet, checker, tmp_path):
+    _, device_info = fleet
+    commands = ['display version', 'display interface brief', 'display current-configuration | include ntp']
+    with ResultWriter(tmp_path) as writer:
+        result = run_device(device_info, commands, checker)
+        assert result['success'], result.get('error')
+        writer.write(result)
+        writer.write({'ip': '10.9.9.9', 'success': False, 'error': '连接失败'})
+    tables = parsers.frames(parsers.iter_jsonl(writer.jsonl_path))
+    version = tables['version']
+    assert list(version['ip']) == ['127.0.0.1'] and version.loc[0, 'version'] == '7.1.070'
+    assert version.loc[0, 'uptime_seconds'] == 3 * 86400 + 4 * 3600 + 12 * 60
+    brief = tables['interface_brief']
+    assert len(brief) > 0 and set(brief['link']) == {'UP'}
+    assert list(tables['ntp_config']['address'].dropna()) == ['10.0.0.1']
+    assert tables['route'].empty
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import Increase_Paramiko
+from channel_reader import completed_pipelined_output, split_pipelined_output
+from prompt_profiles import VENDOR_PROFILES
+
+SESSION = VENDOR_PROFILES['h3c'].learn('\r\n<SW1>')
+COMMANDS = ['display version', 'display clock', 'display interface brief']
+
+
+def test_completed_output_keeps_only_finished_commands():
+    text = 'display version\nVersion 7.1\n<SW1>display clock\n10:00'
+    assert split_pipelined_output(text, COMMANDS, SESSION) is None
+    # 第二条的回显之后才能确定第一条已完成；第二条之后没有分界，不能算完成
+    assert completed_pipelined_output(text, COMMANDS, SESSION) == ['display version\nVersion 7.1']
+
+
+def test_completed_output_stops_at_mismatched_echo():
+    text = 'display version\nVersion 7.1\n<SW1>display cpu\n<SW1>display interface brief\n<SW1>'
+    assert completed_pipelined_output(text, COMMANDS, SESSION) == []
+
+
+def test_legacy_pipeline_matches_sequential(fleet):
+    _, device_info = fleet
+    commands = ['display version', 'display interface brief', 'display current-configuration | include ntp']
+    pipelined = Increase_Paramiko.run_device(device_info, commands, pipeline=True)
+    sequential = Increase_Paramiko.run_device(device_info, commands)
+    assert pipelined['success'] and sequential['success']
+    assert pipelined['outputs'] == sequential['outputs']
+
+
+def test_legacy_pipeline_requires_readonly_commands(fleet, monkeypatch):
+    _, device_info = fleet
+
+    def fail(*args, **kwargs):
+        raise AssertionError('非只读命令不应整批下发')
+
+    monkeypatch.setattr(Increase_Paramiko, 'read_pipelined', fail)
+    result = Increase_Paramiko.run_device(device_info, ['display version', 'save force'], pipeline=True)
+    assert result['success']
+    assert [o['cmd'] for o in result['outputs']] == ['display version', 'save force']
+
+
+def test_legacy_pipeline_fallback_resends_only_unfinished(fleet, monkeypatch):
+    mock, device_info = fleet
+    monkeypatch.setattr(Increase_Paramiko, 'split_pipelined_output', lambda *args: None)
+    before = mock.devices[0].commands
+    result = Increase_Paramiko.run_device(device_info, COMMANDS, pipeline=True)
+    assert result['success']
+    assert [o['cmd'] for o in result['outputs']] == COMMANDS
+    assert all(o['output'] for o in result['outputs'])
+    # 输出完整但无法切分：前两条已由下一条的回显确认完成，只补发最后一条
+    assert mock.devices[0].commands - before == len(COMMANDS) + 1
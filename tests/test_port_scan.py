@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import errno
+import socket
+
+import port_scan
+
+
+def test_scan_reports_reachable_and_refused(fleet):
+    _, device_info = fleet
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    port = closed.getsockname()[1]
+    closed.close()
+    results = port_scan.scan([('127.0.0.1', device_info['port']), ('127.0.0.1', port)], timeout=2)
+    assert results[('127.0.0.1', device_info['port'])] is None
+    assert results[('127.0.0.1', port)] == '端口拒绝连接'
+
+
+def test_socket_errors_are_reported_per_target(monkeypatch, fleet):
+    _, device_info = fleet
+
+    def no_socket(*args, **kwargs):
+        raise OSError(errno.EMFILE, 'Too many open files')
+
+    monkeypatch.setattr(port_scan.socket, 'socket', no_socket)
+    results = port_scan.scan([('127.0.0.1', device_info['port'])], timeout=1)
+    assert 'Too many open files' in results[('127.0.0.1', device_info['port'])]
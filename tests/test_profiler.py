@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import profiler
+
+
+def work(n):
+    return sum(i * i for i in range(n))
+
+
+@pytest.mark.parametrize('process_wide', [False, True])
+def test_cprofile_in_worker_threads(tmp_path, process_wide):
+    prof = profiler.CallProfiler(process_wide).start()
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(prof.wrap(work), [20000] * 8))
+        work(20000)
+    finally:
+        prof.stop()
+    assert results == [work(20000)] * 8
+    path = prof.write(tmp_path / 'profile')
+    assert path.exists() and 'work' in path.with_suffix('.txt').read_text(encoding='utf-8')
+
+
+def test_cprofile_failure_does_not_fail_the_call(monkeypatch, tmp_path):
+    prof = profiler.CallProfiler(process_wide=False)
+    monkeypatch.setattr(prof, '_enable', lambda: None)  # 已有其他剖析器在采集
+    assert prof.wrap(work)(10) == work(10)
+    assert prof.write(tmp_path / 'profile') is None
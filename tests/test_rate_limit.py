@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import rate_limit
+
+CONFIG = {
+    'command_per_device': {'rate': 10, 'burst': 4},
+    'session_per_site': {'rate': 8, 'burst': 4, 'prefix': 24},
+    'login_per_aaa': {'rate': 6, 'burst': 2, 'servers': {'10.1.0.0/16': 'tacacs-a'}},
+}
+
+
+def test_disabled_without_rates():
+    assert rate_limit.from_config(None) is None
+    assert rate_limit.from_config({'command_per_device': {'rate': 0}}) is None
+
+
+def test_share_splits_site_and_aaa_but_not_device_rate():
+    limiter = rate_limit.RateLimiter(CONFIG, share=4)
+    assert limiter._specs['command'] == (10.0, 4.0)
+    assert limiter._specs['session'] == (2.0, 1.0)
+    assert limiter._specs['login'] == (1.5, 1.0)
+
+
+def test_command_delay_follows_configured_rate_in_every_share():
+    for share in (1, 4):
+        limiter = rate_limit.RateLimiter(CONFIG, share=share)
+        delays = [limiter.command_delay('10.1.1.1') for _ in range(5)]
+        assert delays[:4] == [0.0] * 4
+        assert delays[4] == pytest.approx(0.1, abs=0.02)
+
+
+def test_buckets_are_shared_per_site_and_aaa():
+    limiter = rate_limit.RateLimiter(CONFIG)
+    assert limiter.site_of({'ip': '10.1.1.1'}) == limiter.site_of({'ip': '10.1.1.200'}) == '10.1.1.0/24'
+    assert limiter.site_of({'ip': '10.1.1.1', 'site': 'dc1'}) == 'dc1'
+    assert limiter.aaa_of({'ip': '10.1.9.9'}) == 'tacacs-a'
+    assert limiter.aaa_of({'ip': '192.168.0.1'}) == 'default'
+    # login 桶 burst 2：同一 AAA 的第三个会话需要等待，另一 AAA 不受影响
+    delays = [limiter.connect_delay({'ip': f'10.1.{i}.1'}) for i in range(3)]
+    assert delays[:2] == [0.0, 0.0] and delays[2] > 0
+    assert limiter.connect_delay({'ip': '192.168.0.1'}) == 0.0
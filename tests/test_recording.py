@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import pickle
+
+import recording
+from check_paramiko import NetworkDeviceChecker
+from Increase_Paramiko import run_device
+from replay_sessions import replay
+
+COMMANDS = ['display version', 'display interface brief', 'display current-configuration | include ntp']
+
+
+def _record(device_info, path, *batches, pipeline=False):
+    recorder = recording.SessionRecorder(path)
+    checker = NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 5, 'cmd_timeout': 5,
+                                    'vendor': 'h3c'}, recorder=recorder)
+    try:
+        results = [run_device(device_info, cmds, checker, pipeline=pipeline) for cmds in batches]
+    finally:
+        recorder.close()
+    assert all(r['success'] for r in results), [r.get('error') for r in results]
+    return results
+
+
+def test_replay_reproduces_recorded_outputs(fleet, tmp_path, monkeypatch):
+    mock, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    [recorded] = _record(device_info, tmp_path / 'rec', COMMANDS)
+    sessions = mock.devices[0].sessions
+    results, source = replay(tmp_path / 'rec', cmds=COMMANDS)
+    assert [r['outputs'] for r in results] == [recorded['outputs']]
+    assert results[0]['success'] and 'diverged' not in results[0]
+    assert mock.devices[0].sessions == sessions  # 回放不连设备
+
+
+def test_replay_flags_changed_commands(fleet, tmp_path, monkeypatch):
+    _, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    _record(device_info, tmp_path / 'rec', COMMANDS)
+    [result], _ = replay(tmp_path / 'rec', cmds=['display version', 'display clock'])
+    assert result['diverged'] > 0
+
+
+def test_connections_replay_in_recorded_order(fleet, tmp_path, monkeypatch):
+    _, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    first, second = _record(device_info, tmp_path / 'rec', COMMANDS[:1], COMMANDS[1:])
+    assert sorted(p.name for p in (tmp_path / 'rec').iterdir()) == [
+        f'127.0.0.1_001{recording.SUFFIX}', f'127.0.0.1_002{recording.SUFFIX}']
+    source = recording.ReplaySource(tmp_path / 'rec')
+    checker = NetworkDeviceChecker({'enable_logging': False, 'safe_disconnect': False}, replay=source)
+    devices = source.devices()
+    assert [d['ip'] for d in devices] == ['127.0.0.1', '127.0.0.1']
+    assert run_device(devices[0], COMMANDS[:1], checker)['outputs'] == first['outputs']
+    assert run_device(devices[1], COMMANDS[1:], checker)['outputs'] == second['outputs']
+    assert source.connect(devices[0]) is None  # 录制的连接已用完
+
+
+def test_recorders_in_shard_processes_do_not_overwrite(fleet, tmp_path, monkeypatch):
+    _, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    _record(device_info, tmp_path / 'rec', COMMANDS[:1])
+    # 分片进程拿到的是 pickle 后的副本，序号从头开始，同名文件已存在时顺延
+    shard_recorder = pickle.loads(pickle.dumps(recording.SessionRecorder(tmp_path / 'rec')))
+    checker = NetworkDeviceChecker({'enable_logging': False, 'vendor': 'h3c'}, recorder=shard_recorder)
+    try:
+        assert run_device(device_info, COMMANDS[1:2], checker)['success']
+    finally:
+        shard_recorder.close()
+    headers = [recording.read_header(p) for p in sorted((tmp_path / 'rec').iterdir())]
+    assert [p.name for p in sorted((tmp_path / 'rec').iterdir())][-1] == f'127.0.0.1_002{recording.SUFFIX}'
+    assert len(headers) == 2 and all(h['port'] == device_info['port'] for h in headers)
+
+
+def test_replay_pipelined_session(fleet, tmp_path, monkeypatch):
+    _, device_info = fleet
+    monkeypatch.chdir(tmp_path)
+    [recorded] = _record(device_info, tmp_path / 'rec', COMMANDS, pipeline=True)
+    [result], _ = replay(tmp_path / 'rec', cmds=COMMANDS, pipeline=True)
+    assert result['outputs'] == recorded['outputs'] and 'diverged' not in result
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import async_engine
+import check_paramiko
+import retry_policy
+from check_paramiko import NetworkDeviceChecker
+
+
+def _half_open_breaker(tmp_path, ip):
+    breaker = retry_policy.CircuitBreaker(tmp_path / 'breaker.json', failure_threshold=1, open_seconds=1)
+    breaker.record_failure(ip)
+    breaker._hosts[ip]['opened_at'] = time.time() - 10
+    assert breaker.state(ip) == breaker.HALF_OPEN
+    return breaker
+
+
+def test_half_open_probe_cleared_after_auth_failure(fleet, tmp_path):
+    _, device_info = fleet
+    ip = device_info['ip']
+    breaker = _half_open_breaker(tmp_path, ip)
+    checker = NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 5}, breaker=breaker)
+    assert checker.safe_connect(dict(device_info, password='wrong')) is None
+    assert checker.connect_error(ip) == '认证失败'
+    # 探测已结束：状态不变，下次仍可再探测
+    assert breaker.state(ip) == breaker.HALF_OPEN
+    assert breaker.allow(ip)
+
+
+def test_half_open_probe_success_closes_breaker(fleet, tmp_path):
+    _, device_info = fleet
+    ip = device_info['ip']
+    breaker = _half_open_breaker(tmp_path, ip)
+    checker = NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 5}, breaker=breaker)
+    ssh = checker.safe_connect(device_info)
+    assert ssh is not None
+    ssh.close()
+    assert breaker.state(ip) == breaker.CLOSED
+
+
+def test_async_engine_backs_off_in_coroutine(monkeypatch):
+    def no_thread_sleep(seconds):
+        raise AssertionError('重试退避不应在握手线程中 sleep')
+
+    monkeypatch.setattr(check_paramiko.time, 'sleep', no_thread_sleep)
+    checker = NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 2},
+                                   retry=retry_policy.RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.01))
+    attempts = []
+    connect_once = checker._connect_once
+
+    def counting(device_info):
+        attempts.append(device_info['ip'])
+        return connect_once(device_info)
+
+    monkeypatch.setattr(checker, '_connect_once', counting)
+    # 端口 1 一般无监听：连接被拒绝，按不可达重试
+    device = {'ip': '127.0.0.1', 'port': 1, 'user': 'admin', 'pwd': 'admin'}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        result = asyncio.run(async_engine.run_device_async(device, ['display version'], checker, executor))
+    assert not result['success']
+    assert len(attempts) == 3
+    assert checker.retry_delay('127.0.0.1') is None
+
+
+def test_thread_path_still_retries(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(check_paramiko.time, 'sleep', sleeps.append)
+    checker = NetworkDeviceChecker({'enable_logging': False, 'ssh_timeout': 2},
+                                   retry=retry_policy.RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.01))
+    assert checker.safe_connect({'ip': '127.0.0.1', 'port': 1, 'username': 'a', 'password': 'b'}) is None
+    assert len(sleeps) == 2 and all(s == pytest.approx(0.005, abs=0.006) for s in sleeps)
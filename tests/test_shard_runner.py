@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import queue
+
+import shard_runner
+
+
+class _FakeContext:
+    """按脚本回放结果队列的多进程上下文：分片 0 已崩溃，分片 1 正常"""
+
+    def __init__(self, script):
+        self.script = script
+
+    def Queue(self):
+        return self
+
+    def get(self, timeout=None):
+        item = self.script.pop(0)
+        if item is queue.Empty:
+            raise queue.Empty
+        return item
+
+    def Process(self, target, args, name, daemon):
+        return _FakeProcess(crashed=args[0] == 0)
+
+
+class _FakeProcess:
+    def __init__(self, crashed):
+        self.exitcode = -9 if crashed else None
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def join(self):
+        pass
+
+
+def test_late_result_from_crashed_shard_is_ignored(monkeypatch):
+    devices = [{'ip': '10.0.0.1'}, {'ip': '10.0.0.2'}]
+    script = [
+        queue.Empty,                                               # 发现分片 0 崩溃，设备记为失败
+        ('result', (0, 0), {'ip': '10.0.0.1', 'success': True}),   # 崩溃前已入队的迟到结果
+        ('result', (1, 0), {'ip': '10.0.0.2', 'success': True}),
+        ('done', 1, None),
+    ]
+    monkeypatch.setattr(shard_runner.multiprocessing, 'get_context', lambda: _FakeContext(script))
+    reported = []
+    shard_runner.run_sharded(devices, {}, 2, lambda device, result: reported.append((device['ip'], result)))
+    assert reported == [('10.0.0.1', {'ip': '10.0.0.1', 'success': False, 'error': '工作进程异常退出: -9'}),
+                        ('10.0.0.2', {'ip': '10.0.0.2', 'success': True})]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import Increase_Paramiko
+import transport_profiles
+
+
+def test_warns_once_when_profile_loses_defining_algorithms(caplog):
+    custom = {'odd': {'kex': ['no-such-kex'], 'ciphers': ['aes128-ctr'], 'requires': ['no-such-kex']}}
+    with caplog.at_level(logging.WARNING):
+        assert transport_profiles.resolve('odd', custom)['ciphers'] == ['aes128-ctr']
+        transport_profiles.resolve('odd', custom)
+    warnings = [r.getMessage() for r in caplog.records if 'odd' in r.getMessage()]
+    assert len(warnings) == 2
+    assert any('kex' in w for w in warnings) and any('依赖的算法' in w for w in warnings)
+
+
+def test_legacy_profile_warns_only_without_sha1_support(caplog):
+    transport_profiles._checked.clear()
+    with caplog.at_level(logging.WARNING):
+        transport_profiles.resolve('legacy')
+    lost = not transport_profiles.supported('requires').intersection(transport_profiles.PROFILES['legacy']['requires'])
+    assert any('legacy' in r.getMessage() for r in caplog.records) == lost
+
+
+def test_legacy_fallback_uses_custom_profiles(fleet, monkeypatch):
+    _, device_info = fleet
+    profiles = []
+    connect_kwargs = transport_profiles.connect_kwargs
+
+    def spy(profile):
+        profiles.append(profile)
+        return connect_kwargs(profile)
+
+    monkeypatch.setattr(transport_profiles, 'connect_kwargs', spy)
+    monkeypatch.setattr(Increase_Paramiko, 'legacy_ssh_config', lambda: {
+        'transport_profile': 'small-window', 'transport_profiles': {'small-window': {'window_size': 65536}}})
+    result = Increase_Paramiko.run_device(device_info, ['display version'])
+    assert result['success'], result.get('error')
+    assert profiles == [{'window_size': 65536}]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSH 传输参数配置档
+paramiko 默认的算法顺序、压缩和窗口大小是通用取值：高延迟链路上拉取数 MB 的配置时窗口偏小，
+大规模并发建连时握手又偏贵。这里按场景给出命名配置档，可在 config.json 的
+ssh.transport_profiles 中覆盖或新增，ssh.transport_profile 选默认档，清单 profile 列可按设备指定。
+
+配置档字段（均可省略，省略即 paramiko 默认值）:
+    kex / key_types / ciphers / macs   算法优先顺序（本机 paramiko 不支持的名称忽略）
+    compress                           是否协商 zlib 压缩
+    window_size / max_packet_size      通道窗口与最大报文（字节）
+    requires                           定义该档的算法，本机 paramiko 一个都不支持时告警（该档已名不副实）
+
+legacy 档依赖的 SHA1 密钥交换和 ssh-rsa 主机密钥需要 paramiko 3.x；paramiko 5.0 已不再提供，
+此时 legacy 档只剩 CBC 加密和 SHA1/MD5 MAC，连不上只支持 SHA1 密钥交换的老设备。
+"""
+import logging
+from functools import partial
+from typing import Dict, Optional
+
+import paramiko
+
+PROFILES = {
+    # paramiko 默认值
+    'default': {},
+    # 高延迟链路拉取大输出：大窗口减少等待窗口调整的往返，压缩文本配置，GCM 省去单独的 MAC 计算
+    'bulk-transfer': {
+        'ciphers': ['aes128-gcm@openssh.com', 'aes128-ctr', 'aes256-gcm@openssh.com', 'aes256-ctr'],
+        'macs': ['hmac-sha2-256-etm@openssh.com', 'hmac-sha2-256', 'hmac-sha1'],
+        'compress': True,
+        'window_size': 16 * 1024 * 1024,
+        'max_packet_size': 32768,
+    },
+    # 大量短会话：优先握手计算量小的密钥交换/主机密钥算法，小窗口降低每会话内存，不压缩
+    'many-small-sessions': {
+        'kex': ['curve25519-sha256@libssh.org', 'ecdh-sha2-nistp256', 'diffie-hellman-group14-sha256'],
+        'key_types': ['ssh-ed25519', 'ecdsa-sha2-nistp256', 'rsa-sha2-256', 'rsa-sha2-512'],
+        'ciphers': ['aes128-ctr', 'aes128-gcm@openssh.com', 'aes256-ctr'],
+        'macs': ['hmac-sha2-256', 'hmac-sha1'],
+        'compress': False,
+        'window_size': 256 * 1024,
+        'max_packet_size': 32768,
+    },
+    # 老设备（Comware 5 / 早期 VRP）：追加 paramiko 默认未启用的 SHA1 密钥交换和 ssh-rsa 主机密钥（需要 paramiko 3.x）
+    'legacy': {
+        'kex': ['ecdh-sha2-nistp256', 'diffie-hellman-group14-sha256', 'diffie-hellman-group-exchange-sha256',
+                'diffie-hellman-group14-sha1', 'diffie-hellman-group-exchange-sha1', 'diffie-hellman-group1-sha1'],
+        'key_types': ['rsa-sha2-256', 'rsa-sha2-512', 'ssh-rsa', 'ecdsa-sha2-nistp256'],
+        'ciphers': ['aes128-ctr', 'aes256-ctr', 'aes128-cbc', 'aes256-cbc', '3des-cbc'],
+        'macs': ['hmac-sha2-256', 'hmac-sha1', 'hmac-md5'],
+        'requires': ['diffie-hellman-group14-sha1', 'diffie-hellman-group-exchange-sha1',
+                     'diffie-hellman-group1-sha1', 'ssh-rsa'],
+    },
+}
+
+# 配置档字段 -> (SecurityOptions 属性, Transport 支持列表)
+_ALGORITHM_FIELDS = {
+    'kex': ('kex', '_kex_info'),
+    'key_types': ('key_types', '_key_info'),
+    'ciphers': ('ciphers', '_cipher_info'),
+    'macs': ('digests', '_mac_info'),
+}
+
+
+_checked = set()  # 已检查过算法支持情况的配置档（每个档只告警一次）
+
+
+def supported(field: str) -> set:
+    """本机 paramiko 支持的某类算法名称"""
+    if field == 'requires':
+        return set().union(*(supported(f) for f in _ALGORITHM_FIELDS))
+    return set(getattr(paramiko.Transport, _ALGORITHM_FIELDS[field][1]))
+
+
+def check_support(name: str, profile: Dict):
+    """某类算法或 requires 在本机 paramiko 中全部不可用时告警（这些字段实际按 paramiko 默认值协商）"""
+    key = (name, repr(sorted(profile.items())))
+    if key in _checked:
+        return
+    _checked.add(key)
+    version = paramiko.__version__
+    for field in list(_ALGORITHM_FIELDS) + ['requires']:
+        names = profile.get(field)
+        if not names or supported(field).intersection(names):
+            continue
+        if field == 'requires':
+            logging.warning(f"传输配置档 {name} 依赖的算法在本机 paramiko {version} 中均不可用（{', '.join(names)}），"
+                            f"只支持这些算法的设备将无法连接（SHA1 密钥交换/ssh-rsa 需要 paramiko 3.x）")
+        else:
+            logging.warning(f"传输配置档 {name} 的 {field} 在本机 paramiko {version} 中全部不可用"
+                            f"（{', '.join(names)}），按 paramiko 默认值协商")
+
+
+def resolve(name: Optional[str], custom_profiles: Dict = None) -> Dict:
+    """按名称取配置档（config 中同名档覆盖内置档的对应字段），未知名称按 default 处理"""
+    name = name or 'default'
+    custom_profiles = custom_profiles or {}
+    if name not in PROFILES and name not in custom_profiles:
+        logging.warning(f"未知的传输配置档 {name}，使用 paramiko 默认参数")
+        return {}
+    profile = {**PROFILES.get(name, {}), **custom_profiles.get(name, {})}
+    check_support(name, profile)
+    return profile
+
+
+def _make_transport(profile: Dict, sock, **kwargs) -> paramiko.Transport:
+    """SSHClient.connect 的 transport_factory：按配置档创建 Transport"""
+    transport = paramiko.Transport(
+        sock,
+        default_window_size=profile.get('window_size', paramiko.common.DEFAULT_WINDOW_SIZE),
+        default_max_packet_size=profile.get('max_packet_size', paramiko.common.DEFAULT_MAX_PACKET_SIZE),
+        **kwargs
+    )
+    options = transport.get_security_options()
+    for field, (attr, supported) in _ALGORITHM_FIELDS.items():
+        names = profile.get(field)
+        if not names:
+            continue
+        available = getattr(transport, supported)
+        usable = [n for n in names if n in available]
+        if len(usable) < len(names):
+            logging.debug(f"传输配置档忽略不支持的{field}: {[n for n in names if n not in available]}")
+        if usable:
+            setattr(options, attr, usable)
+    return transport
+
+
+def connect_kwargs(profile: Dict) -> Dict:
+    """配置档对应的 SSHClient.connect 参数；空配置档返回 {}，保持 paramiko 默认行为"""
+    if not profile:
+        return {}
+    kwargs = {'transport_factory': partial(_make_transport, profile)}
+    if 'compress' in profile:
+        kwargs['compress'] = bool(profile['compress'])
+    return kwargs